@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark ino commands on a synthetic project and distribution.
+
+A fake Arduino distribution with stand-in tools and a project with
+sketches and libraries including each other are generated, see
+benchmarks/synthetic.py, then ino is run on them as a user would run it.
+Only `make' is needed besides Python. Results could be saved as a JSON
+baseline and later runs compared with it, on the same machine as timings
+of different ones are not comparable. Run from the repository root:
+
+    python -m benchmarks.ino_bench --save baseline.json
+    python -m benchmarks.ino_bench --compare baseline.json
+"""
+
+import os
+import os.path
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import ino
+from ino.utils import OrderedDict
+from benchmarks.synthetic import create_distribution, create_project
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# parameters of generated data, results are comparable only if they match
+PARAMETERS = ['boards', 'core_sources', 'sketches', 'libraries', 'fanout', 'includes',
+              'functions']
+
+
+class Bench(object):
+    def __init__(self, args):
+        self.args = args
+        self.root = tempfile.mkdtemp(prefix='ino-bench-')
+        self.dist = os.path.join(self.root, 'arduino')
+        self.project = os.path.join(self.root, 'project')
+        self.cache = os.path.join(self.root, 'cache')
+        self.env = dict(os.environ,
+                        HOME=self.root,
+                        INO_CACHE_DIR=self.cache,
+                        # commands are measured as run by the very process
+                        INO_NO_SERVER='1',
+                        PYTHONPATH=ROOT)
+        self.env.pop('MAKEFLAGS', None)
+        self.edits = 0
+
+    def setup(self):
+        args = self.args
+        create_distribution(self.dist, boards=args.boards, core_sources=args.core_sources)
+        create_project(self.project, sketches=args.sketches, libraries=args.libraries,
+                       fanout=args.fanout, includes=args.includes, functions=args.functions)
+
+    def cleanup(self):
+        shutil.rmtree(self.root)
+
+    def ino(self, *argv):
+        """
+        Run ino in the project and return how long it has taken.
+        """
+        cmd = [sys.executable, os.path.join(ROOT, 'bin', 'ino')] + list(argv)
+        start = time.time()
+        proc = subprocess.Popen(cmd, cwd=self.project, env=self.env,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        output, _ = proc.communicate()
+        elapsed = time.time() - start
+        if proc.returncode != 0:
+            sys.stderr.write(output)
+            raise RuntimeError('%s has failed with code %s' % (' '.join(argv), proc.returncode))
+        return elapsed
+
+    def remove_build(self):
+        shutil.rmtree(os.path.join(self.project, '.build'), ignore_errors=True)
+
+    def remove_board_db(self):
+        shutil.rmtree(os.path.join(self.cache, 'boards'), ignore_errors=True)
+
+    def edit_sketch(self):
+        self.edits += 1
+        with open(os.path.join(self.project, 'src', 'sketch0.ino'), 'a') as f:
+            f.write('int edit%d;\n' % self.edits)
+
+    def cases(self):
+        """
+        Return list of (name, ino arguments, function preparing a run).
+        """
+        build = ['build', '-d', self.dist, '-j', str(self.args.jobs)]
+        return [
+            ('startup', ['--help'], None),
+            ('list-models', ['list-models', '-d', self.dist], None),
+            ('list-models cold', ['list-models', '-d', self.dist], self.remove_board_db),
+            ('preproc', ['preproc', '-d', self.dist, os.path.join('src', 'sketch0.ino')], None),
+            ('build cold', build, self.remove_build),
+            ('build incremental', build, self.edit_sketch),
+            ('build up to date', build, None),
+        ]
+
+    def run(self, name, argv, prepare):
+        # the first run warms up caches of the file system and of ino
+        if prepare:
+            prepare()
+        self.ino(*argv)
+
+        times = []
+        for _ in xrange(self.args.repeat):
+            if prepare:
+                prepare()
+            times.append(self.ino(*argv))
+        times.sort()
+        return {'min': times[0], 'median': times[len(times) // 2], 'runs': len(times)}
+
+
+def compare(results, baseline, tolerance, noise):
+    """
+    Print results next to `baseline' ones and return names of benchmarks
+    slower by more than `tolerance' share and `noise' seconds.
+    """
+    regressions = []
+    print
+    print '%-20s %10s %10s %8s' % ('', 'baseline', 'current', 'change')
+    for name, result in results.iteritems():
+        base = baseline['results'].get(name)
+        if not base:
+            print '%-20s %10s %9.3fs' % (name, '-', result['min'])
+            continue
+        change = result['min'] / base['min'] - 1 if base['min'] else 0
+        mark = ''
+        if change > tolerance and result['min'] - base['min'] > noise:
+            mark = ' REGRESSION'
+            regressions.append(name)
+        print '%-20s %9.3fs %9.3fs %+7.1f%%%s' % (name, base['min'], result['min'],
+                                                  change * 100, mark)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per benchmark (default: 5)')
+    parser.add_argument('--boards', type=int, default=500,
+                        help='Board models in boards.txt (default: 500)')
+    parser.add_argument('--core-sources', type=int, default=20,
+                        help='Sources of the Arduino core (default: 20)')
+    parser.add_argument('--sketches', type=int, default=5,
+                        help='Sketches in the project (default: 5)')
+    parser.add_argument('--libraries', type=int, default=30,
+                        help='Libraries in the project (default: 30)')
+    parser.add_argument('--fanout', type=int, default=3,
+                        help='Most libraries a library includes (default: 3)')
+    parser.add_argument('--includes', type=int, default=4,
+                        help='Libraries a sketch includes (default: 4)')
+    parser.add_argument('--functions', type=int, default=50,
+                        help='Functions in a sketch (default: 50)')
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='Jobs of ino build (default: 4)')
+    parser.add_argument('-k', '--only', metavar='NAME', action='append',
+                        help='Run only benchmarks with NAME in their names')
+    parser.add_argument('--save', metavar='FILE', help='Save results as a baseline to FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='Compare results with a baseline saved to FILE and exit '
+                        'with code 1 if any benchmark has become slower')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Share of slowdown considered a regression (default: 0.25)')
+    parser.add_argument('--noise', type=float, default=0.01,
+                        help='Seconds of slowdown that are never a regression '
+                        '(default: 0.01)')
+    args = parser.parse_args()
+
+    parameters = dict((name, getattr(args, name)) for name in PARAMETERS + ['jobs'])
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['parameters'] != parameters:
+            parser.error('baseline is made with other parameters: %s' %
+                         ' '.join('--%s %s' % (name.replace('_', '-'), value)
+                                  for name, value in sorted(baseline['parameters'].items())))
+
+    bench = Bench(args)
+    results = OrderedDict()
+    try:
+        bench.setup()
+        for name, argv, prepare in bench.cases():
+            if args.only and not any(k in name for k in args.only):
+                continue
+            results[name] = result = bench.run(name, argv, prepare)
+            print '%-20s %8.3f s min %8.3f s median' % (name, result['min'], result['median'])
+    finally:
+        bench.cleanup()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'ino': ino.__version__,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'parameters': parameters,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if baseline and compare(results, baseline, args.tolerance, args.noise):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
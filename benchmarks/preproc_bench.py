@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark prototype extraction on large generated sketches.
+
+The corpus mimics what makes real-world sketches big: font and lookup
+tables in PROGMEM, string tables, long runs of small functions and
+commented-out code. Run from the repository root:
+
+    python -m benchmarks.preproc_bench [--repeat N] [--scale N]
+"""
+
+import argparse
+import random
+import time
+
+from ino.commands.preproc import Preprocess
+
+
+def font_table(rnd, glyphs):
+    rows = []
+    for i in xrange(glyphs):
+        data = ', '.join('0x%02x' % rnd.randrange(256) for _ in xrange(8))
+        rows.append("    { %s }, // '%s'" % (data, chr(32 + i % 95).replace('\\', '\\\\')))
+    return 'const uint8_t font[][8] PROGMEM = {\n%s\n};\n' % '\n'.join(rows)
+
+
+def lookup_table(rnd, size):
+    values = ', '.join(str(rnd.randrange(-32768, 32768)) for _ in xrange(size))
+    return 'const int16_t sine[%d] PROGMEM = { %s };\n' % (size, values)
+
+
+def string_table(rnd, size):
+    lines = ['const char msg%d[] PROGMEM = "Message {%d} \\"%s\\"";' % (i, i, '}' * (i % 3))
+             for i in xrange(size)]
+    return '\n'.join(lines) + '\n'
+
+
+def functions(rnd, count):
+    out = []
+    for i in xrange(count):
+        out.append('/* helper %d\n * void fake%d() { }\n */\n' % (i, i))
+        out.append('static int helper%d(int a, const char* s[], byte &b)\n{\n'
+                   '    if (a > %d) {\n        Serial.println("}");\n    }\n'
+                   '    return a + \'{\';\n}\n' % (i, i))
+    return ''.join(out)
+
+
+def sketch(scale, seed=0):
+    rnd = random.Random(seed)
+    return ''.join([
+        '#include <avr/pgmspace.h>\n',
+        '#define SWAP(a, b) { int t = a; \\\n    a = b; b = t; }\n',
+        font_table(rnd, 96 * scale),
+        lookup_table(rnd, 1024 * scale),
+        string_table(rnd, 100 * scale),
+        functions(rnd, 50 * scale),
+        'void setup() {\n}\n\nvoid loop() {\n}\n',
+    ])
+
+
+def corpus(scale):
+    return [
+        ('fonts', sketch(scale)),
+        ('unterminated comment', sketch(scale) + '/* ' + 'void f() { ' * 1000 * scale),
+        ('unbalanced quotes', 'void f() {\n' + '"\\"\' x\n' * 5000 * scale + '}\n'),
+        ('long declaration', 'int ' + ' '.join('v%d' % i for i in xrange(5000 * scale)) + ' {}\n'),
+        ('deep braces', 'void f() ' + '{' * 10000 * scale + '}' * 10000 * scale),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per sketch (default: 3)')
+    parser.add_argument('--scale', type=int, default=4, help='Corpus size multiplier (default: 4)')
+    args = parser.parse_args()
+
+    preproc = Preprocess(None)
+    for name, src in corpus(args.scale):
+        best = None
+        for _ in xrange(args.repeat):
+            start = time.time()
+            prototypes = preproc.prototypes(src)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print '%-22s %8d KB %6d prototypes %8.3f s' % (name, len(src) // 1024, len(prototypes), best)
+
+
+if __name__ == '__main__':
+    main()
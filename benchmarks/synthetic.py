@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic Arduino distributions and projects for benchmarks.
+
+The distribution has a core, a variant, a `boards.txt' of any size and
+stand-in `avr-gcc', `avr-g++', `avr-ar' and `avr-objcopy' shell scripts
+which only write their output files, so projects are built anywhere with
+no AVR toolchain and nearly all the time measured is spent by ino and
+make. Projects have sketches and libraries including each other along a
+random, but reproducible, graph.
+"""
+
+import os
+import os.path
+import random
+import stat
+
+
+# Compiles, links and prints a dependency rule for -MM
+COMPILER = r'''#!/bin/sh
+out=
+mm=
+srcs=
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -o) out=$2; shift ;;
+        -MM) mm=1 ;;
+        -MF|-MT|-iquote) shift ;;
+        -*) ;;
+        *) srcs="$srcs $1" ;;
+    esac
+    shift
+done
+if [ -n "$mm" ]; then
+    for src in $srcs; do
+        name=${src##*/}
+        echo "${name%.*}.o: $src"
+    done
+    exit 0
+fi
+echo "obj$srcs" > "$out"
+'''
+
+# ar rcs ARCHIVE OBJECTS...
+ARCHIVER = '''#!/bin/sh
+shift
+out=$1
+shift
+cat "$@" > "$out"
+'''
+
+# objcopy -O ihex -R .eeprom IN OUT
+OBJCOPY = '''#!/bin/sh
+cp "$5" "$6"
+'''
+
+
+def write(path, contents, executable=False):
+    d = os.path.dirname(path)
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    with open(path, 'w') as f:
+        f.write(contents)
+    if executable:
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def boards_txt(count, seed=0):
+    """
+    Return `boards.txt' describing `count' board models, `uno' first.
+    """
+    rnd = random.Random(seed)
+    mcus = ['atmega328p', 'atmega168', 'atmega2560', 'atmega32u4', 'atmega1284p']
+    lines = ['# synthetic boards', '']
+    for i in xrange(count):
+        name = 'uno' if i == 0 else 'board%d' % i
+        mcu = rnd.choice(mcus)
+        settings = [
+            ('name', 'Synthetic Board %d' % i),
+            ('upload.protocol', rnd.choice(['arduino', 'avr109', 'stk500v2'])),
+            ('upload.maximum_size', str(rnd.choice([14336, 30720, 32256, 258048]))),
+            ('upload.speed', str(rnd.choice([19200, 57600, 115200]))),
+            ('bootloader.low_fuses', '0x%02x' % rnd.randrange(256)),
+            ('bootloader.high_fuses', '0x%02x' % rnd.randrange(256)),
+            ('bootloader.extended_fuses', '0x%02x' % rnd.randrange(256)),
+            ('bootloader.path', 'optiboot'),
+            ('bootloader.file', 'optiboot_%s.hex' % mcu),
+            ('bootloader.unlock_bits', '0x3F'),
+            ('bootloader.lock_bits', '0x0F'),
+            ('build.mcu', mcu),
+            ('build.f_cpu', rnd.choice(['8000000L', '16000000L'])),
+            ('build.core', 'arduino'),
+            ('build.variant', 'standard'),
+        ]
+        if mcu == 'atmega32u4':
+            settings += [('build.vid', '0x2341'), ('build.pid', '0x%04x' % rnd.randrange(0x10000))]
+        lines.extend('%s.%s=%s' % (name, key, value) for key, value in settings)
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def create_distribution(root, boards=100, core_sources=10):
+    """
+    Create a fake Arduino distribution in `root' with `boards' board
+    models and `core_sources' sources in the core.
+    """
+    write(os.path.join(root, 'lib', 'version.txt'), '1.0.5\n')
+
+    hardware = os.path.join(root, 'hardware', 'arduino')
+    write(os.path.join(hardware, 'boards.txt'), boards_txt(boards))
+    core = os.path.join(hardware, 'cores', 'arduino')
+    write(os.path.join(core, 'Arduino.h'),
+          '#ifndef Arduino_h\n#define Arduino_h\n#include "pins_arduino.h"\n'
+          'void setup(void);\nvoid loop(void);\n#endif\n')
+    write(os.path.join(core, 'main.cpp'),
+          '#include <Arduino.h>\nint main(void) {\n    setup();\n    for (;;) loop();\n}\n')
+    for i in xrange(core_sources):
+        write(os.path.join(core, 'core%d.c' % i),
+              '#include "Arduino.h"\nint core%d(int a) { return a + %d; }\n' % (i, i))
+    write(os.path.join(hardware, 'variants', 'standard', 'pins_arduino.h'),
+          '#define NUM_DIGITAL_PINS 20\n')
+
+    # an empty standard library directory is searched all the same
+    os.makedirs(os.path.join(root, 'libraries'))
+
+    tools = os.path.join(root, 'hardware', 'tools', 'avr', 'bin')
+    for name, script in [('avr-gcc', COMPILER), ('avr-g++', COMPILER),
+                         ('avr-ar', ARCHIVER), ('avr-objcopy', OBJCOPY)]:
+        write(os.path.join(tools, name), script, executable=True)
+
+
+def library_graph(libraries, fanout, seed=0):
+    """
+    Return list of libraries each library includes. A library includes
+    up to `fanout' libraries created before it, so the graph has no
+    cycles but could be as deep as the number of libraries.
+    """
+    rnd = random.Random(seed)
+    return [sorted(rnd.sample(xrange(i), min(i, rnd.randint(0, fanout))))
+            for i in xrange(libraries)]
+
+
+def sketch(index, includes, functions):
+    lines = ['#include <Lib%d.h>' % lib for lib in includes]
+    lines.append('')
+    for i in xrange(functions):
+        lines.append('int sketch%d_%d(int a, const char *s)\n{\n    return a + s[%d];\n}\n' %
+                     (index, i, i))
+    if index == 0:
+        lines.append('void setup()\n{\n}\n\nvoid loop()\n{\n    sketch0_0(0, "");\n}\n')
+    return '\n'.join(lines)
+
+
+def create_project(root, sketches=1, libraries=10, fanout=2, includes=3, functions=20,
+                   seed=0):
+    """
+    Create a project in `root' with `sketches' sketches of `functions'
+    functions each, including `includes' of `libraries' libraries in
+    `lib'. Libraries include each other, see `library_graph'.
+    """
+    rnd = random.Random(seed)
+    os.makedirs(os.path.join(root, 'src'))
+    os.makedirs(os.path.join(root, 'lib'))
+
+    for i, deps in enumerate(library_graph(libraries, fanout, seed)):
+        lib_dir = os.path.join(root, 'lib', 'Lib%d' % i)
+        header = ['#ifndef LIB%d_H' % i, '#define LIB%d_H' % i]
+        header += ['#include <Lib%d.h>' % dep for dep in deps]
+        header += ['int lib%d(int a);' % i, '#endif', '']
+        write(os.path.join(lib_dir, 'Lib%d.h' % i), '\n'.join(header))
+        write(os.path.join(lib_dir, 'Lib%d.cpp' % i),
+              '#include "Lib%d.h"\n#include "utility/helper.h"\n'
+              'int lib%d(int a) { return helper%d(a); }\n' % (i, i, i))
+        write(os.path.join(lib_dir, 'utility', 'helper.h'), 'int helper%d(int a);\n' % i)
+        write(os.path.join(lib_dir, 'utility', 'helper.c'),
+              'int helper%d(int a) { return a * %d; }\n' % (i, i))
+
+    for i in xrange(sketches):
+        used = sorted(rnd.sample(xrange(libraries), min(includes, libraries)))
+        write(os.path.join(root, 'src', 'sketch%d.ino' % i), sketch(i, used, functions))
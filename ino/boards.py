@@ -0,0 +1,170 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import json
+import hashlib
+import tempfile
+
+from ino.utils import format_available_options, mkdir
+
+
+class BoardDatabase(object):
+    """
+    Compiled form of `boards.txt' files kept in a per-user cache directory.
+
+    A compiled file starts with a line of JSON header: the source file
+    stat and for each board its name, description and position of its
+    settings. Settings of every board follow as separate JSON blobs, so
+    looking up one board reads the header and a single blob. A file is
+    compiled again once its source has been changed or replaced.
+    """
+
+    version = 1
+
+    # (root, boards.txt path) -> (source stat, index, settings by offset)
+    # of files looked up by this process, kept in memory by `ino server'
+    memo = {}
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, boards_txt):
+        key = hashlib.sha1(os.path.abspath(boards_txt)).hexdigest()
+        return os.path.join(self.root, key + '.db')
+
+    def index(self, boards_txt):
+        """
+        Return list of (name, description, offset, length) of boards in
+        `boards_txt' in order of appearance.
+        """
+        st = os.stat(boards_txt)
+        source = [os.path.abspath(boards_txt), st.st_ino, st.st_mtime, st.st_size]
+        memo = self.memo.get((self.root, source[0]))
+        if memo and memo[0] == source:
+            return memo[1]
+
+        boards = None
+        try:
+            with open(self.path(boards_txt), 'rb') as f:
+                header = json.loads(f.readline())
+            if header['version'] == self.version and header['source'] == source:
+                boards = header['boards']
+        except (IOError, ValueError, KeyError):
+            pass
+        if boards is None:
+            boards = self.compile(boards_txt, source)
+        self.memo[self.root, source[0]] = (source, boards, {})
+        return boards
+
+    def compile(self, boards_txt, source):
+        boards = parse(boards_txt)
+        blobs = []
+        index = []
+        offset = 0
+        for name, settings in boards:
+            blob = json.dumps(settings)
+            index.append([name, settings.get('name', ''), offset, len(blob)])
+            blobs.append(blob)
+            offset += len(blob)
+
+        header = json.dumps({'version': self.version, 'source': source, 'boards': index})
+        mkdir(self.root)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header + '\n')
+            f.write(''.join(blobs))
+        os.rename(tmp_path, self.path(boards_txt))
+        return json.loads(header)['boards']
+
+    def settings(self, boards_txt, offset, length):
+        """
+        Return settings of the board at `offset' of a file indexed
+        before. They are shared, so should not be changed.
+        """
+        memo = self.memo.get((self.root, os.path.abspath(boards_txt)))
+        loaded = memo[2] if memo else {}
+        if offset not in loaded:
+            with open(self.path(boards_txt), 'rb') as f:
+                f.readline()
+                f.seek(f.tell() + offset)
+                loaded[offset] = json.loads(f.read(length), object_hook=encode_dict)
+        return loaded[offset]
+
+
+class BoardModels(object):
+    """
+    Board models found in `boards.txt' files of one or several hardware
+    platforms. Models are listed from the compiled index and settings of
+    a model are loaded on first access. If several files define the same
+    model, the first one wins.
+    """
+
+    def __init__(self, files, db):
+        self.files = files
+        self.db = db
+        self.default = None
+        self.models = {}
+        self.index = []
+        self.by_name = {}
+        for boards_txt in files:
+            for name, description, offset, length in db.index(boards_txt):
+                name = name.encode('utf-8')
+                if name not in self.by_name:
+                    self.by_name[name] = (boards_txt, offset, length)
+                    self.index.append((name, description.encode('utf-8')))
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __iter__(self):
+        return (name for name, _ in self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, name):
+        if name not in self.models:
+            self.models[name] = self.db.settings(*self.by_name[name])
+        return self.models[name]
+
+    def format(self):
+        return format_available_options(self.index, head_width=12, default=self.default)
+
+
+def parse(boards_txt):
+    """
+    Return list of (model name, nested settings dict) pairs for board
+    models in `boards_txt'.
+    """
+    boards = []
+    by_name = {}
+    with open(boards_txt) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            multikey, val = line.split('=', 1)
+            multikey = multikey.split('.')
+            if len(multikey) == 1 or multikey[0] == 'menu':
+                # not a board setting, menus are titles of custom options
+                continue
+
+            if multikey[0] not in by_name:
+                by_name[multikey[0]] = {}
+                boards.append((multikey[0], by_name[multikey[0]]))
+
+            subdict = by_name[multikey[0]]
+            for key in multikey[1:-1]:
+                if key not in subdict:
+                    subdict[key] = {}
+                subdict = subdict[key]
+
+            subdict[multikey[-1]] = val
+
+    return boards
+
+
+def encode_dict(d):
+    return dict((k.encode('utf-8'), v.encode('utf-8') if isinstance(v, unicode) else v)
+                for k, v in d.iteritems())
@@ -1,9 +1,33 @@
 # -*- coding: utf-8; -*-
 
-from ino.commands.init import Init
-from ino.commands.preproc import Preprocess
-from ino.commands.build import Build
-from ino.commands.clean import Clean
-from ino.commands.upload import Upload
-from ino.commands.serial import Serial
-from ino.commands.listmodels import ListModels
+import importlib
+
+
+# Commands by name along with their classes. A command module is imported
+# only when the command is run, so ino starts without importing
+# dependencies of all the other commands.
+registry = [
+    ('build', 'ino.commands.build.Build'),
+    ('cache', 'ino.commands.cache.Cache'),
+    ('clean', 'ino.commands.clean.Clean'),
+    ('dump', 'ino.commands.dump.Dump'),
+    ('init', 'ino.commands.init.Init'),
+    ('list-models', 'ino.commands.listmodels.ListModels'),
+    ('preproc', 'ino.commands.preproc.Preprocess'),
+    ('serial', 'ino.commands.serial.Serial'),
+    ('server', 'ino.commands.server.Server'),
+    ('upload', 'ino.commands.upload.Upload'),
+    ('watch', 'ino.commands.watch.Watch'),
+]
+
+
+def names():
+    return [name for name, _ in registry]
+
+
+def load(name):
+    """
+    Import and return class of command `name'.
+    """
+    module_name, class_name = dict(registry)[name].rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
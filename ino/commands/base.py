@@ -6,6 +6,9 @@ import textwrap
 class Command(object):
     name = None
     help_line = None
+    # whether the command uses discovery results kept in the build
+    # directory between runs, they are neither loaded nor saved otherwise
+    uses_environment = True
 
     def __init__(self, environment):
         self.e = environment
@@ -1,24 +1,63 @@
 # -*- coding: utf-8; -*-
 
-import re
+import sys
 import os.path
-import inspect
 import subprocess
 import platform
-import jinja2
+import threading
+import hashlib
+import json
 import shlex
 
-from jinja2.runtime import StrictUndefined
-
+import ino
 import ino.filters
 
 from ino.commands.base import Command
-from ino.environment import Version
+from ino.commands.preproc import Preprocess
+from ino.environment import Environment, Version
 from ino.filters import colorize
-from ino.utils import SpaceList, list_subdirs
+from ino.fingerprint import Fingerprint
+from ino.fsindex import FileIndex
+from ino.headers import HeaderIndex
+from ino.scanner import IncludeScanner
+from ino.store import ArchiveStore, archive_key, tree_digest
+from ino.tracing import Tracer
+from ino.utils import SpaceList, JobServer, map_concurrently, toposort, cpu_count, cache_dir, mkdir
 from ino.exc import Abort
 
 
+# Converted sketches, dependency indexes and compiled templates are kept
+# in memory between builds run by the same process, see `ino watch' and
+# `ino server'. All of them are checked against their sources when used
+sketches = {}
+indexes = {}
+template_code = {}
+
+
+def bytecode_cache(directory):
+    """
+    Return jinja bytecode cache keeping compiled templates in `directory'
+    and in `template_code'.
+    """
+    import jinja2
+
+    class BytecodeCache(jinja2.FileSystemBytecodeCache):
+        def load_bytecode(self, bucket):
+            checksum, code = template_code.get(bucket.key, (None, None))
+            if checksum == bucket.checksum:
+                bucket.code = code
+                return
+            super(BytecodeCache, self).load_bytecode(bucket)
+            if bucket.code is not None:
+                template_code[bucket.key] = (bucket.checksum, bucket.code)
+
+        def dump_bytecode(self, bucket):
+            super(BytecodeCache, self).dump_bytecode(bucket)
+            template_code[bucket.key] = (bucket.checksum, bucket.code)
+
+    return BytecodeCache(directory)
+
+
 class Build(Command):
     """
     Build a project in the current directory and produce a ready-to-upload
@@ -50,10 +89,21 @@ class Build(Command):
     default_cflags = ''
     default_cxxflags = '-fno-exceptions'
     default_ldflags = '-Os --gc-sections'
+    default_jobs = cpu_count()
+    default_deps = 'scan'
+
+    # arguments that affect build result
+    fingerprint_args = ['board_model', 'arduino_dist', 'make', 'cc', 'cxx', 'ar',
+                        'objcopy', 'cppflags', 'cflags', 'cxxflags', 'ldflags',
+                        'deps']
+    tools = ['make', 'cc', 'cxx', 'ar', 'objcopy']
+
+    # board model output lines are prefixed with, if several are built
+    label = None
 
     def setup_arg_parser(self, parser):
         super(Build, self).setup_arg_parser(parser)
-        self.e.add_board_model_arg(parser)
+        self.e.add_board_model_arg(parser, multiple=True)
         self.e.add_arduino_dist_arg(parser)
 
         parser.add_argument('--make', metavar='MAKE',
@@ -114,9 +164,51 @@ class Build(Command):
                             'being invoked directly (i.e. the `-Wl,\' prefix '
                             'should be omitted). Default: "%(default)s".')
 
+        parser.add_argument('--deps', metavar='MODE', choices=['scan', 'compile'],
+                            default=self.default_deps,
+                            help='How header dependencies are tracked. `scan\' '
+                            'runs the compiler with -MM over every source '
+                            'before the build. `compile\' makes the compiler '
+                            'write them while compiling (-MMD -MP). '
+                            'Default: "%(default)s".')
+
+        parser.add_argument('--archive-store', metavar='DIR', nargs='?',
+                            const=cache_dir('archives'),
+                            help='Share built Arduino core and libraries among '
+                            'projects through a store of archives in DIR. An '
+                            'archive is reused if it was built by the same '
+                            'tools with the same flags from the same sources. '
+                            'Default DIR: "%(const)s".')
+
+        parser.add_argument('--object-cache', default=False, action='store_true',
+                            help='Take compiled objects from the cache if the '
+                            'same preprocessed source was already compiled '
+                            'with the same command. See `ino cache --help\'.')
+
+        parser.add_argument('-j', '--jobs', metavar='N', type=int,
+                            default=self.default_jobs,
+                            help='Number of make jobs to run simultaneously. '
+                            'If ino is run by a recursive rule of an outer '
+                            '`make -j\' the jobserver of that make is joined '
+                            'instead. Default: number of CPUs (%(default)s).')
+
+        parser.add_argument('-l', '--load-average', metavar='LOAD', type=float,
+                            help='Do not start new make jobs while the system '
+                            'load average is at least LOAD.')
+
         parser.add_argument('-v', '--verbose', default=False, action='store_true',
                             help='Verbose make output')
 
+        parser.add_argument('--trace', metavar='FILE',
+                            help='Record how long every phase of the build and '
+                            'every job run by make take to FILE in Chrome '
+                            'trace event format, see chrome://tracing.')
+
+        parser.add_argument('--trace-summary', metavar='N', type=int, nargs='?',
+                            const=10,
+                            help='Print how long phases of the build took and '
+                            'N slowest files at the end. Default N: %(const)s.')
+
     def discover(self, args):
         self.e.find_arduino_dir('arduino_core_dir', 
                                 ['hardware', 'arduino', 'cores', 'arduino'], 
@@ -131,21 +223,14 @@ class Build(Command):
                                     ['hardware', 'arduino', 'variants'],
                                     human_name='Arduino variants directory')
 
-        toolset = [
-            ('make', args.make),
-            ('cc', args.cc),
-            ('cxx', args.cxx),
-            ('ar', args.ar),
-            ('objcopy', args.objcopy),
-        ]
-
-        for tool_key, tool_binary in toolset:
+        for tool_key in self.tools:
+            tool_binary = getattr(args, tool_key)
             self.e.find_arduino_tool(
                 tool_key, ['hardware', 'tools', 'avr', 'bin'], 
                 items=[tool_binary], human_name=tool_binary)
 
-    def setup_flags(self, args):
-        board = self.e.board_model(args.board_model)
+    def setup_flags(self, args, board_model):
+        board = self.e.board_model(board_model)
         mcu = '-mmcu=' + board['build']['mcu']
         # Hard-code the flags that are essential to building the sketch
         self.e['cppflags'] = SpaceList([
@@ -166,6 +251,7 @@ class Build(Command):
             variant_dir = os.path.join(self.e.arduino_variants_dir, 
                                        board['build']['variant'])
             self.e.cppflags.append('-I' + variant_dir)
+            self.e['variant_dir'] = variant_dir
 
         self.e['cflags'] = SpaceList(shlex.split(args.cflags))
         self.e['cxxflags'] = SpaceList(shlex.split(args.cxxflags))
@@ -176,6 +262,17 @@ class Build(Command):
             '-Wl,' + flag for flag in shlex.split(args.ldflags)
         ])
 
+        self.e['deps_mode'] = args.deps
+
+        # compiler commands are run through the object cache if requested
+        self.e['cc_launcher'] = SpaceList()
+        if args.object_cache:
+            self.e['cc_launcher'].extend([self.e.ino, 'cache', 'compile', '--'])
+        # and timed if the build is traced
+        self.e['trace_launcher'] = SpaceList()
+        if self.tracer.enabled:
+            self.e['trace_launcher'].extend(self.tracer.launcher)
+
         self.e['names'] = {
             'obj': '%s.o',
             'lib': 'lib%s.a',
@@ -183,16 +280,39 @@ class Build(Command):
             'deps': '%s.d',
         }
 
+    def setup_jobs(self, args):
+        self.jobs = max(args.jobs, 1)
+        self.e['make_flags'] = SpaceList()
+        if args.load_average:
+            self.e['make_flags'].append('-l%s' % args.load_average)
+
+        # All make processes started concurrently, for dependency scans and
+        # for all boards, share a single limit: the jobserver of an outer
+        # `make -j' if ino is run by its recursive rule, or one run by ino
+        self.jobserver = JobServer.join() or JobServer(self.jobs)
+
     def create_jinja(self, verbose):
+        import jinja2
+        from jinja2.runtime import StrictUndefined
+
         templates_dir = os.path.join(os.path.dirname(__file__), '..', 'make')
         self.jenv = jinja2.Environment(
             loader=jinja2.FileSystemLoader(templates_dir),
             undefined=StrictUndefined, # bark on Undefined render
-            extensions=['jinja2.ext.do'])
+            extensions=['jinja2.ext.do'],
+            # templates are compiled once per ino installation
+            bytecode_cache=bytecode_cache(mkdir(cache_dir('jinja'))))
 
         # inject @filters from ino.filters
-        for name, f in inspect.getmembers(ino.filters, lambda x: getattr(x, 'filter', False)):
-            self.jenv.filters[name] = f
+        self.jenv.filters.update(ino.filters.registry)
+        # globs are recorded to find out whether rendering could be skipped
+        self.jenv.filters['glob'] = self._recording_glob
+        self.glob_log = threading.local()
+
+        # templates themselves are rendering inputs too
+        self.templates_stamp = [ino.__version__] + [
+            (name, os.path.getmtime(os.path.join(templates_dir, name)))
+            for name in sorted(os.listdir(templates_dir))]
 
         # inject globals
         self.jenv.globals['e'] = self.e
@@ -200,87 +320,472 @@ class Build(Command):
         self.jenv.globals['slash'] = os.path.sep
         self.jenv.globals['SpaceList'] = SpaceList
 
+    def _recording_glob(self, dir, *patterns, **kwargs):
+        result = ino.filters.glob(dir, *patterns, index=self.fsindex, **kwargs)
+        self.glob_log.records.append([str(dir), patterns, kwargs, result.paths()])
+        return result
+
+    def template_key(self, source, ctx):
+        env = sorted(item for item in self.e.iteritems() if item[0] != 'board_models')
+        # messages of makefiles are colorized only for a terminal
+        tty = sys.stdout.isatty()
+        inputs = (self.templates_stamp, source, self.jenv.globals['v'], tty, env,
+                  sorted(ctx.items()))
+        return hashlib.md5(repr(inputs)).hexdigest()
+
     def render_template(self, source, target, **ctx):
+        """
+        Render template `source' into `target' within the build directory.
+
+        Rendering is skipped if the template, its context, environment and
+        results of all globs it has made last time are the same. These are
+        kept in a `.stamp' file next to the target.
+        """
+        out_path = os.path.join(self.e.build_dir, target)
+        stamp_path = out_path + '.stamp'
+        key = self.template_key(source, ctx)
+
+        try:
+            with open(stamp_path) as f:
+                stamp = json.load(f)
+        except (IOError, ValueError):
+            stamp = None
+
+        if (stamp and stamp['key'] == key and os.path.exists(out_path) and
+                all(ino.filters.glob(dir, *patterns, index=self.fsindex, **kwargs).paths() == paths
+                    for dir, patterns, kwargs, paths in stamp['globs'])):
+            return out_path
+
+        self.glob_log.records = []
         template = self.jenv.get_template(source)
         contents = template.render(**ctx)
-        out_path = os.path.join(self.e.build_dir, target)
+        mkdir(os.path.dirname(out_path))
         with open(out_path, 'wt') as f:
             f.write(contents)
 
+        with open(stamp_path, 'wt') as f:
+            json.dump({'key': key, 'globs': self.glob_log.records}, f)
+
         return out_path
 
-    def make(self, makefile, **kwargs):
-        makefile = self.render_template(makefile + '.jinja', makefile, **kwargs)
-        ret = subprocess.call([self.e.make, '-f', makefile, 'all'])
+    def make(self, makefile, target=None, **kwargs):
+        name = makefile
+        with self.span('render ' + name, target=target or makefile):
+            makefile = self.render_template(makefile + '.jinja', target or makefile, **kwargs)
+        env = self.jobserver.environ()
+        cmd = [self.e.make, '-f', makefile] + self.e.make_flags + ['all']
+        with self.jobserver.slot(), self.span('make ' + name, target=makefile):
+            if self.label:
+                # boards are built concurrently, output lines are labeled
+                proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT)
+                for line in iter(proc.stdout.readline, ''):
+                    self.say(line.rstrip('\n'))
+                ret = proc.wait()
+            else:
+                ret = subprocess.call(cmd, env=env)
         if ret != 0:
             raise Abort("Make failed with code %s" % ret)
 
-    def recursive_inc_lib_flags(self, libdirs):
-        flags = SpaceList()
-        for d in libdirs:
-            flags.append('-I' + d)
-            flags.extend('-I' + subd for subd in list_subdirs(d, recursive=True, exclude=['examples']))
-        return flags
-
-    def _scan_dependencies(self, dir, lib_dirs, inc_flags):
-        output_filepath = os.path.join(self.e.build_dir, os.path.basename(dir), 'dependencies.d')
-        self.make('Makefile.deps', inc_flags=inc_flags, src_dir=dir, output_filepath=output_filepath)
-        self.e['deps'].append(output_filepath)
-
-        # search for dependencies on libraries
-        # for this scan dependency file generated by make
-        # with regexes to find entries that start with
-        # libraries dirname
-        regexes = dict((lib, re.compile(r'\s' + lib + re.escape(os.path.sep))) for lib in lib_dirs)
+    def span(self, name, **args):
+        """
+        Return context manager recording how long its block takes if the
+        build is traced.
+        """
+        if self.label:
+            args['board'] = self.label
+        return self.tracer.span(name, **args)
+
+    def say(self, line):
+        with self.output_lock:
+            sys.stdout.write('%s %s\n' % (colorize('[%s]' % self.label, 'purple'), line))
+            sys.stdout.flush()
+
+    def preprocess_sketches(self):
+        """
+        Convert *.ino and *.pde sketches into *.cpp sources in the build
+        directory. A sketch is converted only if its contents or anything
+        else the result depends on has changed since last time, which is
+        tracked by digests in `sketches.cache'. Results are shared by builds
+        for all boards.
+        """
+        preproc = Preprocess(self.e)
+        src_build_dir = os.path.join(self.e.build_dir, os.path.basename(self.e.src_dir))
+        cache_path = os.path.join(self.e.build_dir, 'sketches.cache')
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            cache = {}
+
+        digests = {}
+        sketches = ino.filters.glob(self.e.src_dir, '*.pde', '*.ino', index=self.fsindex)
+        filemap = ino.filters.filemap(sketches, src_build_dir, self.e.names['cpp'])
+        for source, target in filemap.iterpaths():
+            with open(source) as f:
+                sketch = f.read()
+
+            inputs = [ino.__version__, preproc.header, source, sketch]
+            digests[target] = hashlib.sha1(repr(inputs)).hexdigest()
+            if cache.get(target) == digests[target] and os.path.exists(target):
+                continue
+
+            if digests[target] not in self.sketches:
+                print colorize(source, 'yellow')
+                self.sketches[digests[target]] = preproc.convert(sketch, source)
+            mkdir(os.path.dirname(target))
+            with open(target, 'wt') as f:
+                f.write(self.sketches[digests[target]])
+
+        # sources of sketches removed since then should not be built anymore
+        for target in set(cache) - set(digests):
+            if os.path.exists(target):
+                os.remove(target)
+
+        if digests != cache:
+            with open(cache_path, 'wt') as f:
+                json.dump(digests, f)
+
+        self.fsindex.invalidate(src_build_dir)
+
+    def _scan_dependencies(self, dir, inc_flags):
+        output_dir = os.path.join(self.e.build_dir, os.path.basename(dir))
+        output_filepath = os.path.join(output_dir, 'dependencies.d')
+        # a separate makefile for each directory, they are scanned concurrently
+        self.make('Makefile.deps', target=os.path.join(os.path.basename(dir), 'Makefile.deps'),
+                  inc_flags=inc_flags, src_dir=dir, output_filepath=output_filepath)
+        return output_filepath
+
+    def _scan_libraries(self, dir, libs_by_dir, scanner):
+        src_build_dir = os.path.join(self.e.build_dir, os.path.basename(dir))
+        sources = [(source.path, []) for source in ino.filters.glob(dir, '*.c', '*.cpp', index=self.fsindex)]
+        if dir == self.e.src_dir:
+            # preprocessed sketches, see `iquote' in Makefile.common.jinja
+            sources.extend((source.path, [os.path.dirname(os.path.join(dir, source.filename))])
+                           for source in ino.filters.glob(src_build_dir, '*.cpp', index=self.fsindex))
+
+        headers = set()
+        for source, quote_dirs in sources:
+            headers.update(scanner.dependencies(source, quote_dirs))
+
+        # map every header to a library it belongs to by walking up
+        # its directory tree
         used_libs = set()
-        with open(output_filepath) as f:
-            for line in f:
-                for lib, regex in regexes.iteritems():
-                    if regex.search(line) and lib != dir:
-                        used_libs.add(lib)
+        for header in headers:
+            d = os.path.dirname(header)
+            while d and d not in libs_by_dir and os.path.dirname(d) != d:
+                d = os.path.dirname(d)
+            lib = libs_by_dir.get(d)
+            if lib and lib != dir:
+                used_libs.add(lib)
 
         return used_libs
 
-    def scan_dependencies(self):
-        self.e['deps'] = SpaceList()
-
-        lib_dirs = [self.e.arduino_core_dir] + list_subdirs(self.e.lib_dir) + list_subdirs(self.e.arduino_libraries_dir)
-        inc_flags = self.recursive_inc_lib_flags(lib_dirs)
+    def dependency_indexes(self, lib_dirs, inc_dirs):
+        """
+        Return HeaderIndex of `lib_dirs' and IncludeScanner of `inc_dirs'
+        with their caches loaded and the index up to date. They are kept
+        in `self.indexes' between builds run by the same process, see
+        `ino watch' and `ino server', and are shared by all boards.
+        """
+        key = os.path.abspath(self.e.output_dir)
+        if key in self.indexes:
+            headers, scanner = self.indexes[key]
+            headers.lib_dirs = lib_dirs
+            headers.fsindex = self.fsindex
+            scanner.inc_dirs = inc_dirs
+            scanner.reset()
+        else:
+            headers = HeaderIndex(lib_dirs, os.path.join(self.e.output_dir, 'headers.cache'),
+                                  self.fsindex)
+            headers.load()
+            scanner = IncludeScanner(inc_dirs, os.path.join(self.e.output_dir, 'includes.cache'),
+                                     headers)
+            scanner.load()
+            self.indexes[key] = (headers, scanner)
+
+        headers.update()
+        headers.save()
+        return headers, scanner
+
+    def include_dirs(self):
+        return [flag[2:] for flag in self.e.cppflags if flag.startswith('-I')]
+
+    def find_libraries(self):
+        """
+        Find libraries used by sources and by those libraries in turn.
+        Return a dict of libraries each directory depends on, all used
+        libraries in the link order and -I flags to find their headers.
+        """
+        lib_dirs = ([self.e.arduino_core_dir] + self.fsindex.subdirs(self.e.lib_dir) +
+                    self.fsindex.subdirs(self.e.arduino_libraries_dir))
+        lib_rank = dict((lib, i) for i, lib in enumerate(lib_dirs))
+        libs_by_dir = dict((os.path.normpath(lib), lib) for lib in lib_dirs)
+
+        headers, scanner = self.dependency_indexes(lib_dirs, self.include_dirs())
+
+        # Walk over the library graph starting from sources
+        lib_deps = {}
+        found_libs = []
+        pending = [self.e.src_dir]
+        while pending:
+            dir = pending.pop(0)
+            lib_deps[dir] = sorted(self._scan_libraries(dir, libs_by_dir, scanner),
+                                   key=lib_rank.get)
+            for lib in lib_deps[dir]:
+                if lib not in found_libs:
+                    found_libs.append(lib)
+                    pending.append(lib)
+
+        scanner.save()
+
+        for name, libs in sorted(headers.collisions(scanner.indexed).items()):
+            print colorize('Warning: %s is provided by several libraries: %s. Using the first one' %
+                           (name, ', '.join(libs)), 'yellow')
 
         # If lib A depends on lib B it have to appear before B in final
         # list so that linker could link all together correctly
-        # but order of `_scan_dependencies` is not defined, so...
-        
-        # 1. Get dependencies of sources in arbitrary order
-        used_libs = list(self._scan_dependencies(self.e.src_dir, lib_dirs, inc_flags))
-
-        # 2. Get dependencies of dependency libs themselves: existing dependencies
-        # are moved to the end of list maintaining order, new dependencies are appended
-        scanned_libs = set()
-        while scanned_libs != set(used_libs):
-            for lib in set(used_libs) - scanned_libs:
-                dep_libs = self._scan_dependencies(lib, lib_dirs, inc_flags)
-
-                i = 0
-                for ulib in used_libs[:]:
-                    if ulib in dep_libs:
-                        # dependency lib used already, move it to the tail
-                        used_libs.append(used_libs.pop(i))
-                        dep_libs.remove(ulib)
-                    else:
-                        i += 1
-
-                # append new dependencies to the tail
-                used_libs.extend(dep_libs)
-                scanned_libs.add(lib)
+        used_libs = toposort(found_libs, lib_deps)
 
-        self.e['used_libs'] = used_libs
-        self.e['cppflags'].extend(self.recursive_inc_lib_flags(used_libs))
+        # Instead of every subdirectory of every library only roots of used
+        # libraries and directories headers were found in are searched
+        inc_flags = SpaceList(headers.inc_flags(used_libs + scanner.indexed.values()))
+        return lib_deps, used_libs, inc_flags
 
-    def run(self, args):
-        self.discover(args)
-        self.setup_flags(args)
+    def scan_dependencies(self, libraries):
+        self.lib_deps, used_libs, inc_flags = libraries
+        self.e['deps'] = SpaceList()
+
+        if self.e.deps_mode == 'scan':
+            # dependency files of sources and each library are independent,
+            # so they are all made concurrently
+            self.e['deps'].extend(map_concurrently(
+                lambda dir: self._scan_dependencies(dir, inc_flags),
+                [self.e.src_dir] + used_libs, self.jobs))
+
+        self.e['used_libs'] = used_libs
+        self.e['cppflags'].extend(inc_flags)
+
+    def archive_path(self, lib):
+        name = os.path.basename(lib)
+        return os.path.join(self.e.build_dir, name, self.e.names['lib'] % name)
+
+    def archive_keys(self):
+        """
+        Return dict of archive store keys of used libraries.
+        """
+        digests = {}
+        def digest(dir):
+            if dir not in digests:
+                digests[dir] = tree_digest(dir, exclude=['examples'])
+            return digests[dir]
+
+        # include paths are covered by source digests instead, so that
+        # projects using different sets of libraries could share archives
+        flags = [[f for f in self.e.cppflags if not f.startswith('-I')],
+                 self.e.cflags, self.e.cxxflags]
+        tools = [self.e.cc, self.e.cxx, self.e.ar]
+        common = [digest(self.e.variant_dir)] if 'variant_dir' in self.e else []
+
+        keys = {}
+        for lib in self.e.used_libs:
+            # headers could come from the library and all its dependencies
+            deps = set()
+            pending = [lib]
+            while pending:
+                for dep in self.lib_deps.get(pending.pop(), []):
+                    if dep not in deps:
+                        deps.add(dep)
+                        pending.append(dep)
+            sources = [digest(lib)] + sorted(digest(d) for d in deps) + common
+            keys[lib] = archive_key(tools, flags, sources)
+
+        return keys
+
+    def fetch_archives(self, store):
+        """
+        Place archives available in the store into the build directory. Make
+        then treats them as prebuilt, without rules to build them.
+        """
+        self.e['prebuilt_libs'] = []
+        if not store:
+            return {}
+
+        keys = self.archive_keys()
+        for lib in self.e.used_libs:
+            archive = self.archive_path(lib)
+            key_path = archive + '.key'
+            if os.path.exists(archive) and os.path.exists(key_path):
+                with open(key_path) as f:
+                    if f.read() == keys[lib]:
+                        # already in place, keep mtime to avoid relinking
+                        self.e['prebuilt_libs'].append(lib)
+                        continue
+            if store.fetch(keys[lib], archive):
+                with open(key_path, 'wt') as f:
+                    f.write(keys[lib])
+                self.e['prebuilt_libs'].append(lib)
+
+        return keys
+
+    def publish_archives(self, store, keys):
+        for lib in self.e.used_libs:
+            if lib in self.e.prebuilt_libs:
+                continue
+            archive = self.archive_path(lib)
+            store.publish(keys[lib], archive)
+            with open(archive + '.key', 'wt') as f:
+                f.write(keys[lib])
+
+    def fingerprint(self, args, board_model, build_dir):
+        settings = dict((key, getattr(args, key, None)) for key in self.fingerprint_args)
+        settings['board_model'] = board_model
+        return Fingerprint(build_dir, settings)
+
+    def save_fingerprint(self, fingerprint):
+        files = [self.e[tool] for tool in self.tools]
+        files += [self.e[key] for key in ('boards.txt', 'version.txt') if key in self.e]
+        dirs = [self.e.src_dir, self.e.lib_dir] + self.e.used_libs
+        if 'arduino_variants_dir' in self.e:
+            dirs.append(self.e.arduino_variants_dir)
+        # a new library may take over an #include
+        listings = [self.e.lib_dir, self.e.arduino_libraries_dir]
+        fingerprint.save(files, dirs, listings)
+
+    def board_build(self, board_model, build_dir, boards):
+        """
+        Return Build for `board_model' out of `boards' built at once. It
+        shares discovered tools and files and the job limit with this one.
+        """
+        e = Environment(self.e)
+        e.discovery = self.e.discovery
+        e['build_dir'] = build_dir
+
+        build = Build(e)
+        build.board_model = board_model
+        build.label = board_model if boards > 1 else None
+        build.jobs = max(self.jobs // boards, 1)
+        for attr in ['jobserver', 'fsindex', 'sketches', 'indexes', 'output_lock', 'tracer']:
+            setattr(build, attr, getattr(self, attr))
+        return build
+
+    def prepare_sources(self, builds):
+        """
+        Convert sketches for all board `builds' and find libraries each of
+        them uses, setting its `libraries'.
+        """
+        # Sketches are the same for all boards. They are converted once,
+        # but written into the build directory of every board, which is
+        # where its sources are scanned for libraries
+        with self.span('preprocess sketches'):
+            for build in builds:
+                build.preprocess_sketches()
+
+        # Libraries are not the same: headers of a variant could include
+        # other ones. Boards searching the same directories use the same
+        # libraries, so they are found once for them
+        found = {}
+        with self.span('find libraries'):
+            for build in builds:
+                inc_dirs = tuple(build.include_dirs())
+                if inc_dirs not in found:
+                    found[inc_dirs] = build.find_libraries()
+                build.libraries = found[inc_dirs]
+
+    def build_firmware(self, args, store, libraries, fingerprint):
         self.create_jinja(verbose=args.verbose)
-        self.make('Makefile.sketch')
-        self.scan_dependencies()
+        with self.span('scan dependencies'):
+            self.scan_dependencies(libraries)
+        with self.span('fetch archives'):
+            archive_keys = self.fetch_archives(store)
         self.make('Makefile')
+        if store:
+            with self.span('publish archives'):
+                self.publish_archives(store, archive_keys)
+        with self.span('save fingerprint'):
+            self.save_fingerprint(fingerprint)
+
+    def run(self, args):
+        tracing = bool(args.trace or args.trace_summary)
+        self.tracer = Tracer(os.path.join(self.e.output_dir, 'trace.jobs'), enabled=tracing)
+        try:
+            with self.span('build'):
+                self.build(args)
+        finally:
+            if tracing:
+                self.report_trace(args)
+
+    def report_trace(self, args):
+        self.tracer.collect_jobs()
+        if args.trace:
+            self.tracer.save(args.trace)
+            print colorize('Trace saved to %s' % args.trace, 'cyan')
+        if args.trace_summary:
+            print '\n'.join(self.tracer.summary(args.trace_summary))
+
+    def build(self, args):
+        pending = []
+        with self.span('check fingerprints'):
+            for board_model in args.board_model:
+                build_dir = self.e.board_build_dir(board_model, args.arduino_dist)
+                fingerprint = self.fingerprint(args, board_model, build_dir)
+                hex_path = os.path.join(build_dir, self.e.hex_filename)
+                if fingerprint.up_to_date([hex_path]):
+                    print colorize('%s is up to date' % hex_path, 'green')
+                else:
+                    pending.append((board_model, build_dir, fingerprint))
+
+        if not pending:
+            return
+
+        # project sources are snapshot before they are built, once for
+        # all boards
+        for _, _, fingerprint in pending:
+            fingerprint.snapshots = pending[0][2].snapshots
+            fingerprint.snapshot(self.e.src_dir, self.e.lib_dir)
+            fingerprint.discard()
+
+        store = None
+        if args.archive_store:
+            store = ArchiveStore(os.path.expanduser(args.archive_store))
+
+        # source and library trees are walked once per build
+        self.fsindex = FileIndex()
+        # sketches of all versions ever built are not kept forever
+        if len(sketches) > 1000:
+            sketches.clear()
+        self.sketches = sketches
+        self.indexes = indexes
+        self.output_lock = threading.Lock()
+        with self.span('discover'):
+            self.discover(args)
+        self.setup_jobs(args)
+        try:
+            builds = []
+            for board_model, build_dir, fingerprint in pending:
+                build = self.board_build(board_model, build_dir, len(pending))
+                build.setup_flags(args, board_model)
+                builds.append((build, fingerprint))
+
+            self.prepare_sources([build for build, _ in builds])
+
+            first = builds[0][0]
+            if len(builds) == 1:
+                first.build_firmware(args, store, first.libraries, builds[0][1])
+                return
+
+            def build_board(item):
+                build, fingerprint = item
+                try:
+                    build.build_firmware(args, store, build.libraries, fingerprint)
+                except Abort as exc:
+                    build.say(colorize(str(exc), 'red'))
+                    return build.board_model
+
+            # boards are built concurrently under the shared job limit
+            failed = filter(None, map_concurrently(build_board, builds,
+                                                   min(len(builds), self.jobs)))
+            if failed:
+                raise Abort('Build failed for %s' % ', '.join(failed))
+        finally:
+            self.jobserver.close()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8; -*-
+
+import sys
+import argparse
+
+from ino.commands.base import Command
+from ino.objcache import ObjectCache, parse_size, format_size
+from ino.utils import cache_dir
+
+
+class Cache(Command):
+    """
+    Show statistics of the compiled object cache or manage it.
+
+    The cache is used by `ino build --object-cache'. Objects are keyed on
+    the preprocessed source and the compiler command line, so the same
+    source built with the same flags is compiled only once. When the cache
+    grows over its size limit least recently used objects are evicted.
+
+    Actions:
+
+        stats   show hit/miss statistics and size (default)
+        clear   remove all cached objects and reset statistics
+        compile run a compiler command given after `--' through the cache
+    """
+
+    name = 'cache'
+    help_line = "Show statistics of the compiled object cache or manage it"
+    # run for every compiled file from makefiles
+    uses_environment = False
+
+    def setup_arg_parser(self, parser):
+        super(Cache, self).setup_arg_parser(parser)
+        parser.add_argument('action', nargs='?', default='stats',
+                            choices=['stats', 'clear', 'compile'],
+                            help='What to do, see above')
+        parser.add_argument('-M', '--max-size', metavar='SIZE',
+                            help='Set size limit of the cache, e.g. 500M or 2G')
+        # compiler command follows `--', so options are taken anywhere else
+        parser.add_argument('command', nargs='*', help=argparse.SUPPRESS)
+
+    def run(self, args):
+        cache = ObjectCache(cache_dir('objects'))
+
+        if args.action == 'compile':
+            command = args.command
+            if command and command[0] == '--':
+                command = command[1:]
+            sys.exit(cache.compile(command))
+
+        if args.max_size:
+            cache.set_max_size(parse_size(args.max_size))
+
+        if args.action == 'clear':
+            cache.clear()
+
+        stats = cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        print 'Cache directory:', cache.root
+        print 'Hits:           ', stats['hits']
+        print 'Misses:         ', stats['misses']
+        print 'Hit rate:       ', '%.1f%%' % (100.0 * stats['hits'] / lookups if lookups else 0)
+        print 'Size:           ', format_size(stats['size'])
+        print 'Size limit:     ', format_size(stats['max_size'])
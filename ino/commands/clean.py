@@ -15,6 +15,7 @@ class Clean(Command):
 
     name = 'clean'
     help_line = "Remove intermediate compilation files completely"
+    uses_environment = False
 
     def run(self, args):
         if os.path.isdir(self.e.output_dir):
@@ -0,0 +1,85 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import sys
+import errno
+import glob
+import time
+
+from ino.commands.base import Command
+from ino.exc import Abort
+
+
+class Dump(Command):
+    """
+    Print data captured by `ino serial --record'.
+
+    Give ring files or directories they are recorded to. Data of several
+    rings is merged in the order it was received, lines are labeled with
+    the port name then. With --follow new data is printed as it comes
+    without stopping the capture.
+    """
+
+    name = 'dump'
+    help_line = "Print data captured by `ino serial --record'"
+    uses_environment = False
+
+    poll_interval = 0.2
+
+    def setup_arg_parser(self, parser):
+        super(Dump, self).setup_arg_parser(parser)
+        parser.add_argument('rings', nargs='+', metavar='RING',
+                            help='Ring file or directory of them')
+        parser.add_argument('-f', '--follow', default=False, action='store_true',
+                            help='Keep printing data as it is recorded')
+        parser.add_argument('-t', '--timestamps', default=False, action='store_true',
+                            help='Prefix every line with the time it was received at')
+
+    def run(self, args):
+        from ino.monitor import SerialMonitor
+        from ino.ring import RingLog
+
+        paths = []
+        for path in args.rings:
+            if os.path.isdir(path):
+                paths.extend(sorted(glob.glob(os.path.join(path, '*.ring'))))
+            else:
+                paths.append(path)
+        if not paths:
+            raise Abort('No rings found in %s' % ', '.join(args.rings))
+
+        rings = [RingLog.open(path) for path in paths]
+        outputs = {}
+        for ring in rings:
+            label = os.path.basename(ring.path)[:-len('.ring')] if len(rings) > 1 else None
+            outputs[ring] = SerialMonitor(None, sys.stdout.fileno(),
+                                          timestamps=args.timestamps, label=label)
+
+        positions = dict.fromkeys(rings)
+        try:
+            while True:
+                records = []
+                for ring in rings:
+                    received, positions[ring], lost = ring.read(positions[ring])
+                    if lost:
+                        sys.stderr.write('%s: %d bytes overwritten before they were read\n' %
+                                         (ring.path, lost))
+                    records.extend((timestamp, data, ring) for timestamp, data in received)
+
+                records.sort(key=lambda record: record[0])
+                for timestamp, data, ring in records:
+                    outputs[ring].write(data, timestamp)
+
+                if not args.follow:
+                    break
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            # output piped to a program that has exited
+            if e.errno != errno.EPIPE:
+                raise
+        finally:
+            for ring in rings:
+                ring.close()
@@ -3,8 +3,6 @@
 import os.path
 import shutil
 
-from configobj import ConfigObj
-
 from ino.commands.base import Command
 from ino.exc import Abort
 from ino.utils import format_available_options, list_subdirs
@@ -23,6 +21,8 @@ class Init(Command):
     default_template = 'empty'
 
     def setup_arg_parser(self, parser):
+        from configobj import ConfigObj
+
         super(Init, self).setup_arg_parser(parser)
         parser.add_argument('-t', '--template', default=self.default_template, 
                             help='Project template to use')
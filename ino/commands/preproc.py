@@ -34,27 +34,171 @@ class Preprocess(Command):
             out = open(args.output, 'wt')
 
         sketch = open(args.sketch, 'rt').read()
+        out.write(self.convert(sketch, args.sketch))
+
+    @property
+    def header(self):
+        return 'Arduino.h' if self.e.arduino_lib_version.major else 'WProgram.h'
+
+    def convert(self, sketch, filename):
+        """
+        Return C++ source for contents of `sketch' read from `filename'.
+        """
         prototypes = self.prototypes(sketch)
         lines = sketch.split('\n')
         includes, lines = self.extract_includes(lines)
 
-        header = 'Arduino.h' if self.e.arduino_lib_version.major else 'WProgram.h'
-        out.write('#include <%s>\n' % header)
+        return ''.join([
+            '#include <%s>\n' % self.header,
+            '\n'.join(includes),
+            '\n',
+            '\n'.join(prototypes),
+            '\n',
+            '#line 1 "%s"\n' % filename,
+            '\n'.join(lines),
+        ])
+
+    # Lexical elements of C/C++ source. Some alternative always matches and
+    # none of them backtracks, so tokenizing is linear in the source size
+    token_regex = re.compile(r"""
+        (\s+)                                  # whitespace
+      | (\w+)                                  # identifier, keyword or number
+      | (//[^\n]*)                             # single-line comment
+      | ("[^"\\\n]*(?:\\[\s\S][^"\\\n]*)*"?)    # double-quoted string
+      | ('[^'\\\n]*(?:\\[\s\S][^'\\\n]*)*'?)    # character literal
+      | ([\s\S])                               # punctuation
+    """, re.VERBOSE)
+
+    # pre-processor directive with possible line continuations
+    directive_regex = re.compile(r'#[^\\\n]*(?:\\[\s\S][^\\\n]*)*')
+
+    # function bodies are skipped up to something that is or could hide a brace
+    body_regex = re.compile(r'[^{}"\'/#]+')
+
+    # what a prototype consists of, see `prototype'
+    head_tokens = set('&[]*')
+    param_tokens = set('&,[]*')
 
-        out.write('\n'.join(includes))
-        out.write('\n')
+    def prototypes(self, src):
+        """
+        Return list of prototypes for functions defined in `src'.
 
-        out.write('\n'.join(prototypes))
-        out.write('\n')
+        Source is tokenized in a single pass tracking curly braces depth.
+        Comments, strings, character literals and pre-processor directives
+        count as whitespace. At the top level, tokens preceding each opening
+        brace are checked to look like a function header.
+        """
+        result = []
+        # top-level tokens since the last statement boundary as
+        # (text, preceded by whitespace) pairs
+        stmt = []
+        depth = 0
+        space = False
+        line_start = True
+        pos, end = 0, len(src)
+
+        while pos < end:
+            if depth:
+                match = self.body_regex.match(src, pos)
+                if match:
+                    chunk = match.group()
+                    tail = chunk[chunk.rfind('\n') + 1:]
+                    line_start = (line_start or '\n' in chunk) and not tail.strip()
+                    pos = match.end()
+                    if pos == end:
+                        break
+
+            if src[pos] == '#' and line_start:
+                pos = self.directive_regex.match(src, pos).end()
+                space = True
+                continue
+
+            if src.startswith('/*', pos):
+                close = src.find('*/', pos + 2)
+                pos = end if close < 0 else close + 2
+                space = True
+                continue
+
+            match = self.token_regex.match(src, pos)
+            pos = match.end()
+            blank, word, comment, string, char, punct = match.groups()
+            if blank:
+                line_start = line_start or '\n' in blank
+                space = True
+                continue
+            if comment:
+                space = True
+                continue
+
+            line_start = False
+            if string or char:
+                space = True
+                continue
+
+            token = word or punct
+            if depth:
+                if token == '{':
+                    depth += 1
+                elif token == '}':
+                    depth -= 1
+                    if not depth:
+                        stmt = []
+                        space = False
+                continue
+
+            if token == '{':
+                prototype = self.prototype(stmt)
+                if prototype:
+                    result.append(prototype + ';')
+                depth = 1
+            elif token in ';}':
+                stmt = []
+            else:
+                stmt.append((token, space))
+            space = False
 
-        out.write('#line 1 "%s"\n' % args.sketch)
-        out.write('\n'.join(lines))
+        return result
 
-    def prototypes(self, src):
-        src = self.collapse_braces(self.strip(src))
-        regex = re.compile("[\\w\\[\\]\\*]+\\s+[&\\[\\]\\*\\w\\s]+\\([&,\\[\\]\\*\\w\\s]*\\)(?=\\s*\\{)")
-        matches = regex.findall(src)
-        return [m + ';' for m in matches]
+    def is_word(self, token):
+        return token[0].isalnum() or token[0] == '_'
+
+    def prototype(self, tokens):
+        """
+        Return function header if `tokens' preceding an opening brace form
+        one: a type with a name separated by whitespace followed by
+        parameters in parentheses. Only words, `&', `[', `]', `*' and
+        commas in parameters could be there. Otherwise return None.
+        """
+        if not tokens or tokens[-1][0] != ')':
+            return None
+
+        i = len(tokens) - 2
+        while i >= 0 and (self.is_word(tokens[i][0]) or tokens[i][0] in self.param_tokens):
+            i -= 1
+        if i < 0 or tokens[i][0] != '(':
+            return None
+        params_start = i
+
+        i -= 1
+        while i >= 0 and (self.is_word(tokens[i][0]) or tokens[i][0] in self.head_tokens):
+            i -= 1
+        head = tokens[i + 1:params_start]
+
+        # The header starts with a run of tokens other than `&' that is
+        # followed by whitespace and something else before parameters
+        start = 0
+        while start < len(head):
+            run_end = start + 1
+            while (run_end < len(head) and not head[run_end][1] and
+                   head[run_end][0] != '&' and head[run_end - 1][0] != '&'):
+                run_end += 1
+            if head[start][0] != '&' and run_end < len(head) and head[run_end][1]:
+                header = head[start:] + tokens[params_start:]
+                return ''.join((' ' if space and n else '') + text
+                               for n, (text, space) in enumerate(header))
+            start = run_end
+
+        return None
 
     def extract_includes(self, src_lines):
         regex = re.compile("^\\s*#include\\s*[<\"](\\S+)[\">]")
@@ -73,41 +217,3 @@ class Preprocess(Command):
                 sketch.append(line)
 
         return includes, sketch
-
-    def collapse_braces(self, src):
-        """
-        Remove the contents of all top-level curly brace pairs {}.
-        """
-        result = []
-        nesting = 0;
-
-        for c in src:
-            if not nesting:
-                result.append(c)
-            if c == '{':
-                nesting += 1
-            elif c == '}':
-                nesting -= 1
-                result.append(c)
-        
-        return ''.join(result)
-
-    def strip(self, src):
-        """
-        Strips comments, pre-processor directives, single- and double-quoted
-        strings from a string.
-        """
-        # single-quoted character
-        p = "('.')"
-        
-        # double-quoted string
-        p += "|(\"(?:[^\"\\\\]|\\\\.)*\")"
-        
-        # single and multi-line comment
-        p += "|(//.*?$)|(/\\*[^*]*(?:\\*(?!/)[^*]*)*\\*/)"
-        
-        # pre-processor directive
-        p += "|" + "(^\\s*#.*?$)"
-
-        regex = re.compile(p, re.MULTILINE)
-        return regex.sub(' ', src)
@@ -1,16 +1,34 @@
 # -*- coding: utf-8; -*-
 
+from __future__ import absolute_import
+
+import os
+import sys
+import errno
 import subprocess
 
 from ino.commands.base import Command
+from ino.exc import Abort
+from ino.utils import mkdir
 
 
 class Serial(Command):
     """
     Open a serial monitor to communicate with the device.
 
-    At the moment `picocom' is used as a program started by this command.
-    Use Ctrl+A Ctrl+X to exit.
+    Data received is printed and keys typed are sent to the device. Use
+    Ctrl+A Ctrl+X to exit. With --stream or --output the keyboard is not
+    read and data is just copied to the standard output or a file until
+    the device is gone or Ctrl+C is pressed.
+
+    `picocom' is run instead of the built-in monitor if --picocom or any
+    extra picocom args are given.
+
+    With --record several comma-separated ports are captured at once, each
+    into a fixed-size ring file in the given directory keeping the latest
+    data received along with the time it came at. Ports gone are opened
+    again once they are back. Rings could be read with `ino dump' while
+    they are recorded.
     """
 
     name = 'serial'
@@ -19,17 +37,116 @@ class Serial(Command):
     def setup_arg_parser(self, parser):
         super(Serial, self).setup_arg_parser(parser)
         parser.add_argument('-p', '--serial-port', metavar='PORT',
-                            help='Serial port to communicate with\nTry to guess if not specified')
-        parser.add_argument('-b', '--baud-rate', metavar='RATE', type=int, default=9600, 
+                            type=lambda s: s.split(','),
+                            help='Serial port to communicate with\n'
+                            'Several comma-separated ports could be recorded at once\n'
+                            'Try to guess if not specified')
+        parser.add_argument('-b', '--baud-rate', metavar='RATE', type=int, default=9600,
                             help='Communication baud rate, should match value set in Serial.begin() on Arduino')
+        parser.add_argument('-o', '--output', metavar='FILE',
+                            help='Write data received to FILE, implies --stream')
+        parser.add_argument('--stream', default=False, action='store_true',
+                            help='Do not read the keyboard, just output data received')
+        parser.add_argument('-t', '--timestamps', default=False, action='store_true',
+                            help='Prefix every line received with the time it came at')
+        parser.add_argument('--record', metavar='DIR',
+                            help='Capture data received into ring files in DIR')
+        parser.add_argument('--ring-size', metavar='SIZE', default='16M',
+                            help='Size of each ring file, e.g. 512K or 64M. Default: %(default)s.')
+        parser.add_argument('--picocom', default=False, action='store_true',
+                            help='Run picocom instead of the built-in monitor')
         parser.add_argument('remainder', nargs='*', metavar='ARGS',
                             help='Extra picocom args that are passed as is')
 
-        parser.usage = "%(prog)s [-h] [-p PORT] [-b RATE] [-- ARGS]"
+        parser.usage = ("%(prog)s [-h] [-p PORT] [-b RATE] [-o FILE] [--stream] [-t]\n"
+                        "       [--record DIR] [--ring-size SIZE] [--picocom] [-- ARGS]")
 
     def run(self, args):
+        ports = args.serial_port or [self.e.guess_serial_port()]
+        if args.record:
+            self.run_recorder(args, ports)
+            return
+        if len(ports) > 1:
+            raise Abort('Several ports could be only recorded, use --record')
+
+        serial_port = ports[0]
+        if args.picocom or args.remainder:
+            self.run_picocom(args, serial_port)
+            return
+
+        from serial import Serial as SerialPort
+        from serial.serialutil import SerialException
+        from ino.monitor import SerialMonitor
+
+        try:
+            port = SerialPort(serial_port, args.baud_rate, timeout=0)
+        except SerialException as e:
+            raise Abort(str(e))
+
+        interactive = not (args.stream or args.output) and sys.stdin.isatty()
+        output = os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666) \
+                 if args.output else sys.stdout.fileno()
+        monitor = SerialMonitor(port, output, timestamps=args.timestamps,
+                                interactive=interactive)
+        try:
+            if interactive:
+                print 'Connected to %s at %d baud. Use Ctrl+A Ctrl+X to exit.' % (
+                    serial_port, args.baud_rate)
+                self.run_interactive(monitor)
+            else:
+                monitor.run()
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            # output piped to a program that has exited
+            if e.errno != errno.EPIPE:
+                raise
+        finally:
+            port.close()
+            if args.output:
+                os.close(output)
+
+    def run_interactive(self, monitor):
+        import termios
+        import tty
+
+        # keys are sent as soon as they are typed, Ctrl+C still works
+        keyboard = sys.stdin.fileno()
+        saved = termios.tcgetattr(keyboard)
+        tty.setcbreak(keyboard)
+        try:
+            monitor.run()
+        finally:
+            termios.tcsetattr(keyboard, termios.TCSADRAIN, saved)
+
+    def run_recorder(self, args, ports):
+        from serial import Serial as SerialPort
+        from ino.monitor import SerialRecorder
+        from ino.objcache import parse_size
+        from ino.ring import RingLog
+
+        size = parse_size(args.ring_size)
+        mkdir(args.record)
+        rings = {}
+        for port in ports:
+            path = os.path.join(args.record, os.path.basename(port) + '.ring')
+            rings[port] = RingLog.create(path, size)
+
+        def say(line):
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+        recorder = SerialRecorder(rings, lambda port: SerialPort(port, args.baud_rate, timeout=0), say)
+        try:
+            recorder.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for ring in rings.itervalues():
+                ring.close()
+
+    def run_picocom(self, args, serial_port):
         serial_monitor = self.e.find_tool('serial', ['picocom'], human_name='Serial monitor (picocom)')
-        serial_port = args.serial_port or self.e.guess_serial_port()
 
         subprocess.call([
             serial_monitor,
@@ -0,0 +1,123 @@
+# -*- coding: utf-8; -*-
+
+import os
+import sys
+
+from ino.commands.base import Command
+from ino.exc import Abort
+from ino.utils import cache_dir
+
+
+class Server(Command):
+    """
+    Run a build server keeping ino warm between commands.
+
+    While the server is running `ino build', `ino clean', `ino preproc' and
+    `ino list-models' are handed over to it by ino transparently, saving
+    startup, imports and discovery on every run. Discovered tools, board
+    descriptions, compiled templates and dependency indexes are kept in
+    memory for all projects and checked against the files they come from,
+    so a changed Arduino distribution or toolchain is noticed.
+
+    The server is per user, listens on a unix socket in the cache directory
+    and exits once it has been idle for --idle-timeout seconds. Set
+    INO_NO_SERVER to run a command without it.
+
+    Actions:
+
+        start   start the server in background (default)
+        stop    stop the server
+        status  show whether the server is running
+        run     run the server in foreground, e.g. by a service manager
+    """
+
+    name = 'server'
+    help_line = "Run a build server keeping ino warm between commands"
+    uses_environment = False
+
+    default_idle_timeout = 900
+
+    def setup_arg_parser(self, parser):
+        super(Server, self).setup_arg_parser(parser)
+        parser.add_argument('action', nargs='?', default='start',
+                            choices=['start', 'stop', 'status', 'run'],
+                            help='What to do, see above')
+        parser.add_argument('--idle-timeout', metavar='SECONDS', type=float,
+                            default=self.default_idle_timeout,
+                            help='Exit after no commands have come for SECONDS, '
+                            '0 to never exit. Default: %(default)s.')
+
+    def run(self, args):
+        getattr(self, 'run_' + args.action)(args)
+
+    def create_server(self, args):
+        from ino.server import Server as BuildServer, socket_path
+
+        server = BuildServer(socket_path(), idle_timeout=args.idle_timeout or None)
+        if not server.listen():
+            info = self.query('i')
+            raise Abort('Server is already running, pid %s' % (info or {}).get('pid'))
+        return server
+
+    def query(self, kind):
+        from ino.server import query
+
+        return query(kind)
+
+    def run_start(self, args):
+        server = self.create_server(args)
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid:
+            os.waitpid(pid, 0)
+            server.sock.close()
+            info = self.query('i')
+            if not info:
+                raise Abort("Server has failed to start, see %s" % cache_dir('server.log'))
+            print 'Server started, pid %s' % info['pid']
+            return
+
+        # detach from the terminal and the session of the caller
+        try:
+            os.setsid()
+            if os.fork():
+                os._exit(0)
+            os.chdir('/')
+            null = os.open(os.devnull, os.O_RDWR)
+            log = os.open(cache_dir('server.log'), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            os.dup2(null, 0)
+            os.dup2(log, 1)
+            os.dup2(log, 2)
+            os.close(null)
+            os.close(log)
+            server.serve()
+        finally:
+            os._exit(0)
+
+    def run_run(self, args):
+        server = self.create_server(args)
+        print 'Serving on %s' % server.path
+        sys.stdout.flush()
+        try:
+            server.serve()
+        except KeyboardInterrupt:
+            pass
+
+    def run_stop(self, args):
+        info = self.query('q')
+        if not info:
+            print 'Server is not running'
+            return
+        print 'Server stopped, pid %s, %d commands run' % (info['pid'], info['commands'])
+
+    def run_status(self, args):
+        info = self.query('i')
+        if not info:
+            print 'Server is not running'
+            return
+        print 'Server is running, pid %s' % info['pid']
+        print 'Version: %s' % info['version']
+        print 'Uptime: %d s' % info['uptime']
+        print 'Commands run: %d' % info['commands']
+        if info['idle_timeout']:
+            print 'Idle timeout: %d s' % info['idle_timeout']
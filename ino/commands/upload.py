@@ -2,16 +2,20 @@
 
 from __future__ import absolute_import
 
+import sys
 import os.path
 import subprocess
 import platform
+import threading
 
-from time import sleep
-from serial import Serial
-from serial.serialutil import SerialException
+from time import sleep, time
 
 from ino.commands.base import Command
 from ino.exc import Abort
+from ino.filters import colorize
+from ino.ports import PortWatcher, usb_device, board_usb_ids
+from ino.uploads import UploadLog, file_digest
+from ino.utils import cache_dir, cpu_count, map_concurrently
 
 
 class Upload(Command):
@@ -22,19 +26,56 @@ class Upload(Command):
     device firmare reads/writes serial port extensively, upload may fail. In
     that case try to retry few times or upload just after pushing Reset button
     on Arduino board.
+
+    Firmware successfully uploaded to a board is recorded by its USB serial
+    number, and uploading the same firmware there again is skipped unless
+    --force is given. Boards without a serial number are always uploaded to. With --verify the flash is read back and compared to the firmware
+    instead of trusting the record.
+
+    The same firmware could be uploaded to several boards at once: give
+    comma-separated list of ports or --all to upload to every connected
+    board of the model as told by its USB vendor and product ids. A failed
+    upload is retried after resetting the board again.
     """
 
     name = 'upload'
     help_line = "Upload built firmware to the device"
 
+    default_jobs = cpu_count()
+    default_retries = 1
+
+    def __init__(self, environment):
+        super(Upload, self).__init__(environment)
+        self.output_lock = threading.Lock()
+        self.enumeration_lock = threading.Lock()
+
     def setup_arg_parser(self, parser):
         super(Upload, self).setup_arg_parser(parser)
-        parser.add_argument('-p', '--serial-port', metavar='PORT',
-                            help='Serial port to upload firmware to\nTry to guess if not specified')
+        parser.add_argument('-p', '--serial-port', metavar='PORTS',
+                            type=lambda s: s.split(','),
+                            help='Serial port to upload firmware to\n'
+                            'Several comma-separated ports are uploaded to at once\n'
+                            'Try to guess if not specified')
+        parser.add_argument('--all', default=False, action='store_true',
+                            help='Upload to every connected board of the model')
 
         self.e.add_board_model_arg(parser)
         self.e.add_arduino_dist_arg(parser)
 
+        parser.add_argument('-j', '--jobs', metavar='N', type=int,
+                            default=self.default_jobs,
+                            help='Number of boards to upload to at once. '
+                            'Default: %(default)s.')
+        parser.add_argument('--retries', metavar='N', type=int,
+                            default=self.default_retries,
+                            help='Number of times to reset the board and retry '
+                            'if upload fails. Default: %(default)s.')
+        parser.add_argument('--force', default=False, action='store_true',
+                            help='Upload even if the same firmware was uploaded last time')
+        parser.add_argument('--verify', default=False, action='store_true',
+                            help='Read back the flash to check whether the device '
+                            'already runs the firmware')
+
     def discover(self):
         self.e.find_tool('stty', ['stty'])
         if platform.system() == 'Linux':
@@ -49,7 +90,6 @@ class Upload(Command):
     
     def run(self, args):
         self.discover()
-        port = args.serial_port or self.e.guess_serial_port()
         board = self.e.board_model(args.board_model)
 
         protocol = board['upload']['protocol']
@@ -58,6 +98,113 @@ class Upload(Command):
             # try v2 first and fail
             protocol = 'stk500v1'
 
+        if not os.path.exists(self.e['hex_path']):
+            raise Abort("%s doesn't exist. Run `ino build' first" % self.e['hex_path'])
+
+        ports = self.target_ports(args, board)
+        log = UploadLog(cache_dir('uploads.json'))
+        digest = file_digest(self.e['hex_path'])
+        if len(ports) == 1 and not args.all:
+            self.upload(ports[0], None, board, protocol, log, digest, args)
+            return
+
+        def upload_port(port):
+            try:
+                return port, True, self.upload(port, port, board, protocol, log, digest, args)
+            except Abort as exc:
+                self.say(port, colorize(str(exc), 'red'))
+                return port, False, str(exc)
+
+        results = map_concurrently(upload_port, ports, max(min(len(ports), args.jobs), 1))
+
+        print
+        print 'Upload summary:'
+        for port, ok, status in results:
+            print '  %s: %s' % (port, colorize(status, 'green' if ok else 'red'))
+
+        failed = [port for port, ok, _ in results if not ok]
+        if failed:
+            raise Abort('Upload failed for %s' % ', '.join(failed))
+
+    def target_ports(self, args, board):
+        if not args.all:
+            return args.serial_port or [self.e.guess_serial_port()]
+
+        ports = self.e.list_serial_ports()
+        ids = board_usb_ids(board)
+        if ids:
+            matching = []
+            for port in ports:
+                device = usb_device(port)
+                if device and (device.vid, device.pid) in ids:
+                    matching.append(port)
+            ports = matching
+        else:
+            print colorize('USB ids of %s are unknown, uploading to every serial port'
+                           % args.board_model, 'yellow')
+        if not ports:
+            raise Abort('No %s board is connected' % args.board_model)
+        return ports
+
+    def upload(self, port, label, board, protocol, log, digest, args):
+        """
+        Upload the firmware to the board on `port' retrying after a fresh
+        reset if it fails. Output is prefixed with `label' if it is given.
+        Return a line on what has been done.
+        """
+        device = usb_device(port)
+        identity = device and device.identity
+        if not args.force and not args.verify and log.get(identity, args.board_model) == digest:
+            self.say(label, colorize('%s is already uploaded to %s' % (self.e['hex_path'], port), 'green'))
+            return 'up to date'
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                status = self.flash(port, identity, label, board, protocol, log, digest, args)
+            except Abort as exc:
+                if attempt > args.retries:
+                    raise
+                self.say(label, colorize('%s, retrying' % exc, 'yellow'))
+                continue
+
+            if attempt > 1:
+                status += ' after %d attempts' % attempt
+            return status
+
+    def flash(self, port, identity, label, board, protocol, log, digest, args):
+        if not args.force and args.verify:
+            self.say(label, 'Verifying firmware on %s ...' % port)
+            if self.avrdude(self.reset(port, board, label), board, protocol, 'v', label) == 0:
+                log.record(identity, args.board_model, digest)
+                self.say(label, colorize('%s is already uploaded to %s' % (self.e['hex_path'], port), 'green'))
+                return 'verified'
+
+        # the device is in unknown state until the upload succeeds
+        log.record(identity, args.board_model, None)
+        if self.avrdude(self.reset(port, board, label), board, protocol, 'w', label) != 0:
+            raise Abort("avrdude failed")
+        log.record(identity, args.board_model, digest)
+        return 'uploaded'
+
+    def say(self, label, line):
+        if label is None:
+            print line
+            return
+
+        with self.output_lock:
+            sys.stdout.write('%s %s\n' % (colorize('[%s]' % label, 'purple'), line))
+            sys.stdout.flush()
+
+    def reset(self, port, board, label=None):
+        """
+        Reset the board on `port' to run the bootloader. Return the port
+        the bootloader is available on.
+        """
+        from serial import Serial
+        from serial.serialutil import SerialException
+
         if not os.path.exists(port):
             raise Abort("%s doesn't exist. Is Arduino connected?" % port)
 
@@ -84,8 +231,27 @@ class Upload(Command):
         # deal with the fact that the COM port number changes from bootloader to
         # sketch.
         if board['bootloader']['path'] == "caterina":
+            # the bootloader is told from other boards re-enumerating at
+            # the same time by USB location, if it is unknown boards have
+            # to take turns
+            device = usb_device(port)
+            if device and device.location:
+                port = self.caterina_port(port, device.location, label)
+            else:
+                with self.enumeration_lock:
+                    port = self.caterina_port(port, None, label)
+
+        return port
+
+    def caterina_port(self, port, location, label=None):
+        from serial import Serial
+
+        watcher = PortWatcher(self.e.serial_port_patterns())
+        method = watcher.method
+        try:
             caterina_port = None
             before = self.e.list_serial_ports()
+            started = time()
             if port in before:
                 ser = Serial()
                 ser.port = port
@@ -96,33 +262,55 @@ class Upload(Command):
                 # Scanning for available ports seems to open the port or
                 # otherwise assert DTR, which would cancel the WDT reset if
                 # it happened within 250 ms. So we wait until the reset should
-                # have already occured before we start scanning.
-                if platform.system() != 'Darwin':
+                # have already occured before we start scanning. Ports are not
+                # scanned until they appear if device nodes are watched.
+                if platform.system() != 'Darwin' and not watcher.inotify:
                     sleep(0.3)
 
-            elapsed = 0
-            enum_delay = 0.25
-            while elapsed < 10:
+            created = set()
+            # new ports of the board not yet accessible, udev may still be
+            # setting permissions
+            pending = set()
+            while True:
                 now = self.e.list_serial_ports()
-                diff = list(set(now) - set(before))
-                if diff:
-                    caterina_port = diff[0]
+                pending.update(p for p in (set(now) - set(before)) | (created & set(now))
+                               if location is None or self.location(p) == location)
+                pending &= set(now)
+                ready = [p for p in pending if os.access(p, os.R_OK | os.W_OK)]
+                if ready:
+                    caterina_port = ready[0]
+                    break
+
+                remaining = started + 10 - time()
+                if remaining <= 0:
                     break
 
                 before = now
-                sleep(enum_delay)
-                elapsed += enum_delay
+                created = watcher.wait(remaining)
+        finally:
+            watcher.close()
+
+        if caterina_port == None:
+            raise Abort("Couldn’t find a Leonardo on the selected port. "
+                        "Check that you have the correct port selected. "
+                        "If it is correct, try pressing the board's reset "
+                        "button after initiating the upload.")
 
-            if caterina_port == None:
-                raise Abort("Couldn’t find a Leonardo on the selected port. "
-                            "Check that you have the correct port selected. "
-                            "If it is correct, try pressing the board's reset "
-                            "button after initiating the upload.")
+        self.say(label, 'Bootloader port %s appeared in %.3f s (%s)' %
+                 (caterina_port, time() - started, method))
+        return caterina_port
 
-            port = caterina_port
+    def location(self, port):
+        device = usb_device(port)
+        return device and device.location
 
-        # call avrdude to upload .hex
-        subprocess.call([
+    def avrdude(self, port, board, protocol, mode, label=None):
+        """
+        Write (`mode' is `w') or verify (`v') the firmware with avrdude and
+        return its exit code. Output lines are prefixed with `label' if it
+        is given.
+        """
+        args = [
             self.e['avrdude'],
             '-C', self.e['avrdude.conf'],
             '-p', board['build']['mcu'],
@@ -130,5 +318,17 @@ class Upload(Command):
             '-c', protocol,
             '-b', board['upload']['speed'],
             '-D',
-            '-U', 'flash:w:%s:i' % self.e['hex_path'],
-        ])
+            '-U', 'flash:%s:%s:i' % (mode, self.e['hex_path']),
+        ]
+        if mode == 'v':
+            # verification is expected to fail if the firmware is different
+            args.append('-qq')
+        if label is None:
+            return subprocess.call(args)
+
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        for line in iter(proc.stdout.readline, ''):
+            line = line.rstrip()
+            if line:
+                self.say(label, line)
+        return proc.wait()
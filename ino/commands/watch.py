@@ -0,0 +1,279 @@
+# -*- coding: utf-8; -*-
+
+from __future__ import absolute_import
+
+import os
+import os.path
+import sys
+import time
+import errno
+import select
+import argparse
+
+from ino.commands.build import Build
+from ino.conf import configure
+from ino.exc import Abort
+from ino.filters import colorize
+from ino.fingerprint import tree_state, dir_listing
+from ino.inotify import (Inotify, IN_ATTRIB, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE,
+                         IN_MOVED_FROM, IN_MOVED_TO, IN_ISDIR)
+
+
+class Watch(Build):
+    """
+    Build a project in the current directory and build it again whenever
+    its sources change.
+
+    Sources, project libraries and libraries the project uses are watched.
+    Several changes made at once, e.g. by saving all files in an editor,
+    are built together once no more changes have come for a moment. The
+    environment, board settings, converted sketches and the dependency
+    indexes are kept in memory between builds.
+
+    With --upload the firmware is uploaded after every successful build.
+    With --serial data received from the device is printed between builds.
+
+    Build options are the same as of `ino build'.
+    """
+
+    name = 'watch'
+    help_line = "Build firmware again whenever sources change"
+
+    default_debounce = 0.3
+    poll_interval = 1.0
+    mask = IN_ATTRIB | IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+    def setup_arg_parser(self, parser):
+        super(Watch, self).setup_arg_parser(parser)
+        parser.add_argument('--debounce', metavar='SECONDS', type=float,
+                            default=self.default_debounce,
+                            help='Wait until no changes have come for SECONDS '
+                            'before building. Default: %(default)s.')
+        parser.add_argument('--upload', default=False, action='store_true',
+                            help='Upload firmware after every successful build')
+        parser.add_argument('--serial', default=False, action='store_true',
+                            help='Print data received from the device between builds')
+        parser.add_argument('-p', '--serial-port', metavar='PORT',
+                            help='Serial port to upload to and to read from\n'
+                            'Try to guess if not specified')
+        parser.add_argument('-b', '--baud-rate', metavar='RATE', type=int, default=9600,
+                            help='Baud rate for --serial')
+        parser.add_argument('-t', '--timestamps', default=False, action='store_true',
+                            help='Prefix every line received with the time it came at')
+
+    def run(self, args):
+        if (args.upload or args.serial) and len(args.board_model) > 1:
+            raise Abort('Only a single board model could be uploaded to or monitored')
+
+        self.serial_port = None
+        if args.upload or args.serial:
+            self.serial_port = args.serial_port or self.e.guess_serial_port()
+        self.uploader = None
+        if args.upload:
+            self.uploader = self.upload_command(args)
+        self.serial = None
+        self.monitor = None
+        self.next_open = 0
+        self.watched = set()
+
+        self.inotify = None
+        try:
+            self.inotify = Inotify()
+        except OSError:
+            print colorize('inotify is not available, polling for changes', 'yellow')
+
+        try:
+            self.rebuild(args)
+            while True:
+                changed = sorted(os.path.relpath(path) for path in self.wait_for_changes(args))
+                if len(changed) > 5:
+                    changed[4:] = ['%d more' % (len(changed) - 4)]
+                print colorize('Changed: %s' % ', '.join(changed), 'cyan')
+                self.rebuild(args)
+        finally:
+            self.close_monitor()
+            if self.inotify:
+                self.inotify.close()
+
+    def upload_command(self, args):
+        from ino.commands.upload import Upload
+
+        upload = Upload(self.e)
+        parser = argparse.ArgumentParser(prog='ino upload')
+        upload.setup_arg_parser(parser)
+        parser.set_defaults(**configure().as_dict('upload'))
+        argv = ['-m', args.board_model[0], '-p', self.serial_port]
+        if args.arduino_dist:
+            argv += ['-d', args.arduino_dist]
+        return upload, parser.parse_args(argv)
+
+    def rebuild(self, args):
+        started = time.time()
+        try:
+            Build.run(self, args)
+        except Abort as exc:
+            print colorize(str(exc), 'red')
+            self.watch_sources(args)
+            return
+
+        print colorize('Built in %.2f s, watching for changes' % (time.time() - started), 'green')
+        self.watch_sources(args)
+        if self.uploader:
+            self.close_monitor()
+            upload, upload_args = self.uploader
+            try:
+                upload.run(upload_args)
+            except Abort as exc:
+                print colorize(str(exc), 'red')
+
+    def watched_dirs(self, args):
+        """
+        Return list of (directory, whether its subdirectories are watched
+        too) for everything the last build depended on, as recorded in
+        fingerprints of all boards. Project sources and libraries are
+        watched anyway, e.g. until the first build succeeds.
+        """
+        result = [(self.e.src_dir, True), (self.e.lib_dir, True)]
+        for board_model in args.board_model:
+            build_dir = self.e.board_build_dir(board_model, args.arduino_dist)
+            stored = self.fingerprint(args, board_model, build_dir).load()
+            try:
+                dirs, listings = stored['dirs'], stored['listings']
+            except (TypeError, KeyError):
+                # none stored or written by something else
+                continue
+            result.extend((d, True) for d in dirs)
+            result.extend((d, False) for d in listings)
+        return sorted(set(result))
+
+    def watch_sources(self, args):
+        self.roots = self.watched_dirs(args)
+        if not self.inotify:
+            self.snapshot = self.tree_snapshot()
+            return
+
+        # watches of directories removed meanwhile are gone
+        self.watched = set(self.inotify.watches.itervalues())
+        for d, recursive in self.roots:
+            if recursive:
+                self.add_tree(d)
+            else:
+                self.add_watch(d)
+
+    def add_tree(self, d):
+        for root, _, _ in os.walk(d):
+            self.add_watch(root)
+
+    def add_watch(self, d):
+        if d in self.watched or not os.path.isdir(d):
+            return
+        try:
+            self.inotify.add_watch(d, self.mask)
+        except OSError as e:
+            print colorize('Can not watch %s: %s' % (d, e), 'yellow')
+            return
+        self.watched.add(d)
+
+    def tree_snapshot(self):
+        return dict((d, tree_state(d) if recursive else dir_listing(d))
+                    for d, recursive in self.roots)
+
+    def wait_for_changes(self, args):
+        """
+        Wait for changes of watched files, printing data from the device
+        meanwhile if asked. Once something has changed wait until nothing
+        else does for `--debounce' seconds. Return set of changed paths.
+        """
+        changed = set()
+        deadline = None
+        while True:
+            if args.serial and not self.serial and time.time() >= self.next_open:
+                self.next_open = time.time() + self.poll_interval
+                self.open_monitor(args)
+
+            timeout = self.poll_interval
+            if deadline is not None:
+                timeout = max(deadline - time.time(), 0)
+                if timeout == 0:
+                    return changed
+
+            events = self.wait(timeout)
+            events = set(path for path in events if not self.ignored(path))
+            if events:
+                changed.update(events)
+                deadline = time.time() + args.debounce
+
+    def wait(self, timeout):
+        inputs = []
+        if self.inotify:
+            inputs.append(self.inotify.fileno())
+        if self.serial:
+            inputs.append(self.serial.fileno())
+
+        try:
+            ready, _, _ = select.select(inputs, [], [], timeout)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return set()
+            raise
+
+        if self.serial and self.serial.fileno() in ready:
+            self.receive()
+
+        if not self.inotify:
+            snapshot = self.tree_snapshot()
+            changed = set(d for d in snapshot if snapshot[d] != self.snapshot.get(d))
+            self.snapshot = snapshot
+            return changed
+
+        if self.inotify.fileno() not in ready:
+            return set()
+
+        changed = set()
+        for d, mask, name in self.inotify.read(0):
+            if d is None:
+                # the event queue has overflown
+                changed.add(self.e.src_dir)
+                continue
+            path = os.path.join(d, name)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_tree(path)
+            changed.add(path)
+        return changed
+
+    def ignored(self, path):
+        # temporary and backup files of editors
+        name = os.path.basename(path)
+        return (name.startswith('.') or name.endswith('~') or name.startswith('#') or
+                name == '4913')
+
+    def open_monitor(self, args):
+        from serial import Serial as SerialPort
+        from serial.serialutil import SerialException
+        from ino.monitor import SerialMonitor
+
+        try:
+            self.serial = SerialPort(self.serial_port, args.baud_rate, timeout=0)
+        except SerialException:
+            # e.g. the board is still being reset after upload
+            return
+        self.monitor = SerialMonitor(self.serial, sys.stdout.fileno(),
+                                     timestamps=args.timestamps)
+
+    def receive(self):
+        try:
+            data = os.read(self.serial.fileno(), self.monitor.chunk_size)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            data = ''
+        if data:
+            self.monitor.write(data)
+        else:
+            self.close_monitor()
+
+    def close_monitor(self):
+        if self.serial:
+            self.serial.close()
+        self.serial = None
+        self.monitor = None
@@ -2,19 +2,26 @@
 
 import os.path
 
-from configobj import ConfigObj
-
 
 class Configuration(object):
     def __init__(self, *files):
+        self.cfg = None
+        files = filter(os.path.exists, map(os.path.expanduser, files))
+        if not files:
+            # configobj is not even imported without configs
+            return
+
+        from configobj import ConfigObj
         self.cfg = ConfigObj()
         for f in files:
-            self.cfg.merge(ConfigObj(os.path.expanduser(f)))
+            self.cfg.merge(ConfigObj(f))
 
     def as_dict(self, section_name):
-        section = self.cfg.get(section_name, ConfigObj())
+        if self.cfg is None:
+            return {}
         result = self._as_plain_dict(self.cfg)
-        result.update(self._as_plain_dict(section))
+        if section_name in self.cfg:
+            result.update(self._as_plain_dict(self.cfg[section_name]))
         return result
 
     def _as_plain_dict(self, section):
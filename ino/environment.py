@@ -4,22 +4,18 @@ import sys
 import os.path
 import itertools
 import argparse
-import pickle
+import json
 import platform
 import hashlib
+import tempfile
 import re
 
-try:
-    from collections import OrderedDict
-except ImportError:
-    # Python < 2.7
-    from ordereddict import OrderedDict
-
 from collections import namedtuple
 from glob import glob
 
+from ino.boards import BoardDatabase, BoardModels
 from ino.filters import colorize
-from ino.utils import format_available_options
+from ino.utils import cache_dir
 from ino.exc import Abort
 
 
@@ -84,25 +80,28 @@ class Environment(dict):
     default_board_model = 'uno'
     ino = sys.argv[0]
 
+    # settings given once, e.g. `ino build -d PATH', used by later runs too
+    persistent = ['arduino_dist_dir']
+
+    def __init__(self, *args, **kwargs):
+        super(Environment, self).__init__(*args, **kwargs)
+        self.discovery = DiscoveryCache(self.dump_filepath)
+
     def dump(self):
         if not os.path.isdir(self.output_dir):
             return
-        with open(self.dump_filepath, 'wb') as f:
-            pickle.dump(self.items(), f)
+        for key in self.persistent:
+            if key in self:
+                self.discovery.set_setting(key, self[key])
+        self.discovery.save()
 
     def load(self):
-        if not os.path.exists(self.dump_filepath):
-            return
-        with open(self.dump_filepath, 'rb') as f:
-            try:
-                self.update(pickle.load(f))
-            except:
-                print colorize('Environment dump exists (%s), but failed to load' % 
-                               self.dump_filepath, 'yellow')
+        self.discovery.load()
+        self.update(self.discovery.settings)
 
     @property
     def dump_filepath(self):
-        return os.path.join(self.output_dir, 'environment.pickle')
+        return os.path.join(self.output_dir, 'discovery.json')
 
     def __getitem__(self, key):
         try:
@@ -133,14 +132,23 @@ class Environment(dict):
         places = itertools.chain.from_iterable(os.path.expandvars(p).split(os.pathsep) for p in places)
         places = map(os.path.expanduser, places)
 
+        query = [list(items), places]
+        result = self.discovery.get(key, query)
+        if result is not None:
+            self[key] = result
+            return result
+
         print 'Searching for', human_name, '...',
-        for p in places:
+        for n, p in enumerate(places):
             for i in items:
                 path = os.path.join(p, i)
                 if os.path.exists(path):
                     result = path if join else p
                     print colorize(result, 'green')
                     self[key] = result
+                    # the result is valid while the file is the same and
+                    # nothing new has appeared in places searched before
+                    self.discovery.set(key, query, result, [path] + places[:n])
                     return result
 
         print colorize('FAILED', 'red')
@@ -188,36 +196,27 @@ class Environment(dict):
         boards_txt = self.find_arduino_file('boards.txt', ['hardware', 'arduino'], 
                                             human_name='Board description file (boards.txt)')
 
-        self['board_models'] = BoardModels()
+        self['board_models'] = BoardModels([boards_txt], BoardDatabase(cache_dir('boards')))
         self['board_models'].default = self.default_board_model
-        with open(boards_txt) as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                multikey, val = line.split('=')
-                multikey = multikey.split('.')
-
-                subdict = self['board_models']
-                for key in multikey[:-1]:
-                    if key not in subdict:
-                        subdict[key] = {}
-                    subdict = subdict[key]
-
-                subdict[multikey[-1]] = val
-
         return self['board_models']
 
     def board_model(self, key):
         return self.board_models()[key]
     
-    def add_board_model_arg(self, parser):
+    def add_board_model_arg(self, parser, multiple=False):
         help = '\n'.join([
             "Arduino board model (default: %(default)s)",
             "For a full list of supported models run:", 
             "`ino list-models'"
         ])
 
+        if multiple:
+            help += "\nSeveral comma-separated models are built at once"
+            parser.add_argument('-m', '--board-model', metavar='MODELS',
+                                type=lambda s: s.split(','),
+                                default=self.default_board_model, help=help)
+            return
+
         parser.add_argument('-m', '--board-model', metavar='MODEL', 
                             default=self.default_board_model, help=help)
 
@@ -259,13 +258,19 @@ class Environment(dict):
             self['arduino_dist_dir'] = arduino_dist
 
         board_model = getattr(args, 'board_model', None)
+        # a list if several models are accepted
+        board_models = board_model if isinstance(board_model, list) else [board_model]
         if board_model:
             all_models = self.board_models()
-            if board_model not in all_models:
-                print "Supported Arduino board models are:"
-                print all_models.format()
-                raise Abort('%s is not a valid board model' % board_model)
+            for model in board_models:
+                if model not in all_models:
+                    print "Supported Arduino board models are:"
+                    print all_models.format()
+                    raise Abort('%s is not a valid board model' % model)
+
+        self['build_dir'] = self.board_build_dir(board_models[0], arduino_dist)
 
+    def board_build_dir(self, board_model, arduino_dist=None):
         # Build artifacts for each Arduino distribution / Board model
         # pair should go to a separate subdirectory
         build_dirname = board_model or self.default_board_model
@@ -273,7 +278,7 @@ class Environment(dict):
             hash = hashlib.md5(arduino_dist).hexdigest()[:8]
             build_dirname = '%s-%s' % (build_dirname, hash)
 
-        self['build_dir'] = os.path.join(self.output_dir, build_dirname)
+        return os.path.join(self.output_dir, build_dirname)
 
     @property
     def arduino_lib_version(self):
@@ -281,17 +286,107 @@ class Environment(dict):
                                human_name='Arduino lib version file (version.txt)')
 
         if 'arduino_lib_version' not in self:
+            query = self['version.txt']
+            v_string = self.discovery.get('arduino_lib_version', query)
+            if v_string is not None:
+                self['arduino_lib_version'] = Version.parse(v_string)
+                return self['arduino_lib_version']
+
             with open(self['version.txt']) as f:
                 print 'Detecting Arduino software version ... ',
                 v_string = f.read().strip()
                 v = Version.parse(v_string)
                 self['arduino_lib_version'] = v
                 print colorize("%s (%s)" % (v, v_string), 'green')
+            self.discovery.set('arduino_lib_version', query, v_string, [self['version.txt']])
 
         return self['arduino_lib_version']
 
 
-class BoardModels(OrderedDict):
-    def format(self):
-        map = [(key, val['name']) for key, val in self.iteritems()]
-        return format_available_options(map, head_width=12, default=self.default)
+class DiscoveryCache(object):
+    """
+    Results of searching for Arduino files and tools kept between runs.
+
+    Each result is stored along with the query it was found for and stat
+    tags (inode and mtime) of files and directories it depends on. It is
+    used only while the query and tags are the same, so a replaced tool or
+    Arduino distribution is found again.
+
+    Settings of the environment that have to outlive a run are kept along
+    with the results in `settings'.
+    """
+
+    version = 1
+
+    # Results found for any project by this process, e.g. by `ino server',
+    # by key and query. Only those found in absolute places are kept
+    shared = {}
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.settings = {}
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return
+        if cache.get('version') == self.version:
+            self.entries = cache['entries']
+            self.settings = dict((key, value.encode('utf-8'))
+                                 for key, value in cache.get('settings', {}).iteritems())
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        # several ino processes could be run for the same project
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.')
+        with os.fdopen(fd, 'wt') as f:
+            json.dump({'version': self.version, 'entries': self.entries,
+                       'settings': self.settings}, f)
+        os.rename(tmp_path, self.path)
+        self.dirty = False
+
+    def get(self, key, query):
+        query = json.loads(json.dumps(query))
+        entry = self.entries.get(key)
+        if not self.valid(entry, query):
+            entry = self.shared.get((key, json.dumps(query)))
+            if not self.valid(entry, query):
+                return None
+            self.entries[key] = entry
+            self.dirty = True
+        return entry['value'].encode('utf-8')
+
+    def valid(self, entry, query):
+        return (entry is not None and entry['query'] == query and
+                all(stat_tag(path) == tag for path, tag in entry['tags']))
+
+    def set_setting(self, key, value):
+        if self.settings.get(key) != value:
+            self.settings[key] = value
+            self.dirty = True
+
+    def set(self, key, query, value, paths):
+        entry = {
+            'query': query,
+            'value': value,
+            'tags': [[path, stat_tag(path)] for path in paths],
+        }
+        self.entries[key] = entry
+        self.dirty = True
+        if all(os.path.isabs(path) for path in paths):
+            entry = json.loads(json.dumps(entry))
+            self.shared[key, json.dumps(entry['query'])] = entry
+
+
+def stat_tag(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_mtime]
@@ -1,14 +1,18 @@
 # -*- coding: utf-8; -*-
 
 import sys
+import re
 import os.path
 import fnmatch
 import functools
 
+from ino.fsindex import FileIndex
 from ino.utils import FileMap, SpaceList
 
 
 class GlobFile(object):
+    __slots__ = ('filename', 'dirname')
+
     def __init__(self, filename, dirname):
         self.filename = filename
         self.dirname = dirname
@@ -33,22 +37,16 @@ def filter(f):
 def glob(dir, *patterns, **kwargs):
     recursive = kwargs.get('recursive', True)
     subdir = kwargs.get('subdir', '')
+    # a build shares one index between all globs it makes
+    index = kwargs.get('index') or FileIndex()
 
-    result = SpaceList()
+    dir = str(dir)
     scan_dir = os.path.join(dir, subdir)
-    if not os.path.isdir(scan_dir):
-        return result
-
-    for entry in os.listdir(scan_dir):
-        path = os.path.join(scan_dir, entry)
-        if os.path.isdir(path) and recursive:
-            subglob = glob(dir, *patterns, recursive=True,
-                           subdir=os.path.join(subdir, entry))
-            result.extend(subglob)
-        elif os.path.isfile(path) and any(fnmatch.fnmatch(entry, p) for p in patterns):
-            result.append(GlobFile(os.path.join(subdir, entry), dir))
-
-    return result
+    regexes = [re.compile(fnmatch.translate(os.path.normcase(p))) for p in patterns]
+    return SpaceList(
+        GlobFile(os.path.join(subdir, path), dir)
+        for path in index.files(scan_dir, recursive=recursive)
+        if any(r.match(os.path.normcase(os.path.basename(path))) for r in regexes))
 
 
 @filter
@@ -115,3 +113,8 @@ def colorize(s, color):
         s,
         '\033[0m'
     ])
+
+
+# filters by names they are available with in make templates
+registry = dict((name, f) for name, f in globals().items()
+                if callable(f) and getattr(f, 'filter', False))
@@ -0,0 +1,105 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import json
+import hashlib
+
+import ino
+
+
+class Fingerprint(object):
+    """
+    Digest of everything a build result depends on: build settings, ino
+    version, tools and source trees. It is stored in the build directory
+    after a successful build along with the list of files and directories
+    it covers, so that the next build could check it without discovering
+    anything.
+
+    Trees are snapshot (stat'ed) as early as possible: a file modified
+    while the build is running has to be rebuilt next time.
+    """
+
+    filename = 'fingerprint'
+
+    def __init__(self, build_dir, settings):
+        self.path = os.path.join(build_dir, self.filename)
+        self.settings = dict(settings, ino_version=ino.__version__)
+        self.snapshots = {}
+
+    def snapshot(self, *dirs):
+        for d in dirs:
+            if d not in self.snapshots:
+                self.snapshots[d] = tree_state(d)
+
+    def digest(self, files, dirs, listings):
+        self.snapshot(*dirs)
+        state = {
+            'settings': self.settings,
+            'files': [(f, file_state(f)) for f in files],
+            'dirs': [(d, self.snapshots[d]) for d in dirs],
+            'listings': [(d, dir_listing(d)) for d in listings],
+        }
+        return hashlib.md5(json.dumps(state, sort_keys=True)).hexdigest()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def up_to_date(self, outputs):
+        if not all(os.path.exists(o) for o in outputs):
+            return False
+        stored = self.load()
+        try:
+            return stored['digest'] == self.digest(stored['files'], stored['dirs'],
+                                                   stored['listings'])
+        except (TypeError, KeyError, ValueError):
+            # none stored or written by something else
+            return False
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def save(self, files, dirs, listings):
+        files, dirs, listings = sorted(set(files)), sorted(set(dirs)), sorted(set(listings))
+        stored = {
+            'digest': self.digest(files, dirs, listings),
+            'files': files,
+            'dirs': dirs,
+            'listings': listings,
+        }
+        with open(self.path, 'wt') as f:
+            json.dump(stored, f)
+
+
+def file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+def tree_state(dirname):
+    """
+    Return sorted list of (relative path, mtime, size) of all files found
+    in `dirname' recursively.
+    """
+    result = []
+    for root, dirs, files in os.walk(dirname):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            result.append((os.path.relpath(path, dirname),) + (file_state(path) or ()))
+    return result
+
+
+def dir_listing(dirname):
+    try:
+        return sorted(os.listdir(dirname))
+    except OSError:
+        return None
@@ -0,0 +1,112 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import stat
+
+
+class FileIndex(object):
+    """
+    Memoized index of directory trees. Each directory is listed and each
+    of its entries is stat'ed once no matter how many globs and include
+    flags ask for it, so an index should live no longer than a single
+    build. Directories written to meanwhile have to be `invalidate'd.
+
+    Listings keep the order of os.listdir, so results are the same as of
+    walking the tree directly.
+    """
+
+    def __init__(self):
+        self.listings = {}
+        self.walks = {}
+
+    def entries(self, dirname):
+        """
+        Return list of (name, is directory) pairs for files and directories
+        in `dirname'. Anything else, like dangling symlinks, is skipped. The
+        list is empty if `dirname' does not exist.
+        """
+        dirname = os.path.normpath(dirname)
+        try:
+            return self.listings[dirname]
+        except KeyError:
+            pass
+
+        result = []
+        try:
+            names = os.listdir(dirname)
+        except OSError:
+            names = []
+
+        for name in names:
+            try:
+                mode = os.stat(os.path.join(dirname, name)).st_mode
+            except OSError:
+                continue
+            if stat.S_ISDIR(mode):
+                result.append((name, True))
+            elif stat.S_ISREG(mode):
+                result.append((name, False))
+
+        self.listings[dirname] = result
+        return result
+
+    def files(self, dirname, recursive=True):
+        """
+        Return list of paths relative to `dirname' of files within it.
+        """
+        dirname = os.path.normpath(dirname)
+        key = (dirname, recursive)
+        try:
+            return self.walks[key]
+        except KeyError:
+            pass
+
+        result = []
+        for name, is_dir in self.entries(dirname):
+            if not is_dir:
+                result.append(name)
+            elif recursive:
+                result.extend(os.path.join(name, path)
+                              for path in self.files(os.path.join(dirname, name)))
+
+        self.walks[key] = result
+        return result
+
+    def subdirs(self, dirname, recursive=False, exclude=()):
+        """
+        Return list of paths of subdirectories of `dirname' not starting
+        with a dot and not named as any of `exclude'. Directories found
+        recursively follow immediate ones.
+        """
+        dirs = [os.path.join(dirname, name) for name, is_dir in self.entries(dirname)
+                if is_dir and name not in exclude and not name.startswith('.')]
+        if recursive:
+            for d in list(dirs):
+                dirs.extend(self.subdirs(d, recursive=True, exclude=exclude))
+        return dirs
+
+    def invalidate(self, dirname):
+        """
+        Forget everything known about `dirname' and directories within it.
+        """
+        dirname = os.path.normpath(dirname)
+        prefix = os.path.join(dirname, '')
+
+        def stale(path):
+            return path == dirname or path.startswith(prefix)
+
+        # containing directories may have got a new entry too
+        parent = dirname
+        while True:
+            self.listings.pop(parent, None)
+            for key in [key for key in self.walks if key[0] == parent]:
+                del self.walks[key]
+            if os.path.dirname(parent) == parent or not parent:
+                break
+            parent = os.path.dirname(parent)
+
+        for path in [path for path in self.listings if stale(path)]:
+            del self.listings[path]
+        for key in [key for key in self.walks if stale(key[0])]:
+            del self.walks[key]
@@ -0,0 +1,154 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import json
+import tempfile
+
+from ino.fsindex import FileIndex
+
+
+class HeaderIndex(object):
+    """
+    Index of names libraries provide for #include directives, e.g.
+    `Ethernet.h' or `utility/w5100.h', and include directories they are
+    found in. It replaces passing -I for every subdirectory of every
+    library: only directories headers are actually found in are needed.
+
+    Index of each library is kept in `cache_path' along with modification
+    times of its directories. A library is indexed again once any of them
+    changes, i.e. a file or a subdirectory is added, removed or renamed.
+
+    Libraries are looked up in the order they are given, directories of
+    a library in the order `-I' flags used to be given for them, so the
+    result is what the preprocessor would find.
+    """
+
+    cache_version = 1
+    exclude = ['examples']
+
+    def __init__(self, lib_dirs, cache_path=None, fsindex=None):
+        self.lib_dirs = lib_dirs
+        self.cache_path = cache_path
+        self.fsindex = fsindex or FileIndex()
+        # library -> {'dirs': [[dir, mtime], ...], 'names': {name: dir}}
+        self.libs = {}
+        self.dirty = False
+        # name -> [(library, dir), ...]
+        self.providers = {}
+        # dir -> position in the search path
+        self.ranks = {}
+
+    def load(self):
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return
+        if cache.get('version') == self.cache_version:
+            self.libs = cache['libs']
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        # builds running at once write the index each on their own
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path) or '.')
+        with os.fdopen(fd, 'wt') as f:
+            json.dump({'version': self.cache_version, 'libs': self.libs}, f)
+        os.rename(tmp_path, self.cache_path)
+        self.dirty = False
+
+    def update(self):
+        """
+        Index libraries that are new or changed and forget removed ones.
+        """
+        for lib in self.lib_dirs:
+            if lib not in self.libs or not self.is_fresh(self.libs[lib]):
+                self.libs[lib] = self.index_library(lib)
+                self.dirty = True
+
+        for lib in set(self.libs) - set(self.lib_dirs):
+            del self.libs[lib]
+            self.dirty = True
+
+        self.providers = {}
+        self.ranks = {}
+        for lib in self.lib_dirs:
+            entry = self.libs[lib]
+            for d, _ in entry['dirs']:
+                self.ranks.setdefault(d, len(self.ranks))
+            for name, d in entry['names'].iteritems():
+                self.providers.setdefault(name, []).append((lib, d))
+
+        for providers in self.providers.itervalues():
+            providers.sort(key=lambda provider: self.ranks[provider[1]])
+
+    def is_fresh(self, entry):
+        for d, mtime in entry['dirs']:
+            try:
+                if os.stat(d).st_mtime != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def index_library(self, lib):
+        dirs = [lib] + self.fsindex.subdirs(lib, recursive=True, exclude=self.exclude)
+        ranks = dict((d, i) for i, d in enumerate(dirs))
+
+        # stat'ed before listing, so that a file added meanwhile is noticed
+        # next time
+        mtimes = []
+        for d in dirs:
+            try:
+                mtimes.append([d, os.stat(d).st_mtime])
+            except OSError:
+                pass
+
+        names = {}
+        for d in dirs:
+            files = [name for name, is_dir in self.fsindex.entries(d) if not is_dir]
+            # a file is found as `name' from its own directory, as
+            # `subdir/name' from the parent one and so on up to the library
+            inc_dir, prefix = d, ''
+            while inc_dir in ranks:
+                for filename in files:
+                    name = os.path.join(prefix, filename)
+                    if name not in names or ranks[inc_dir] < ranks[names[name]]:
+                        names[name] = inc_dir
+                if inc_dir == lib:
+                    break
+                inc_dir, prefix = (os.path.dirname(inc_dir),
+                                   os.path.join(os.path.basename(inc_dir), prefix))
+
+        return {'dirs': mtimes, 'names': names}
+
+    def lookup(self, name):
+        """
+        Return (library, include directory) pair `name' would be found in
+        or None if no library provides it.
+        """
+        providers = self.providers.get(os.path.normpath(name))
+        return providers[0] if providers else None
+
+    def collisions(self, names):
+        """
+        Return dict of names among `names' provided by more than one
+        library to list of those libraries, the one that is used first.
+        """
+        result = {}
+        for name in names:
+            libs = []
+            for lib, _ in self.providers.get(os.path.normpath(name), []):
+                if lib not in libs:
+                    libs.append(lib)
+            if len(libs) > 1:
+                result[name] = libs
+        return result
+
+    def inc_flags(self, dirs):
+        """
+        Return -I flags for `dirs' in the order of the search path.
+        """
+        return ['-I' + d for d in sorted(set(dirs), key=self.ranks.get)]
@@ -0,0 +1,113 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import sys
+import errno
+import select
+import struct
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify(object):
+    """
+    Linux inotify instance accessed through libc with ctypes. OSError is
+    raised if it is not available, e.g. on other systems.
+    """
+
+    def __init__(self):
+        import ctypes
+
+        try:
+            self.libc = ctypes.CDLL('libc.so.6', use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise OSError(errno.ENOSYS, 'inotify is not available: %s' % e)
+
+        self.get_errno = ctypes.get_errno
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            self.raise_error('inotify_init1')
+        # watch descriptor -> path
+        self.watches = {}
+
+    def raise_error(self, what, path=None):
+        code = self.get_errno()
+        if path is None:
+            raise OSError(code, '%s: %s' % (what, os.strerror(code)))
+        raise OSError(code, '%s: %s' % (what, os.strerror(code)), path)
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        if isinstance(path, unicode):
+            # would be passed as a wide string otherwise
+            path = path.encode(sys.getfilesystemencoding() or 'utf-8')
+        wd = self.libc.inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            self.raise_error('inotify_add_watch', path)
+        self.watches[wd] = path
+        return wd
+
+    def rm_watch(self, wd):
+        if self.watches.pop(wd, None) is not None:
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout=None):
+        """
+        Wait up to `timeout' seconds, forever if it is None, for events
+        and return list of (watched path, mask, name) of them. The list is
+        empty if none happened in time.
+        """
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return []
+            raise
+        if not ready:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip('\0')
+            offset += length
+            if mask & IN_IGNORED:
+                # the watch is gone along with the watched path
+                self.watches.pop(wd, None)
+                continue
+            events.append((self.watches.get(wd), mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -0,0 +1,208 @@
+# -*- coding: utf-8; -*-
+
+import os
+import sys
+import time
+import errno
+import select
+
+
+class SerialMonitor(object):
+    """
+    Serial monitor run on a select() loop. Bytes received from the device
+    are copied to `output' file descriptor as soon as they come, in big
+    chunks so that high baud rates keep up, every line prefixed with the
+    time it started at if `timestamps' is set.
+
+    In interactive mode keys typed are sent to the device. Ctrl+A Ctrl+X
+    quits as in picocom, Ctrl+A Ctrl+A sends Ctrl+A.
+
+    Lines are prefixed with `label' too if it is given.
+    """
+
+    chunk_size = 64 * 1024
+    escape = '\x01'
+    quit = '\x18'
+
+    def __init__(self, serial, output, timestamps=False, interactive=False, label=None):
+        self.serial = serial
+        self.output = output
+        self.timestamps = timestamps
+        self.interactive = interactive
+        self.label = label
+        self.at_line_start = True
+        self.escaped = False
+
+    def run(self):
+        """
+        Run until quit is asked for or the device is gone.
+        """
+        port = self.serial.fileno()
+        keyboard = sys.stdin.fileno()
+        inputs = [port, keyboard] if self.interactive else [port]
+        while True:
+            try:
+                ready, _, _ = select.select(inputs, [], [])
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            if port in ready:
+                try:
+                    data = os.read(port, self.chunk_size)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    if e.errno == errno.EIO:
+                        # unplugged
+                        return
+                    raise
+                if not data:
+                    return
+                self.write(data)
+
+            if keyboard in ready:
+                keys = os.read(keyboard, 1024)
+                if not keys or not self.send(keys):
+                    return
+
+    def write(self, data, now=None):
+        """
+        Output `data' received at `now', a moment ago if it is None.
+        """
+        if self.timestamps or self.label:
+            data = self.stamp(data, now)
+        while data:
+            data = data[os.write(self.output, data):]
+
+    def stamp(self, data, now=None):
+        stamp = '%s ' % self.label if self.label else ''
+        if self.timestamps:
+            if now is None:
+                now = time.time()
+            stamp += '[%s.%03d] ' % (time.strftime('%H:%M:%S', time.localtime(now)),
+                                     int(now * 1000) % 1000)
+        result = []
+        for line in data.splitlines(True):
+            if self.at_line_start:
+                result.append(stamp)
+            result.append(line)
+            self.at_line_start = line.endswith('\n')
+        return ''.join(result)
+
+    def send(self, keys):
+        """
+        Send `keys' typed to the device. Return False if quit is asked for.
+        """
+        result = []
+        for key in keys:
+            if self.escaped:
+                self.escaped = False
+                if key == self.quit:
+                    self.serial.write(''.join(result))
+                    return False
+                if key != self.escape:
+                    result.append(self.escape)
+            elif key == self.escape:
+                self.escaped = True
+                continue
+            result.append(key)
+
+        self.serial.write(''.join(result))
+        return True
+
+
+class SerialRecorder(object):
+    """
+    Captures several serial ports at once on a single select() loop, each
+    into its own RingLog given in `rings' by port. Ports are opened with
+    `open_port'. A port that is gone, e.g. a board unplugged or being
+    reset, is opened again once it is back. `say' reports what is going
+    on.
+    """
+
+    chunk_size = 64 * 1024
+    reopen_interval = 1.0
+    flush_interval = 5.0
+
+    def __init__(self, rings, open_port, say):
+        self.rings = rings
+        self.open_port = open_port
+        self.say = say
+        # port -> serial object of ports open
+        self.serials = {}
+        # ports reported missing
+        self.missing = set()
+
+    def run(self):
+        """
+        Run until interrupted.
+        """
+        next_reopen = 0
+        last_flush = time.time()
+        try:
+            while True:
+                now = time.time()
+                if now >= next_reopen:
+                    self.reopen()
+                    next_reopen = now + self.reopen_interval
+
+                ports = dict((serial.fileno(), port) for port, serial in self.serials.iteritems())
+                try:
+                    ready, _, _ = select.select(list(ports), [], [], self.reopen_interval)
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+
+                now = time.time()
+                for fd in ready:
+                    self.receive(ports[fd], now)
+
+                if now - last_flush >= self.flush_interval:
+                    for ring in self.rings.itervalues():
+                        ring.flush()
+                    last_flush = now
+        finally:
+            for port in list(self.serials):
+                self.close(port)
+            for ring in self.rings.itervalues():
+                ring.flush()
+
+    def reopen(self):
+        for port in self.rings:
+            if port in self.serials:
+                continue
+            try:
+                self.serials[port] = self.open_port(port)
+            except EnvironmentError as e:
+                if port not in self.missing:
+                    self.say('%s is not available, waiting for it: %s' % (port, e))
+                    self.missing.add(port)
+                continue
+
+            self.say('Recording %s to %s' % (port, self.rings[port].path))
+            self.missing.discard(port)
+
+    def receive(self, port, now):
+        try:
+            data = os.read(self.serials[port].fileno(), self.chunk_size)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            data = ''
+
+        if data:
+            self.rings[port].append(data, now)
+            return
+
+        self.close(port)
+        self.say('%s is gone, waiting for it' % port)
+        self.missing.add(port)
+
+    def close(self, port):
+        try:
+            self.serials.pop(port).close()
+        except EnvironmentError:
+            pass
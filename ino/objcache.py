@@ -0,0 +1,205 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import re
+import json
+import hashlib
+import subprocess
+
+from ino.exc import Abort
+from ino.store import copy_atomically, tool_identity
+from ino.utils import FileLock
+
+
+class ObjectCache(object):
+    """
+    Cache of compiled objects. An object is keyed on the preprocessed
+    source and the compiler command line, so the same source compiled with
+    the same flags is never compiled twice: neither after a clean build,
+    nor on another branch, nor in another project.
+
+    The working directory is not a part of the key, so objects are shared
+    by checkouts and CI workspaces. Debug info of objects compiled through
+    the cache refers to it as `.' for that: see `compile_command'.
+
+    Hit and miss counters and the total size are kept in `stats.json'.
+    When the size exceeds the limit from `config.json', least recently used
+    objects are evicted.
+    """
+
+    default_max_size = 1024 ** 3
+    source_extensions = ('.c', '.cpp', '.cc', '.cxx', '.S')
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def object_path(self, key, suffix='.o'):
+        return self.path('objects', key[:2], key + suffix)
+
+    def lock(self):
+        return FileLock(self.path('lock'))
+
+    def _read_json(self, name, default):
+        try:
+            with open(self.path(name)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return default
+
+    def _write_json(self, name, value):
+        tmp_path = self.path(name + '.tmp')
+        with open(tmp_path, 'wt') as f:
+            json.dump(value, f)
+        os.rename(tmp_path, self.path(name))
+
+    @property
+    def max_size(self):
+        return self._read_json('config.json', {}).get('max_size', self.default_max_size)
+
+    def set_max_size(self, size):
+        with self.lock():
+            config = self._read_json('config.json', {})
+            config['max_size'] = size
+            self._write_json('config.json', config)
+            stats = self._read_json('stats.json', {})
+            self._evict(stats)
+            self._write_json('stats.json', stats)
+
+    def stats(self):
+        stats = {'hits': 0, 'misses': 0, 'size': 0}
+        stats.update(self._read_json('stats.json', {}))
+        stats['max_size'] = self.max_size
+        return stats
+
+    def clear(self):
+        with self.lock():
+            for root, dirs, files in os.walk(self.path('objects'), topdown=False):
+                for name in files:
+                    os.remove(os.path.join(root, name))
+                for name in dirs:
+                    os.rmdir(os.path.join(root, name))
+            self._write_json('stats.json', {})
+
+    def _update_stats(self, hits=0, misses=0, size=0):
+        with self.lock():
+            stats = self._read_json('stats.json', {})
+            stats['hits'] = stats.get('hits', 0) + hits
+            stats['misses'] = stats.get('misses', 0) + misses
+            stats['size'] = stats.get('size', 0) + size
+            if size:
+                self._evict(stats)
+            self._write_json('stats.json', stats)
+
+    def _evict(self, stats):
+        """
+        Remove least recently used objects until the cache takes no more
+        than 90% of its limit. Should be called under the lock.
+        """
+        max_size = self.max_size
+        if stats.get('size', 0) <= max_size:
+            return
+
+        entries = []
+        for root, dirs, files in os.walk(self.path('objects')):
+            for name in files:
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+
+        size = sum(e[1] for e in entries)
+        for mtime, file_size, path in sorted(entries):
+            if size <= max_size * 0.9:
+                break
+            os.remove(path)
+            size -= file_size
+        stats['size'] = size
+
+    def key(self, argv, preprocessed):
+        args = list(argv)
+        # where the object is written to does not affect it
+        args[args.index('-o') + 1] = None
+        identity = {
+            'compiler': tool_identity(argv[0]),
+            'args': args,
+        }
+        digest = hashlib.sha1(json.dumps(identity, sort_keys=True))
+        digest.update(preprocessed)
+        return digest.hexdigest()
+
+    def preprocess_command(self, argv, output):
+        args = [a for a in argv if a != '-c']
+        i = args.index('-o')
+        args[i:i + 2] = ['-E', '-o', '-']
+        # dependency file is still to be written, but next to the object
+        if ('-MMD' in args or '-MD' in args) and '-MF' not in args:
+            args += ['-MF', os.path.splitext(output)[0] + '.d']
+        if '-MT' not in args and '-MQ' not in args:
+            args += ['-MT', output]
+        return args
+
+    def compile_command(self, argv):
+        """
+        Return compiler command `argv' producing an object that does not
+        depend on the working directory: with debug info it is mapped
+        to `.'.
+        """
+        debug = [a for a in argv if a.startswith('-g')]
+        if not debug or debug[-1] == '-g0':
+            return argv
+        return argv[:1] + ['-fdebug-prefix-map=%s=.' % os.getcwd()] + argv[1:]
+
+    def compile(self, argv):
+        """
+        Run compiler command `argv' taking the object from the cache if
+        possible. Return exit code of the compiler.
+        """
+        cacheable = '-c' in argv and '-o' in argv and argv[-1].endswith(self.source_extensions)
+        if not cacheable:
+            return subprocess.call(argv)
+
+        output = argv[argv.index('-o') + 1]
+        pp = subprocess.Popen(self.preprocess_command(argv, output), stdout=subprocess.PIPE)
+        preprocessed = pp.communicate()[0]
+        if pp.returncode:
+            return pp.returncode
+
+        cached = self.object_path(self.key(argv, preprocessed))
+        if os.path.exists(cached):
+            try:
+                copy_atomically(cached, output)
+                # mtime tracks use for LRU eviction
+                os.utime(cached, None)
+                self._update_stats(hits=1)
+                return 0
+            except (IOError, OSError):
+                # evicted meanwhile
+                pass
+
+        ret = subprocess.call(self.compile_command(argv))
+        if ret == 0:
+            copy_atomically(output, cached)
+            self._update_stats(misses=1, size=os.path.getsize(cached))
+        return ret
+
+
+def parse_size(s):
+    """
+    Parse size like `512K', `200M' or `2G' into number of bytes.
+    """
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([KMG]?)i?B?$', s.strip(), re.IGNORECASE)
+    if not match:
+        raise Abort("Invalid size: %s" % s)
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ' KMG'.index(unit.upper() or ' '))
+
+
+def format_size(size):
+    for unit in ['bytes', 'KiB', 'MiB']:
+        if size < 1024:
+            return '%.4g %s' % (size, unit)
+        size /= 1024.0
+    return '%.4g GiB' % size
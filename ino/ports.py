@@ -0,0 +1,174 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import re
+import platform
+
+from fnmatch import fnmatch
+from time import sleep
+
+from ino.inotify import Inotify, IN_CREATE, IN_ATTRIB, IN_MOVED_TO
+
+
+class UsbDevice(object):
+    """
+    USB device a serial port belongs to: vendor and product ids as
+    integers, serial number and location, i.e. the physical USB port it is
+    plugged in, if the platform tells them. A board keeps its location when
+    it re-enumerates, e.g. when a Leonardo resets into the bootloader, and
+    its serial number wherever it is plugged in.
+    """
+
+    __slots__ = ['vid', 'pid', 'location', 'serial']
+
+    def __init__(self, vid, pid, location=None, serial=None):
+        self.vid = vid
+        self.pid = pid
+        self.location = location
+        self.serial = serial
+
+    @property
+    def identity(self):
+        """
+        String telling this very device from any other one, or None if the
+        device has no serial number, as cheap usb-serial converters do.
+        """
+        if not self.serial:
+            return None
+        return 'usb:%04x:%04x:%s' % (self.vid, self.pid, self.serial)
+
+    def __repr__(self):
+        return 'UsbDevice(0x%04x, 0x%04x, %r, %r)' % (self.vid, self.pid, self.location, self.serial)
+
+
+def usb_device(port, sysfs='/sys'):
+    """
+    Return UsbDevice of `port' or None if it is not an USB one or could
+    not be identified.
+    """
+    if platform.system() == 'Linux':
+        return sysfs_usb_device(port, sysfs)
+
+    from serial.tools.list_ports import comports
+    for info in comports():
+        # a tuple of (port, description, hwid) in older pyserial
+        if info[0] != port:
+            continue
+        match = re.search(r'VID:PID=([0-9a-fA-F]+):([0-9a-fA-F]+)', info[2])
+        if match:
+            serial = re.search(r'SER=(\S+)', info[2])
+            return UsbDevice(int(match.group(1), 16), int(match.group(2), 16),
+                             getattr(info, 'location', None),
+                             getattr(info, 'serial_number', None) or (serial and serial.group(1)))
+    return None
+
+
+def sysfs_usb_device(port, sysfs='/sys'):
+    path = os.path.join(sysfs, 'class', 'tty', os.path.basename(port), 'device')
+    if not os.path.exists(path):
+        return None
+
+    # the tty belongs to an interface of the device, the device directory
+    # is the closest one up the tree with ids in it
+    path = os.path.realpath(path)
+    while not os.path.exists(os.path.join(path, 'idVendor')):
+        if os.path.dirname(path) == path:
+            return None
+        path = os.path.dirname(path)
+
+    try:
+        with open(os.path.join(path, 'idVendor')) as f:
+            vid = int(f.read(), 16)
+        with open(os.path.join(path, 'idProduct')) as f:
+            pid = int(f.read(), 16)
+    except (IOError, ValueError):
+        return None
+
+    try:
+        with open(os.path.join(path, 'serial')) as f:
+            serial = f.read().strip() or None
+    except IOError:
+        serial = None
+    return UsbDevice(vid, pid, os.path.basename(path), serial)
+
+
+def board_usb_ids(board):
+    """
+    Return set of (vid, pid) pairs of USB devices `board' model settings
+    declare. Older `boards.txt' give a pair as `build.vid' and `build.pid',
+    newer ones list every pair a board may appear as in `vid.N' and
+    `pid.N'.
+    """
+    pairs = []
+    build = board.get('build', {})
+    if 'vid' in build and 'pid' in build:
+        pairs.append((build['vid'], build['pid']))
+
+    vids = board.get('vid', {})
+    pids = board.get('pid', {})
+    if isinstance(vids, dict) and isinstance(pids, dict):
+        pairs.extend((vids[n], pids[n]) for n in vids if n in pids)
+
+    result = set()
+    for vid, pid in pairs:
+        try:
+            result.add((int(vid, 16), int(pid, 16)))
+        except ValueError:
+            pass
+    return result
+
+
+class PortWatcher(object):
+    """
+    Waits for serial ports matching any of `patterns' to appear. Device
+    nodes are reported as soon as they are created or their permissions
+    are set if inotify is available, otherwise the caller is woken up
+    every `poll_interval' to list ports again.
+    """
+
+    poll_interval = 0.25
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        self.inotify = None
+        try:
+            inotify = Inotify()
+        except OSError:
+            return
+
+        try:
+            for dirname in set(os.path.dirname(p) for p in patterns):
+                inotify.add_watch(dirname, IN_CREATE | IN_ATTRIB | IN_MOVED_TO)
+        except OSError:
+            inotify.close()
+            return
+        self.inotify = inotify
+
+    @property
+    def method(self):
+        return 'inotify' if self.inotify else 'polling'
+
+    def wait(self, timeout):
+        """
+        Wait up to `timeout' seconds and return set of paths of matching
+        device nodes created meanwhile. The set is always empty when
+        polling. Changes of permissions only wake the caller up.
+        """
+        if self.inotify is None:
+            sleep(min(timeout, self.poll_interval))
+            return set()
+
+        result = set()
+        for dirname, mask, name in self.inotify.read(timeout):
+            path = os.path.join(dirname or '', name)
+            if mask & IN_ATTRIB:
+                continue
+            if any(fnmatch(path, pattern) for pattern in self.patterns):
+                result.add(path)
+        return result
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
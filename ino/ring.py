@@ -0,0 +1,154 @@
+# -*- coding: utf-8; -*-
+
+import os
+import time
+import mmap
+import struct
+
+from ino.exc import Abort
+
+
+MAGIC = 'INORING1'
+# magic, capacity, tail, head
+HEADER = struct.Struct('<8sQQQ')
+HEADER_SIZE = 64
+# time received, length of data following
+RECORD = struct.Struct('<dI')
+
+
+class RingLog(object):
+    """
+    Fixed-size file mapped into memory keeping the latest data received
+    from a serial port. Data is stored as records of a chunk prefixed with
+    the time it was received at. Once the file is full the oldest records
+    are overwritten, so it never grows or gets fragmented.
+
+    Positions are offsets in the whole stream of records ever written.
+    The header keeps position of the oldest record kept (tail) and of the
+    end of the latest one (head). A writer moves the tail before records
+    are overwritten and the head once a new record is complete, so the
+    file could be read while it is written: records read are valid if the
+    tail has not passed them meanwhile.
+    """
+
+    def __init__(self, path, f, mm):
+        self.path = path
+        self.f = f
+        self.mm = mm
+        self.capacity = len(mm) - HEADER_SIZE
+
+    @classmethod
+    def create(cls, path, capacity):
+        """
+        Open ring at `path' for writing keeping records it has unless its
+        capacity differs from `capacity', create it if it doesn't exist.
+        """
+        if capacity < 4096:
+            raise Abort('Capture size must be at least 4K')
+        size = HEADER_SIZE + capacity
+        f = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o666), 'r+b')
+        header = f.read(HEADER.size)
+        if (len(header) < HEADER.size or HEADER.unpack(header)[:2] != (MAGIC, capacity)
+                or os.fstat(f.fileno()).st_size != size):
+            f.seek(0)
+            f.truncate()
+            # blocks are allocated once, not as the ring gets written
+            zeros = '\0' * min(size, 1024 * 1024)
+            for offset in xrange(0, size, len(zeros)):
+                f.write(zeros[:size - offset])
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, capacity, 0, 0))
+            f.flush()
+
+        ring = cls(path, f, mmap.mmap(f.fileno(), size))
+        if not 0 <= ring.head - ring.tail <= capacity:
+            raise Abort('%s is damaged' % path)
+        return ring
+
+    @classmethod
+    def open(cls, path):
+        """
+        Open ring at `path' for reading.
+        """
+        try:
+            f = open(path, 'rb')
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError) as e:
+            raise Abort('Can not open %s: %s' % (path, e))
+        if len(mm) < HEADER_SIZE or HEADER.unpack_from(mm)[:2] != (MAGIC, len(mm) - HEADER_SIZE):
+            raise Abort('%s is not a serial capture' % path)
+        return cls(path, f, mm)
+
+    @property
+    def tail(self):
+        return HEADER.unpack_from(self.mm)[2]
+
+    @property
+    def head(self):
+        return HEADER.unpack_from(self.mm)[3]
+
+    def append(self, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        # a record never takes more than a quarter of the ring, so that
+        # recent history survives a burst
+        limit = self.capacity // 4 - RECORD.size
+        for start in xrange(0, len(data), limit):
+            self.append_record(data[start:start + limit], timestamp)
+
+    def append_record(self, data, timestamp):
+        tail, head = self.tail, self.head
+        size = RECORD.size + len(data)
+        while head + size - tail > self.capacity:
+            _, length = RECORD.unpack(self.read_at(tail, RECORD.size))
+            tail += RECORD.size + length
+
+        HEADER.pack_into(self.mm, 0, MAGIC, self.capacity, tail, head)
+        self.write_at(head, RECORD.pack(timestamp, len(data)) + data)
+        HEADER.pack_into(self.mm, 0, MAGIC, self.capacity, tail, head + size)
+
+    def read(self, pos=None):
+        """
+        Return list of (time, data) of records from position `pos' on,
+        from the oldest one kept if it is None, position to continue from
+        and number of bytes overwritten before they could be read.
+        """
+        tail, head = self.tail, self.head
+        start = tail if pos is None else pos
+        pos = max(start, tail)
+        records = []
+        while pos < head:
+            timestamp, length = RECORD.unpack(self.read_at(pos, RECORD.size))
+            end = pos + RECORD.size + length
+            if end > head:
+                # the record is being overwritten
+                break
+            records.append((pos, timestamp, self.read_at(pos + RECORD.size, length)))
+            pos = end
+
+        tail = self.tail
+        records = [(timestamp, data) for p, timestamp, data in records if p >= tail]
+        lost = max(0, min(tail, pos) - start)
+        return records, max(pos, tail), lost
+
+    def write_at(self, pos, data):
+        offset = pos % self.capacity
+        first = min(len(data), self.capacity - offset)
+        self.mm[HEADER_SIZE + offset:HEADER_SIZE + offset + first] = data[:first]
+        if first < len(data):
+            self.mm[HEADER_SIZE:HEADER_SIZE + len(data) - first] = data[first:]
+
+    def read_at(self, pos, length):
+        offset = pos % self.capacity
+        first = min(length, self.capacity - offset)
+        data = self.mm[HEADER_SIZE + offset:HEADER_SIZE + offset + first]
+        if first < length:
+            data += self.mm[HEADER_SIZE:HEADER_SIZE + length - first]
+        return data
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+        self.f.close()
@@ -18,44 +18,60 @@ or mercurial do. The full list is provided below. You may run any of them with
 import sys
 import os.path
 import argparse
-import inspect
 
 import ino.commands
 
-from ino.commands.base import Command
 from ino.conf import configure
 from ino.exc import Abort
 from ino.filters import colorize
 from ino.environment import Environment
 from ino.argparsing import FlexiFormatter
+from ino.utils import server_socket_path
 
 
 def main():
-    e = Environment()
-    e.load()
+    # commands are run by the build server if it is running, which is
+    # not even imported otherwise
+    if os.path.exists(server_socket_path()):
+        from ino.server import delegate
+        code = delegate(sys.argv[1:])
+        if code is not None:
+            sys.exit(code)
 
-    conf = configure()
+    e = Environment()
 
     try:
         current_command = sys.argv[1]
     except IndexError:
         current_command = None
 
+    # Only the command being run is imported. Others are needed just
+    # for their help lines listed by `ino --help'
+    names = ino.commands.names()
+    if current_command in names:
+        classes = {current_command: ino.commands.load(current_command)}
+    else:
+        classes = dict((name, ino.commands.load(name)) for name in names)
+
     parser = argparse.ArgumentParser(prog='ino', formatter_class=FlexiFormatter, description=__doc__)
     subparsers = parser.add_subparsers()
-    is_command = lambda x: inspect.isclass(x) and issubclass(x, Command) and x != Command
-    commands = [cls(e) for _, cls in inspect.getmembers(ino.commands, is_command)]
-    for cmd in commands:
-        p = subparsers.add_parser(cmd.name, formatter_class=FlexiFormatter, help=cmd.help_line)
-        if current_command != cmd.name:
+    cmd = None
+    for name in names:
+        cls = classes.get(name)
+        p = subparsers.add_parser(name, formatter_class=FlexiFormatter,
+                                  help=cls.help_line if cls else None)
+        if current_command != name:
             continue
+        cmd = cls(e)
+        if cmd.uses_environment:
+            e.load()
         cmd.setup_arg_parser(p)
-        p.set_defaults(func=cmd.run, **conf.as_dict(cmd.name))
+        p.set_defaults(func=cmd.run, **configure().as_dict(name))
 
     args = parser.parse_args()
 
     try:
-        run_anywhere = "init clean list-models serial"
+        run_anywhere = "init clean list-models serial dump cache server"
 
         in_project_dir = os.path.isdir(e.src_dir)
         if not in_project_dir and current_command not in run_anywhere:
@@ -80,4 +96,5 @@ def main():
     except KeyboardInterrupt:
         print 'Terminated by user'
     finally:
-        e.dump()
+        if cmd.uses_environment:
+            e.dump()
@@ -0,0 +1,212 @@
+# -*- coding: utf-8; -*-
+
+import re
+import os
+import os.path
+import json
+import hashlib
+import tempfile
+
+
+class IncludeScanner(object):
+    """
+    Finds out which headers a translation unit depends on without running
+    the compiler: #include directives are looked up the way the preprocessor
+    does it, in the directory of the including file, then in -iquote
+    directories for quoted includes and then in -I directories.
+
+    Comments are skipped, and so are groups of conditional compilation
+    known to be excluded, i.e. `#if 0' or the `#else' of `#if 1'. Other
+    conditions are not evaluated, all their groups are taken, so the
+    result is a superset of what `cc -MM' reports.
+
+    Headers not found in any of -I directories are looked up in `headers',
+    a HeaderIndex of libraries. Names and include directories found this
+    way are collected in `indexed'.
+
+    Directives found in a file are cached by its content hash in
+    `cache_path', so only new or modified files are read and parsed again.
+    """
+
+    cache_version = 2
+
+    def __init__(self, inc_dirs, cache_path=None, headers=None):
+        self.inc_dirs = inc_dirs
+        self.cache_path = cache_path
+        self.headers = headers
+        # name -> include directory
+        self.indexed = {}
+        # path -> [mtime, size, digest]
+        self.files = {}
+        # digest -> [[name, quoted], ...]
+        self.digests = {}
+        self.dirty = False
+        self._includes = {}
+        self._resolved = {}
+
+    def reset(self):
+        """
+        Forget what has been found so far, but not directives of files
+        that are validated by their modification time and size anyway.
+        It is for a scanner kept between builds.
+        """
+        self.indexed = {}
+        self._includes = {}
+        self._resolved = {}
+
+    def load(self):
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            return
+        if cache.get('version') == self.cache_version:
+            self.files = cache['files']
+            self.digests = cache['digests']
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        # forget contents no file refers to anymore
+        used = set(digest for _, _, digest in self.files.itervalues())
+        digests = dict((d, inc) for d, inc in self.digests.iteritems() if d in used)
+
+        # builds running at once write the cache each on their own
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path) or '.')
+        with os.fdopen(fd, 'wt') as f:
+            json.dump({'version': self.cache_version, 'files': self.files,
+                       'digests': digests}, f)
+        os.rename(tmp_path, self.cache_path)
+        self.dirty = False
+
+    def includes(self, path):
+        """
+        Return list of (name, quoted) pairs for #include directives of a file.
+        """
+        if path in self._includes:
+            return self._includes[path]
+
+        st = os.stat(path)
+        cached = self.files.get(path)
+        if cached and cached[:2] == [st.st_mtime, st.st_size] and cached[2] in self.digests:
+            result = self.digests[cached[2]]
+        else:
+            with open(path) as f:
+                contents = f.read()
+            digest = hashlib.sha1(contents).hexdigest()
+            if digest not in self.digests:
+                self.digests[digest] = [[name, quoted] for name, quoted
+                                        in parse_includes(contents)]
+            self.files[path] = [st.st_mtime, st.st_size, digest]
+            self.dirty = True
+            result = self.digests[digest]
+
+        self._includes[path] = result
+        return result
+
+    def resolve(self, name, dirs):
+        key = (name, tuple(dirs))
+        if key not in self._resolved:
+            for d in dirs:
+                path = os.path.normpath(os.path.join(d, name))
+                if os.path.isfile(path):
+                    break
+            else:
+                path = None
+            self._resolved[key] = path
+        return self._resolved[key]
+
+    def dependencies(self, source, quote_dirs=()):
+        """
+        Return set of all headers `source' includes directly or indirectly.
+        """
+        result = set()
+        pending = [source]
+        while pending:
+            path = pending.pop()
+            for name, quoted in self.includes(path):
+                if quoted:
+                    dirs = [os.path.dirname(path)] + list(quote_dirs) + self.inc_dirs
+                else:
+                    dirs = self.inc_dirs
+                header = self.resolve(name, dirs)
+                if header is None and self.headers:
+                    found = self.headers.lookup(name)
+                    if found:
+                        self.indexed[name] = found[1]
+                        header = os.path.normpath(os.path.join(found[1], name))
+                if header and header not in result:
+                    result.add(header)
+                    pending.append(header)
+        return result
+
+
+# Comments, along with string and character literals that could contain
+# what looks like one
+COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/|'
+                     r'"(?:\\.|[^"\\\n])*"|'
+                     r"'(?:\\.|[^'\\\n])*'", re.S)
+
+DIRECTIVE = re.compile(r'^[ \t]*#[ \t]*(include|if|ifdef|ifndef|elif|else|endif)\b(.*)$',
+                       re.MULTILINE)
+
+INCLUDE = re.compile(r'^\s*([<"])([^>"]+)[>"]')
+
+
+def strip_comments(contents):
+    def replace(match):
+        text = match.group(0)
+        if text.startswith('/*'):
+            # line structure is kept, a comment is a space otherwise
+            return '\n' * text.count('\n') or ' '
+        if text.startswith('//'):
+            return ' '
+        return text
+    return COMMENT.sub(replace, contents)
+
+
+def constant(expression):
+    """
+    Return value of an #if expression if it is a constant, None otherwise.
+    """
+    expression = expression.strip().strip('()').strip()
+    if expression in ('0', 'false'):
+        return False
+    if expression in ('1', 'true'):
+        return True
+    return None
+
+
+def parse_includes(contents):
+    """
+    Return list of (name, quoted) pairs for #include directives of source
+    `contents' except those commented out or in excluded groups.
+    """
+    result = []
+    # a [taken, decided] pair for every open conditional: whether its
+    # current group could be compiled and whether one of its groups
+    # is known to be compiled
+    groups = []
+    for match in DIRECTIVE.finditer(strip_comments(contents)):
+        directive, rest = match.groups()
+        if directive == 'include':
+            include = INCLUDE.match(rest)
+            if include and all(taken for taken, _ in groups):
+                result.append((include.group(2), include.group(1) == '"'))
+        elif directive in ('if', 'ifdef', 'ifndef'):
+            value = constant(rest) if directive == 'if' else None
+            groups.append([value is not False, value is True])
+        elif not groups:
+            # unbalanced, left to the compiler to complain about
+            continue
+        elif directive == 'elif':
+            value = constant(rest)
+            group = groups[-1]
+            group[0] = not group[1] and value is not False
+            group[1] = group[1] or value is True
+        elif directive == 'else':
+            groups[-1] = [not groups[-1][1], True]
+        else:
+            groups.pop()
+    return result
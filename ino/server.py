@@ -0,0 +1,424 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import sys
+import json
+import time
+import errno
+import fcntl
+import select
+import socket
+import struct
+import threading
+import traceback
+
+import ino
+from ino.utils import jobserver_available, server_socket_path as socket_path
+
+
+# Commands run by the server if it is running. Others are interactive or
+# run for long, or are run by makefiles as `ino cache compile' is.
+served = ['build', 'clean', 'list-models', 'preproc']
+
+# Frame header: kind of the frame and length of the payload following
+FRAME_HEADER = struct.Struct('>cI')
+
+# Set in the server process, so that commands it runs are not handed to it
+serving = False
+
+
+def code_stamp():
+    """
+    Return stamp of the ino installation run. A server run by code other
+    than the one of the client, e.g. of an older version, is not used.
+    """
+    package_dir = os.path.dirname(os.path.abspath(ino.__file__))
+    mtimes = []
+    for root, dirs, files in os.walk(package_dir):
+        mtimes.extend(os.path.getmtime(os.path.join(root, f))
+                      for f in files if f.endswith('.py'))
+    return [ino.__version__, package_dir, len(mtimes), max(mtimes)]
+
+
+def send_frame(sock, kind, payload=''):
+    sock.sendall(FRAME_HEADER.pack(kind, len(payload)) + payload)
+
+
+def recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 64 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def recv_frame(sock):
+    """
+    Return (kind, payload) of the next frame or None if the other side
+    has closed the connection.
+    """
+    header = recv_exactly(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    kind, length = FRAME_HEADER.unpack(header)
+    payload = recv_exactly(sock, length)
+    if payload is None:
+        return None
+    return kind, payload
+
+
+def connect(path=None):
+    """
+    Return socket connected to the server or None if none is running.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path or socket_path())
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def query(kind, path=None):
+    """
+    Send a control frame, e.g. 'i' for information about the server, and
+    return its reply or None if no server is running.
+    """
+    sock = connect(path)
+    if sock is None:
+        return None
+    try:
+        send_frame(sock, kind)
+        reply = recv_frame(sock)
+    except socket.error:
+        return None
+    finally:
+        sock.close()
+    return json.loads(reply[1]) if reply else None
+
+
+def delegate(argv, path=None, stdout=1, stderr=2):
+    """
+    Run ino with `argv' in the server if it is running and the command is
+    served. Output of the command is copied to `stdout' and `stderr' file
+    descriptors. Return its exit code or None if the command has to be
+    run by this process.
+    """
+    if serving or not argv or argv[0] not in served or os.environ.get('INO_NO_SERVER'):
+        return None
+    # file descriptors of an outer make could not be passed to the server
+    if jobserver_available():
+        return None
+    path = path or socket_path()
+    if not os.path.exists(path):
+        return None
+
+    try:
+        request = json.dumps({
+            'stamp': code_stamp(),
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ),
+            'tty': os.isatty(stdout),
+        })
+    except (UnicodeDecodeError, OSError):
+        return None
+
+    sock = connect(path)
+    if sock is None:
+        return None
+
+    outputs = {'o': stdout, 'e': stderr}
+    started = False
+    try:
+        send_frame(sock, 'r', request)
+        while True:
+            frame = recv_frame(sock)
+            if frame is None:
+                if not started:
+                    return None
+                os.write(stderr, 'Ino server has exited while running the command\n')
+                return 1
+            kind, payload = frame
+            if kind == 's':
+                # the server is stale and is exiting
+                return None
+            if kind == 'x':
+                return int(payload)
+            started = True
+            data = payload
+            while data:
+                data = data[os.write(outputs[kind], data):]
+    except socket.error:
+        if not started:
+            return None
+        return 1
+    finally:
+        sock.close()
+
+
+class TerminalOutput(object):
+    """
+    Output file object forwarded to the terminal of a client, so that
+    output is colored as if it was written there directly.
+    """
+
+    def __init__(self, f):
+        self.__dict__['f'] = f
+
+    def isatty(self):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.f, name, value)
+
+
+def run_ino(argv):
+    """
+    Run ino with `argv' within this process and return its exit code.
+    """
+    global serving
+    import ino.runner
+
+    serving = True
+    sys.argv = [sys.argv[0]] + argv
+    try:
+        ino.runner.main()
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        sys.stderr.write('%s\n' % e.code)
+        return 1
+    return 0
+
+
+def set_cloexec(fd):
+    fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+
+class Server(object):
+    """
+    Runs ino commands for clients connected to a unix socket at `path',
+    one at a time, within a single process. Modules imported, discovered
+    tools, compiled board databases, templates and dependency indexes are
+    kept in memory between commands, see `warm_up'. All of these are
+    checked against the files they come from before being used, so a
+    changed Arduino distribution or toolchain is noticed as by ino run
+    anew.
+
+    Commands run in the working directory and environment of the client
+    and their output is sent back to it. The server exits once no
+    commands have come for `idle_timeout' seconds, if it is set, or once
+    a client of other code is seen.
+    """
+
+    def __init__(self, path, idle_timeout=None, run=run_ino, stamp=None):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.run = run
+        self.stamp = stamp or code_stamp()
+        self.sock = None
+        self.started = time.time()
+        self.commands = 0
+        self.running = False
+        # how long output is still forwarded once a command has returned
+        self.drain_timeout = 1.0
+
+    def listen(self):
+        """
+        Bind the socket. Return False if another server is running there.
+        """
+        sock = connect(self.path)
+        if sock:
+            sock.close()
+            return False
+        try:
+            os.unlink(self.path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        set_cloexec(self.sock.fileno())
+        umask = os.umask(0o077)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        self.sock.listen(16)
+        self.inode = os.stat(self.path).st_ino
+        return True
+
+    def warm_up(self):
+        import ino.commands
+        import ino.runner
+        for name in served:
+            ino.commands.load(name)
+
+    def serve(self):
+        self.warm_up()
+        self.running = True
+        try:
+            while self.running:
+                try:
+                    ready, _, _ = select.select([self.sock], [], [], self.idle_timeout)
+                except select.error as e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                if not ready:
+                    break
+
+                conn, _ = self.sock.accept()
+                try:
+                    self.handle(conn)
+                except socket.error:
+                    # the client is gone
+                    pass
+                finally:
+                    conn.close()
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            # the socket could have been taken over by another server
+            if os.stat(self.path).st_ino == self.inode:
+                os.unlink(self.path)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def handle(self, conn):
+        frame = recv_frame(conn)
+        if frame is None:
+            return
+        kind, payload = frame
+
+        if kind == 'i':
+            send_frame(conn, 'i', json.dumps(self.info()))
+        elif kind == 'q':
+            send_frame(conn, 'q', json.dumps(self.info()))
+            self.running = False
+        elif kind == 'r':
+            request = json.loads(payload)
+            if request['stamp'] != json.loads(json.dumps(self.stamp)):
+                send_frame(conn, 's')
+                self.running = False
+                return
+            code = self.run_request(conn, request)
+            send_frame(conn, 'x', str(code))
+
+    def info(self):
+        return {
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'commands': self.commands,
+            'idle_timeout': self.idle_timeout,
+            'version': ino.__version__,
+        }
+
+    def run_request(self, conn, request):
+        """
+        Run command of `request' with its output, written to file
+        descriptors 1 and 2 by this process and its children, forwarded
+        to `conn'. Return its exit code.
+        """
+        self.commands += 1
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        done_r, done_w = os.pipe()
+        for fd in (out_r, err_r, done_r, done_w):
+            set_cloexec(fd)
+        forwarder = threading.Thread(target=self.forward, args=(conn, out_r, err_r, done_r))
+        forwarder.start()
+
+        cwd = os.getcwd()
+        environ = dict(os.environ)
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved = os.dup(1), os.dup(2)
+        for fd in saved:
+            set_cloexec(fd)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        os.close(out_w)
+        os.close(err_w)
+        try:
+            if request['tty']:
+                sys.stdout = TerminalOutput(sys.stdout)
+            os.environ.clear()
+            os.environ.update(request['env'])
+            os.chdir(request['cwd'])
+            code = self.run(request['argv'])
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout = stdout
+            sys.stdout.flush()
+            sys.stderr.flush()
+            # output pipes are closed unless something started by the
+            # command is still running
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            for fd in saved:
+                os.close(fd)
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+
+        os.close(done_w)
+        forwarder.join()
+        return code
+
+    def forward(self, conn, out_r, err_r, done_r):
+        """
+        Forward output read from `out_r' and `err_r' to `conn' until both
+        are closed. Once `done_r' is closed, i.e. the command has returned,
+        output is forwarded for `drain_timeout' more seconds at most: pipes
+        kept open by something the command has left running are closed.
+        """
+        kinds = {out_r: 'o', err_r: 'e'}
+        connected = True
+        deadline = None
+        while kinds:
+            fds = list(kinds) if deadline else list(kinds) + [done_r]
+            timeout = max(deadline - time.time(), 0) if deadline else None
+            ready, _, _ = select.select(fds, [], [], timeout)
+            if not ready:
+                for fd in kinds:
+                    os.close(fd)
+                break
+            for fd in ready:
+                if fd == done_r:
+                    os.close(done_r)
+                    deadline = time.time() + self.drain_timeout
+                    continue
+                data = os.read(fd, 64 * 1024)
+                if not data:
+                    os.close(fd)
+                    del kinds[fd]
+                    continue
+                if not connected:
+                    # output of a command of a client that is gone
+                    continue
+                try:
+                    send_frame(conn, kinds[fd], data)
+                except socket.error:
+                    connected = False
+        if deadline is None:
+            os.close(done_r)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import json
+import shutil
+import hashlib
+import tempfile
+
+from ino.filters import colorize
+from ino.utils import FileLock
+
+
+class ArchiveStore(object):
+    """
+    Store of prebuilt library archives (lib*.a) shared by all projects of
+    a user. An archive is addressed by a key that digests everything it is
+    built from: see `archive_key'.
+
+    Archives are published with an atomic rename under an exclusive lock and
+    fetched under a shared one, so concurrent ino processes could use the
+    same store safely.
+
+    A store that could not be read or written, e.g. one of another user,
+    is not used: archives are built locally then.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.failed = False
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key + '.a')
+
+    def lock(self, key, shared=False):
+        return FileLock(self.path(key) + '.lock', shared=shared)
+
+    def fetch(self, key, dest):
+        """
+        Copy archive `key' to `dest' and return True if it is in the store.
+        """
+        path = self.path(key)
+        if self.failed or not os.path.exists(path):
+            return False
+        try:
+            with self.lock(key, shared=True):
+                if not os.path.exists(path):
+                    return False
+                copy_atomically(path, dest)
+        except (IOError, OSError) as e:
+            self.fail(e)
+            return False
+        return True
+
+    def publish(self, key, src):
+        path = self.path(key)
+        if self.failed or os.path.exists(path):
+            return
+        try:
+            with self.lock(key):
+                if not os.path.exists(path):
+                    copy_atomically(src, path)
+        except (IOError, OSError) as e:
+            self.fail(e)
+
+    def fail(self, error):
+        if not self.failed:
+            self.failed = True
+            print colorize('Warning: archive store %s is not used: %s' % (self.root, error),
+                           'yellow')
+
+
+def copy_atomically(src, dest):
+    # never leave a partially written archive in place, moreover archives
+    # are updated by `ar' in place, so they are copied rather than linked
+    dirname = os.path.dirname(dest) or os.curdir
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            with open(src, 'rb') as src_f:
+                shutil.copyfileobj(src_f, f)
+        os.rename(tmp_path, dest)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def tool_identity(path):
+    """
+    Cheap identity of a tool binary: its real path, size and mtime.
+    """
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    return [path, st.st_size, st.st_mtime]
+
+
+def tree_digest(dirname, exclude=()):
+    """
+    Digest of names and contents of all files within `dirname'.
+    """
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(dirname):
+        dirs[:] = sorted(d for d in dirs if d not in exclude)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, dirname) + '\0')
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+
+def archive_key(tools, flags, source_digests):
+    """
+    Key of a library archive built by `tools' with `flags' from sources
+    having `source_digests': of the library itself and of all libraries and
+    directories it may include headers from.
+    """
+    identity = {
+        'tools': [tool_identity(t) for t in tools],
+        'flags': flags,
+        'sources': source_digests,
+    }
+    return hashlib.sha1(json.dumps(identity, sort_keys=True)).hexdigest()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8; -*-
+
+"""\
+Timing of builds exported as Chrome trace events, see chrome://tracing.
+
+This module is also run as a script by makefile recipes to time the jobs
+they run, so it imports nothing but the standard library:
+
+    python tracing.py EVENTS KIND TARGET -- COMMAND...
+
+runs COMMAND and appends a line of JSON describing it to EVENTS file.
+"""
+
+import os
+import os.path
+import sys
+import json
+import time
+import threading
+import subprocess
+
+from contextlib import contextmanager
+
+
+class Tracer(object):
+    """
+    Records wall-clock spans of build phases run by this process, by any
+    thread, and collects spans of jobs run by makefiles from `jobs_path'.
+    Nothing is recorded unless it is `enabled'.
+    """
+
+    def __init__(self, jobs_path=None, enabled=True):
+        self.jobs_path = jobs_path
+        self.enabled = enabled
+        self.started = time.time()
+        self.spans = []
+        self.jobs = []
+        self.threads = {}
+        self.lock = threading.Lock()
+        if enabled and jobs_path and os.path.exists(jobs_path):
+            os.unlink(jobs_path)
+
+    @property
+    def launcher(self):
+        """
+        Command line prefix running a job through this module. Site is not
+        skipped: under a virtualenv the interpreter needs it to find even
+        the standard library.
+        """
+        script = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+        return [sys.executable, script, self.jobs_path]
+
+    @contextmanager
+    def span(self, name, **args):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            end = time.time()
+            with self.lock:
+                thread = threading.current_thread()
+                tid = self.threads.setdefault(thread.ident, (len(self.threads) + 1, thread.name))[0]
+                self.spans.append({'name': name, 'cat': 'phase', 'ph': 'X', 'tid': tid,
+                                   'ts': start, 'dur': end - start, 'args': args})
+
+    def collect_jobs(self):
+        """
+        Load spans of jobs recorded by makefile recipes and remove the
+        file they are recorded to.
+        """
+        try:
+            with open(self.jobs_path) as f:
+                self.jobs = [json.loads(line) for line in f if line.endswith('\n')]
+            os.unlink(self.jobs_path)
+        except (IOError, OSError):
+            self.jobs = []
+        return self.jobs
+
+    def events(self):
+        """
+        Return list of Chrome trace events of spans recorded. Jobs are
+        laid out on as many rows as have run at once.
+        """
+        pid = os.getpid()
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                   'args': {'name': 'ino build'}}]
+        for tid, name in self.threads.itervalues():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': name}})
+
+        lanes = []
+        job_events = []
+        for job in sorted(self.jobs, key=lambda job: job['ts']):
+            for lane, free_at in enumerate(lanes):
+                if free_at <= job['ts']:
+                    break
+            else:
+                lane = len(lanes)
+                lanes.append(0)
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': 1000 + lane,
+                               'args': {'name': 'job %d' % (lane + 1)}})
+            lanes[lane] = job['ts'] + job['dur']
+            job_events.append(dict(job, ph='X', tid=1000 + lane))
+
+        for span in self.spans + job_events:
+            events.append(dict(span, pid=pid,
+                               ts=int((span['ts'] - self.started) * 1e6),
+                               dur=int(span['dur'] * 1e6)))
+        return events
+
+    def save(self, path):
+        with open(path, 'wt') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f)
+
+    def summary(self, count=10):
+        """
+        Return lines of a table of total time of every phase and of `count'
+        slowest jobs.
+        """
+        totals = {}
+        for span in self.spans:
+            totals[span['name']] = totals.get(span['name'], 0) + span['dur']
+
+        lines = ['Build phases:']
+        for name, dur in sorted(totals.iteritems(), key=lambda item: -item[1]):
+            lines.append('  %8.3f s  %s' % (dur, name))
+
+        if self.jobs:
+            lines.append('Slowest files:')
+            for job in sorted(self.jobs, key=lambda job: -job['dur'])[:count]:
+                lines.append('  %8.3f s  %-8s %s' % (job['dur'], job['cat'], job['name']))
+        return lines
+
+
+def run_job(argv):
+    """
+    Run command of `argv' given as EVENTS KIND TARGET -- COMMAND... and
+    record its span to EVENTS. Return its exit code.
+    """
+    events_path, kind, target = argv[:3]
+    command = argv[3:]
+    if command and command[0] == '--':
+        command = command[1:]
+
+    start = time.time()
+    try:
+        code = subprocess.call(command)
+    except OSError as e:
+        sys.stderr.write('%s: %s\n' % (command[0], e))
+        code = 127
+    end = time.time()
+
+    record = json.dumps({'name': target, 'cat': kind, 'ts': start, 'dur': end - start,
+                         'args': {'command': os.path.basename(command[0]), 'status': code}})
+    # a single write of a line is not interleaved with lines of other jobs
+    fd = os.open(events_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, record + '\n')
+    finally:
+        os.close(fd)
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(run_job(sys.argv[1:]))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import json
+import hashlib
+import tempfile
+
+from ino.utils import FileLock, mkdir
+
+
+class UploadLog(object):
+    """
+    Record of firmware last flashed successfully to each board, kept as
+    digests of hex files. It is shared by all projects of a user and
+    guarded by a lock, so several uploads could run at once.
+
+    A board is known by identity of its device, see `UsbDevice.identity',
+    rather than by serial port, which another board may be plugged into
+    meanwhile. Nothing is recorded for a device without identity, so
+    uploads to it are never skipped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def lock(self):
+        return FileLock(self.path + '.lock')
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def save(self, records):
+        mkdir(os.path.dirname(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, 'wt') as f:
+            json.dump(records, f)
+        os.rename(tmp_path, self.path)
+
+    def key(self, identity, board_model):
+        return '%s %s' % (identity, board_model)
+
+    def get(self, identity, board_model):
+        if identity is None:
+            return None
+        return self.load().get(self.key(identity, board_model))
+
+    def record(self, identity, board_model, digest):
+        """
+        Record `digest' as flashed, or forget what was flashed if it is
+        None, e.g. before flashing starts.
+        """
+        if identity is None:
+            return
+        with self.lock():
+            records = self.load()
+            if digest:
+                records[self.key(identity, board_model)] = digest
+            else:
+                records.pop(self.key(identity, board_model), None)
+            self.save(records)
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
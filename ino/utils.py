@@ -1,7 +1,17 @@
 # -*- coding: utf-8; -*-
 
+import os
 import os.path
-import itertools
+import re
+import heapq
+import fcntl
+import errno
+import select
+import threading
+
+from contextlib import contextmanager
+
+from ino.fsindex import FileIndex
 
 
 try:
@@ -37,15 +47,245 @@ class FileMap(OrderedDict):
         return SpaceList(x.path for x in self.targets())
 
 
-def list_subdirs(dirname, recursive=False, exclude=[]):
-    entries = [e for e in os.listdir(dirname) if e not in exclude and not e.startswith('.')]
-    paths = [os.path.join(dirname, e) for e in entries]
-    dirs = filter(os.path.isdir, paths)
-    if recursive:
-        sub = itertools.chain.from_iterable(
-            list_subdirs(d, recursive=True, exclude=exclude) for d in dirs)
-        dirs.extend(sub)
-    return dirs
+def list_subdirs(dirname, recursive=False, exclude=[], index=None):
+    return (index or FileIndex()).subdirs(dirname, recursive=recursive, exclude=exclude)
+
+
+def cache_dir(*parts):
+    """
+    Return path within per-user cache directory of ino shared by all
+    projects: $INO_CACHE_DIR, $XDG_CACHE_HOME/ino or ~/.cache/ino.
+    """
+    root = os.environ.get('INO_CACHE_DIR')
+    if not root:
+        xdg = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        root = os.path.join(xdg, 'ino')
+    return os.path.join(root, *parts)
+
+
+def server_socket_path():
+    """
+    Return path of the socket `ino server' listens at.
+    """
+    return cache_dir('server.sock')
+
+
+def mkdir(path):
+    """
+    Create directory `path' with all parents unless it exists and return it.
+    """
+    try:
+        os.makedirs(path)
+    except OSError:
+        # exists or created concurrently
+        if not os.path.isdir(path):
+            raise
+    return path
+
+
+class FileLock(object):
+    """
+    Advisory lock on a file shared by several ino processes. Use as
+    a context manager.
+    """
+
+    def __init__(self, path, shared=False):
+        self.path = path
+        self.shared = shared
+        self.f = None
+
+    def __enter__(self):
+        mkdir(os.path.dirname(self.path))
+        self.f = open(self.path, 'a')
+        fcntl.flock(self.f, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+        self.f = None
+
+
+def cpu_count():
+    import multiprocessing
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+JOBSERVER_FLAG = re.compile(r'--jobserver-(?:auth|fds)=(?:fifo:(\S+)|(\d+),(\d+))')
+
+
+def jobserver_available(environ=os.environ):
+    """
+    Return True if the process is run by a recursive rule of an outer
+    `make -j' and thus can join its jobserver: MAKEFLAGS has to mention the
+    jobserver and its file descriptors (or fifo) must have been passed down.
+    """
+    match = JOBSERVER_FLAG.search(environ.get('MAKEFLAGS', ''))
+    if not match:
+        return False
+
+    fifo, rfd, wfd = match.groups()
+    if fifo:
+        return os.path.exists(fifo)
+
+    try:
+        os.fstat(int(rfd))
+        os.fstat(int(wfd))
+    except OSError:
+        return False
+    return True
+
+
+class JobServer(object):
+    """
+    GNU make jobserver to be shared by make processes run concurrently, so
+    that all together they run no more than `jobs' jobs. Make processes
+    join it through MAKEFLAGS from the environment returned by `environ'.
+
+    Every make runs one job in its implicit slot without a token. So that
+    implicit slots of makes run at once do not add up, each make has to be
+    run within `slot()', which holds a token for it meanwhile.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.rfd, self.wfd = os.pipe()
+        self.owned = True
+        # a jobserver of ino has no implicit slot, it runs no jobs itself
+        self.implicit_free = False
+        self.lock = threading.Lock()
+        os.write(self.wfd, '+' * jobs)
+
+    @classmethod
+    def join(cls, environ=os.environ):
+        """
+        Return JobServer of an outer `make -j' running this process by a
+        recursive rule or None if there is none, see `jobserver_available'.
+        The slot of that rule is the implicit slot of the first make run.
+        """
+        if not jobserver_available(environ):
+            return None
+
+        fifo, rfd, wfd = JOBSERVER_FLAG.search(environ['MAKEFLAGS']).groups()
+        jobserver = cls.__new__(cls)
+        jobserver.jobs = None
+        if fifo:
+            jobserver.rfd = jobserver.wfd = os.open(fifo, os.O_RDWR)
+        else:
+            jobserver.rfd, jobserver.wfd = int(rfd), int(wfd)
+        jobserver.owned = bool(fifo)
+        jobserver.implicit_free = True
+        jobserver.lock = threading.Lock()
+        return jobserver
+
+    def environ(self):
+        if self.jobs is None:
+            # makes find the outer jobserver in the inherited MAKEFLAGS
+            return None
+        makeflags = ' -j%d --jobserver-fds=%d,%d' % (self.jobs, self.rfd, self.wfd)
+        return dict(os.environ, MAKEFLAGS=makeflags)
+
+    def acquire(self):
+        """
+        Wait for a job slot and return its token, None for the implicit
+        slot.
+        """
+        with self.lock:
+            if self.implicit_free:
+                self.implicit_free = False
+                return None
+
+        while True:
+            try:
+                # the descriptor could be non-blocking if it is of make
+                select.select([self.rfd], [], [])
+                token = os.read(self.rfd, 1)
+            except (OSError, select.error) as e:
+                if e.args[0] in (errno.EINTR, errno.EAGAIN):
+                    continue
+                raise
+            if token:
+                return token
+
+    def release(self, token):
+        if token is None:
+            with self.lock:
+                self.implicit_free = True
+        else:
+            os.write(self.wfd, token)
+
+    @contextmanager
+    def slot(self):
+        token = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    def close(self):
+        if self.owned:
+            os.close(self.rfd)
+            if self.wfd != self.rfd:
+                os.close(self.wfd)
+
+
+def map_concurrently(func, items, threads):
+    """
+    Return list of `func' results for `items' called on a pool of
+    `threads' threads. If a call raises, items not started yet are dropped
+    and calls already running are waited for before the exception is
+    raised, so nothing they do happens after it is reported.
+    """
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(max(threads, 1))
+    try:
+        results = pool.map(func, items)
+    except BaseException:
+        pool.terminate()
+        pool.join()
+        raise
+    pool.close()
+    pool.join()
+    return results
+
+
+def toposort(nodes, edges):
+    """
+    Order `nodes` so that every node goes before all nodes it has `edges` to.
+    Ties are resolved by the original order of `nodes`, cycles are broken
+    the same way.
+    """
+    index = dict((node, i) for i, node in enumerate(nodes))
+    indegree = dict.fromkeys(nodes, 0)
+    for node in nodes:
+        for dep in edges.get(node, ()):
+            indegree[dep] += 1
+
+    ready = [index[node] for node in nodes if not indegree[node]]
+    heapq.heapify(ready)
+    placed = set()
+    result = []
+    while len(result) < len(nodes):
+        if not ready:
+            # a cycle: release the earliest node of it
+            ready.append(min(index[node] for node in nodes if node not in placed))
+
+        node = nodes[heapq.heappop(ready)]
+        if node in placed:
+            continue
+
+        placed.add(node)
+        result.append(node)
+        for dep in edges.get(node, ()):
+            indegree[dep] -= 1
+            if not indegree[dep]:
+                heapq.heappush(ready, index[dep])
+
+    return result
 
 
 def format_available_options(items, head_width, head_color='cyan', 
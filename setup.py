@@ -3,6 +3,8 @@
 
 from setuptools import setup
 
+from ino import __version__
+
 install_requires = open("requirements.txt").read().split('\n')
 readme_content = open("README.rst").read()
 
@@ -17,7 +19,7 @@ ino_package_data = gen_data_files('ino', 'make') + gen_data_files('ino', 'templa
 
 setup(
     name='ino',
-    version='0.3.6',
+    version=__version__,
     description='Command line toolkit for working with Arduino hardware',
     long_description=readme_content,
     author='Victor Nakoryakov, Amperka Team',
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal, assert_true
+
+from ino.boards import BoardDatabase, BoardModels
+
+
+class TestBoardModels(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.arduino = self.write('arduino/boards.txt', [
+            '# boards',
+            'menu.cpu=Processor',
+            'uno.name=Arduino Uno',
+            'uno.build.mcu=atmega328p',
+            'uno.build.f_cpu=16000000L',
+            '',
+            'mega.name=Arduino Mega',
+            'mega.build.mcu=atmega1280',
+            'mega.build.extra_flags=-DX=1',
+        ])
+        self.vendor = self.write('vendor/boards.txt', [
+            'uno.name=Vendor Uno',
+            'uno.build.mcu=atmega8',
+            'tiny.name=Tiny',
+            'tiny.build.mcu=attiny85',
+        ])
+        self.db = BoardDatabase(os.path.join(self.root, 'db'))
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, lines):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_lookup(self):
+        models = BoardModels([self.arduino], self.db)
+        assert_equal(list(models), ['uno', 'mega'])
+        assert_true('uno' in models)
+        assert_equal(models['uno']['build'], {'mcu': 'atmega328p', 'f_cpu': '16000000L'})
+        assert_equal(models['mega']['build']['extra_flags'], '-DX=1')
+
+    def test_platforms(self):
+        models = BoardModels([self.arduino, self.vendor], self.db)
+        assert_equal(list(models), ['uno', 'mega', 'tiny'])
+        assert_equal(models['uno']['name'], 'Arduino Uno')
+        assert_equal(models['tiny']['build']['mcu'], 'attiny85')
+
+    def test_recompiled_on_change(self):
+        BoardModels([self.arduino], self.db)
+        with open(self.arduino, 'a') as f:
+            f.write('nano.name=Arduino Nano\nnano.build.mcu=atmega328p\n')
+        os.utime(self.arduino, (1000000000, 1000000000))
+
+        models = BoardModels([self.arduino], self.db)
+        assert_equal(models['nano']['build']['mcu'], 'atmega328p')
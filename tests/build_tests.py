@@ -0,0 +1,95 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.commands.build import Build
+from ino.environment import Environment, Version
+from ino.fsindex import FileIndex
+from ino.tracing import Tracer
+from ino.utils import SpaceList
+
+
+class TestFindLibraries(object):
+    def setup(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        os.chdir(self.root)
+        self.write('src/sketch.cpp', '#include <Arduino.h>\n')
+        self.write('dist/cores/arduino/Arduino.h', '#include "pins_arduino.h"\n')
+        self.write('dist/variants/standard/pins_arduino.h', '\n')
+        # the variant of a board with an USB controller needs a library
+        self.write('dist/variants/usb/pins_arduino.h', '#include <USBHost.h>\n')
+        self.write('dist/libraries/USBHost/USBHost.h', '\n')
+        self.write('dist/libraries/Servo/Servo.h', '\n')
+        os.makedirs('lib')
+        os.makedirs('.build')
+
+    def teardown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def write(self, path, contents):
+        path = os.path.join(self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def build(self, variant):
+        core_dir = os.path.join(self.root, 'dist', 'cores', 'arduino')
+        variant_dir = os.path.join(self.root, 'dist', 'variants', variant)
+        e = Environment(arduino_core_dir=core_dir,
+                        arduino_libraries_dir=os.path.join(self.root, 'dist', 'libraries'),
+                        build_dir=os.path.join('.build', variant),
+                        cppflags=SpaceList(['-I' + core_dir, '-I' + variant_dir]),
+                        names={'cpp': '%s.cpp'},
+                        arduino_lib_version=Version(1, 0, 0))
+        e['version.txt'] = os.path.join(self.root, 'dist', 'lib', 'version.txt')
+        build = Build(e)
+        build.label = None
+        build.fsindex = FileIndex()
+        build.indexes = {}
+        build.sketches = {}
+        build.tracer = Tracer(os.path.join(self.root, 'trace.jobs'), enabled=False)
+        return build
+
+    def test_variant_headers(self):
+        # boards of different variants are built by the same process
+        standard, usb = self.build('standard'), self.build('usb')
+        usb.indexes = standard.indexes
+
+        core_dir = os.path.join(self.root, 'dist', 'cores', 'arduino')
+        lib_dir = os.path.join(self.root, 'dist', 'libraries', 'USBHost')
+        _, used_libs, _ = standard.find_libraries()
+        assert_equal(used_libs, [core_dir])
+        _, used_libs, inc_flags = usb.find_libraries()
+        assert_equal(sorted(used_libs), [core_dir, lib_dir])
+        assert_equal('-I' + lib_dir in inc_flags, True)
+
+    def test_sketches_of_each_board(self):
+        # libraries included only by sketches are found for every board
+        os.remove('src/sketch.cpp')
+        self.write('src/sketch.ino', '#include <Servo.h>\nvoid setup() {}\nvoid loop() {}\n')
+        standard, usb = self.build('standard'), self.build('usb')
+        for attr in ['fsindex', 'indexes', 'sketches']:
+            setattr(usb, attr, getattr(standard, attr))
+
+        standard.prepare_sources([standard, usb])
+        lib_dir = os.path.join(self.root, 'dist', 'libraries', 'Servo')
+        assert_equal(lib_dir in standard.libraries[1], True)
+        assert_equal(lib_dir in usb.libraries[1], True)
+        # sketches are converted once for both boards
+        assert_equal(len(standard.sketches), 1)
+
+    def test_dependency_makefiles(self):
+        # makefiles are rendered within the build directory
+        build = self.build('standard')
+        made = []
+        build.make = lambda makefile, target=None, **kwargs: made.append(target)
+        build._scan_dependencies('src', SpaceList())
+        assert_equal(made, [os.path.join('src', 'Makefile.deps')])
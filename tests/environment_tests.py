@@ -1,8 +1,13 @@
 # -*- coding: utf-8; -*-
 
+import os
+import os.path
+import shutil
+import tempfile
+
 from nose.tools import assert_equal
 
-from ino.environment import Version
+from ino.environment import Version, Environment, DiscoveryCache
 
 
 class TestVersion(object):
@@ -18,3 +23,70 @@ class TestVersion(object):
         assert_equal(Version(1, 0, 0).as_int(), 100)
         assert_equal(Version(1, 0, 5).as_int(), 105)
         assert_equal(Version(1, 5, 1).as_int(), 151)
+
+
+class TestDiscoveryCache(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.tool = os.path.join(self.root, 'avr-gcc')
+        open(self.tool, 'w').close()
+        self.cache_path = os.path.join(self.root, 'discovery.json')
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def cache(self):
+        cache = DiscoveryCache(self.cache_path)
+        cache.load()
+        return cache
+
+    def test_roundtrip(self):
+        cache = self.cache()
+        cache.set('cc', [['avr-gcc'], [self.root]], self.tool, [self.tool])
+        cache.save()
+        assert_equal(self.cache().get('cc', [['avr-gcc'], [self.root]]), self.tool)
+        assert_equal(self.cache().get('cc', [['gcc'], [self.root]]), None)
+
+    def test_invalidation(self):
+        cache = self.cache()
+        cache.set('cc', [['avr-gcc'], [self.root]], self.tool, [self.tool])
+        cache.save()
+
+        os.utime(self.tool, (1000000000, 1000000000))
+        assert_equal(self.cache().get('cc', [['avr-gcc'], [self.root]]), None)
+
+    def test_shared(self):
+        # found for another project by the same process
+        self.cache().set('cc', [['avr-gcc'], [self.root]], self.tool, [self.tool])
+        other = DiscoveryCache(os.path.join(self.root, 'other.json'))
+        assert_equal(other.get('cc', [['avr-gcc'], [self.root]]), self.tool)
+
+        os.utime(self.tool, (1000000000, 1000000000))
+        other = DiscoveryCache(os.path.join(self.root, 'other.json'))
+        assert_equal(other.get('cc', [['avr-gcc'], [self.root]]), None)
+
+
+class TestEnvironment(object):
+    def setup(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        os.chdir(self.root)
+        os.makedirs(Environment.output_dir)
+
+    def teardown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def test_persistent_settings(self):
+        # `ino build -d PATH' is remembered by later runs without -d
+        e = Environment()
+        e.load()
+        e['arduino_dist_dir'] = '/opt/arduino'
+        e['build_dir'] = '.build/uno'
+        e.dump()
+
+        e = Environment()
+        e.load()
+        assert_equal(e['arduino_dist_dir'], '/opt/arduino')
+        assert_equal('build_dir' in e, False)
+        assert_equal(os.listdir(Environment.output_dir), ['discovery.json'])
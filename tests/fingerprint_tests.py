@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.fingerprint import Fingerprint, tree_state, dir_listing
+
+
+class TestFingerprint(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.write('src/main.cpp', 'int main() {}\n')
+        self.write('lib/.holder', '')
+        self.write('tools/cc', '')
+        self.write('build/firmware.hex', '')
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def write(self, name, contents):
+        if not os.path.isdir(os.path.dirname(self.path(name))):
+            os.makedirs(os.path.dirname(self.path(name)))
+        with open(self.path(name), 'w') as f:
+            f.write(contents)
+
+    def fingerprint(self, **settings):
+        settings.setdefault('board_model', 'uno')
+        return Fingerprint(self.path('build'), settings)
+
+    def save(self):
+        self.fingerprint().save([self.path('tools/cc')], [self.path('src')],
+                                [self.path('lib')])
+
+    def up_to_date(self, **settings):
+        return self.fingerprint(**settings).up_to_date([self.path('build/firmware.hex')])
+
+    def test_up_to_date(self):
+        assert_equal(self.up_to_date(), False)
+        self.save()
+        assert_equal(self.up_to_date(), True)
+
+    def test_missing_output(self):
+        self.save()
+        os.remove(self.path('build/firmware.hex'))
+        assert_equal(self.up_to_date(), False)
+
+    def test_source_edit(self):
+        self.save()
+        self.write('src/main.cpp', 'int main() { return 1; }\n')
+        assert_equal(self.up_to_date(), False)
+
+    def test_new_file_in_listing(self):
+        # a new library could take over an #include
+        self.save()
+        os.makedirs(self.path('lib/Servo'))
+        assert_equal(self.up_to_date(), False)
+
+    def test_settings(self):
+        self.save()
+        assert_equal(self.up_to_date(board_model='mega'), False)
+
+    def test_snapshot(self):
+        # files modified while building are rebuilt next time
+        fingerprint = self.fingerprint()
+        fingerprint.snapshot(self.path('src'))
+        self.write('src/main.cpp', 'int main() { return 1; }\n')
+        fingerprint.save([self.path('tools/cc')], [self.path('src')], [self.path('lib')])
+        assert_equal(self.up_to_date(), False)
+
+    def test_corrupt_state(self):
+        for contents in ['', '{"digest": ', '[]', '{}']:
+            self.write('build/fingerprint', contents)
+            assert_equal(self.up_to_date(), False)
+
+    def test_discard(self):
+        self.save()
+        self.fingerprint().discard()
+        assert_equal(os.path.exists(self.path('build/fingerprint')), False)
+        assert_equal(self.up_to_date(), False)
+
+
+class TestTreeState(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'b'))
+        with open(os.path.join(self.root, 'b', 'x.h'), 'w') as f:
+            f.write('x')
+        open(os.path.join(self.root, 'a.cpp'), 'w').close()
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def test_tree_state(self):
+        state = tree_state(self.root)
+        assert_equal([entry[0] for entry in state], ['a.cpp', os.path.join('b', 'x.h')])
+        assert_equal([entry[2] for entry in state], [0, 1])
+
+    def test_dir_listing(self):
+        assert_equal(dir_listing(self.root), ['a.cpp', 'b'])
+        assert_equal(dir_listing(os.path.join(self.root, 'missing')), None)
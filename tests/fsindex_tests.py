@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.filters import glob
+from ino.fsindex import FileIndex
+
+
+class TestFileIndex(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        for name in ['a.cpp', 'b.c', 'util/c.cpp', 'util/deep/d.c', 'examples/e.cpp', '.git/f.c']:
+            self.write(name)
+        self.index = FileIndex()
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name):
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+
+    def test_glob(self):
+        found = glob(self.root, '*.c', index=self.index)
+        assert_equal(sorted(map(str, found)), ['.git/f.c', 'b.c', 'util/deep/d.c'])
+        found = glob(self.root, '*.cpp', recursive=False, index=self.index)
+        assert_equal(map(str, found), ['a.cpp'])
+        assert_equal(glob(os.path.join(self.root, 'missing'), '*.c', index=self.index), [])
+
+    def test_subdirs(self):
+        subdirs = self.index.subdirs(self.root, recursive=True, exclude=['examples'])
+        assert_equal(sorted(os.path.relpath(d, self.root) for d in subdirs),
+                     ['util', 'util/deep'])
+
+    def test_listed_once(self):
+        glob(self.root, '*.c', index=self.index)
+        self.write('util/new.c')
+        assert_equal(len(glob(self.root, '*.c', index=self.index)), 3)
+
+        self.index.invalidate(os.path.join(self.root, 'util'))
+        assert_equal(len(glob(self.root, '*.c', index=self.index)), 4)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.headers import HeaderIndex
+
+
+class TestHeaderIndex(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.write('libs/Ethernet/Ethernet.h')
+        self.write('libs/Ethernet/utility/w5100.h')
+        self.write('libs/Ethernet/examples/Demo/Demo.h')
+        self.write('libs/SD/SD.h')
+        self.write('libs/SD/utility/w5100.h')
+        self.libs = [self.path('libs/Ethernet'), self.path('libs/SD')]
+        self.cache_path = self.path('headers.cache')
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def write(self, name):
+        if not os.path.isdir(os.path.dirname(self.path(name))):
+            os.makedirs(os.path.dirname(self.path(name)))
+        open(self.path(name), 'w').close()
+
+    def index(self):
+        index = HeaderIndex(self.libs, self.cache_path)
+        index.load()
+        index.update()
+        index.save()
+        return index
+
+    def test_lookup(self):
+        index = self.index()
+        assert_equal(index.lookup('SD.h'), (self.path('libs/SD'), self.path('libs/SD')))
+        assert_equal(index.lookup('w5100.h'),
+                     (self.path('libs/Ethernet'), self.path('libs/Ethernet/utility')))
+        assert_equal(index.lookup('utility/w5100.h'),
+                     (self.path('libs/Ethernet'), self.path('libs/Ethernet')))
+        assert_equal(index.lookup('Demo.h'), None)
+
+    def test_collisions(self):
+        index = self.index()
+        assert_equal(index.collisions(['SD.h', 'w5100.h']),
+                     {'w5100.h': self.libs})
+
+    def test_inc_flags(self):
+        index = self.index()
+        dirs = [self.path('libs/SD'), self.path('libs/Ethernet/utility'), self.path('libs/Ethernet')]
+        assert_equal(index.inc_flags(dirs), ['-I' + d for d in sorted(dirs)])
+
+    def test_reindexed_on_change(self):
+        self.index()
+        self.write('libs/SD/utility/new.h')
+        os.utime(self.path('libs/SD/utility'), (1000000000, 1000000000))
+
+        index = HeaderIndex(self.libs, self.cache_path)
+        index.load()
+        index.update()
+        assert_equal(index.lookup('new.h'), (self.path('libs/SD'), self.path('libs/SD/utility')))
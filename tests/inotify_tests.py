@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.inotify import Inotify, IN_CREATE, IN_DELETE
+
+
+class TestInotify(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.inotify = Inotify()
+
+    def teardown(self):
+        self.inotify.close()
+        shutil.rmtree(self.root)
+
+    def test_events(self):
+        self.inotify.add_watch(self.root, IN_CREATE | IN_DELETE)
+        assert_equal(self.inotify.read(0), [])
+
+        path = os.path.join(self.root, 'ttyACM0')
+        open(path, 'w').close()
+        os.remove(path)
+        events = self.inotify.read(1)
+        assert_equal([(d, mask & (IN_CREATE | IN_DELETE), name) for d, mask, name in events],
+                     [(self.root, IN_CREATE, 'ttyACM0'), (self.root, IN_DELETE, 'ttyACM0')])
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+from nose.tools import assert_equal
+
+from ino.monitor import SerialMonitor
+
+
+class FakeSerial(object):
+    def __init__(self):
+        self.sent = []
+
+    def write(self, data):
+        self.sent.append(data)
+
+
+class TestSerialMonitor(object):
+    def setup(self):
+        self.serial = FakeSerial()
+        self.monitor = SerialMonitor(self.serial, None, timestamps=True, interactive=True)
+
+    def test_stamp(self):
+        stamp = r'\[\d\d:\d\d:\d\d\.\d\d\d\] '
+        assert re.match('^%sone\r\n%stw$' % (stamp, stamp), self.monitor.stamp('one\r\ntw'))
+        # a line continued in the next chunk is not stamped again
+        assert re.match('^o\n%sthree\n$' % stamp, self.monitor.stamp('o\nthree\n'))
+
+    def test_send(self):
+        assert_equal(self.monitor.send('ab\x01\x01c\x01'), True)
+        assert_equal(self.monitor.send('d'), True)
+        assert_equal(self.monitor.send('e\x01\x18f'), False)
+        assert_equal(''.join(self.serial.sent), 'ab\x01c\x01de')
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import sys
+import stat
+import shutil
+import argparse
+import tempfile
+
+from cStringIO import StringIO
+
+from nose.tools import assert_equal, assert_not_equal, assert_raises
+
+from ino.commands.cache import Cache
+from ino.environment import Environment
+from ino.exc import Abort
+from ino.objcache import ObjectCache, parse_size, format_size
+
+
+# Stands in for a compiler: -E prints the source, otherwise it is copied
+# into the object, along with the debug prefix map if given, and every
+# compilation is logged
+COMPILER = """#!/bin/sh
+out=; pp=; src=; map=
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -o|-MF|-MT) [ "$1" = -o ] && out=$2; shift;;
+        -E) pp=1;;
+        -fdebug-prefix-map=*) map=$1;;
+        -*) ;;
+        *) src=$1;;
+    esac
+    shift
+done
+if [ -n "$pp" ]; then
+    cat "$src"
+else
+    { cat "$src"; echo "$map"; } > "$out"
+    echo "$src" >> "$(dirname "$0")/log"
+fi
+"""
+
+
+class TestObjectCache(object):
+    def setup(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        self.cc = os.path.join(self.root, 'avr-gcc')
+        with open(self.cc, 'w') as f:
+            f.write(COMPILER)
+        os.chmod(self.cc, stat.S_IRWXU)
+        self.cache = ObjectCache(os.path.join(self.root, 'cache'))
+        self.checkout('a')
+
+    def teardown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def checkout(self, name):
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+            with open(os.path.join(path, 'main.cpp'), 'w') as f:
+                f.write('int main() {}\n')
+        os.chdir(path)
+
+    def argv(self, *flags):
+        return [self.cc, '-c', '-g', '-Os'] + list(flags) + ['-o', 'main.o', 'main.cpp']
+
+    def compiled(self):
+        try:
+            with open(os.path.join(self.root, 'log')) as f:
+                return len(f.readlines())
+        except IOError:
+            return 0
+
+    def test_key(self):
+        key = self.cache.key(self.argv(), 'int main() {}')
+        assert_equal(self.cache.key(self.argv()[:-2] + ['other.o', 'main.cpp'], 'int main() {}'), key)
+        assert_not_equal(self.cache.key(self.argv('-DX'), 'int main() {}'), key)
+        assert_not_equal(self.cache.key(self.argv(), 'int main() { }'), key)
+        # objects are shared by checkouts even with debug info
+        self.checkout('b')
+        assert_equal(self.cache.key(self.argv(), 'int main() {}'), key)
+
+    def test_hit_and_miss(self):
+        assert_equal(self.cache.compile(self.argv()), 0)
+        os.remove('main.o')
+        assert_equal(self.cache.compile(self.argv()), 0)
+        assert_equal(os.path.exists('main.o'), True)
+        assert_equal(self.compiled(), 1)
+
+        stats = self.cache.stats()
+        assert_equal((stats['hits'], stats['misses']), (1, 1))
+        assert_equal(stats['size'], os.path.getsize('main.o'))
+
+    def test_other_checkout(self):
+        assert_equal(self.cache.compile(self.argv()), 0)
+        self.checkout('b')
+        assert_equal(self.cache.compile(self.argv()), 0)
+        assert_equal(self.compiled(), 1)
+        # debug info does not refer to the checkout compiled first
+        with open('main.o') as f:
+            assert_equal(f.read(), 'int main() {}\n-fdebug-prefix-map=%s=.\n' %
+                         os.path.join(self.root, 'a'))
+
+    def test_compile_command(self):
+        assert_equal(self.cache.compile_command([self.cc, '-c', '-Os']), [self.cc, '-c', '-Os'])
+        assert_equal(self.cache.compile_command([self.cc, '-g', '-g0']), [self.cc, '-g', '-g0'])
+        assert_equal(self.cache.compile_command([self.cc, '-g']),
+                     [self.cc, '-fdebug-prefix-map=%s=.' % os.getcwd(), '-g'])
+
+    def test_not_cacheable(self):
+        assert_equal(self.cache.compile([self.cc, '-o', 'main.o', 'main.cpp']), 0)
+        assert_equal(self.cache.stats()['misses'], 0)
+
+    def test_eviction(self):
+        for i in range(4):
+            with open('main.cpp', 'w') as f:
+                f.write('int f%d() {}\n' % i * 100)
+            self.cache.compile(self.argv())
+            size = os.path.getsize('main.o')
+            # the oldest one goes first
+            os.utime(self.cache.object_path(self.cache.key(self.argv(), open('main.cpp').read())),
+                     (1000000000 + i, 1000000000 + i))
+
+        self.cache.set_max_size(size * 2)
+        objects = [name for _, _, files in os.walk(self.cache.path('objects')) for name in files]
+        assert_equal(len(objects), 1)
+        assert_equal(self.cache.stats()['size'], size)
+
+    def test_clear(self):
+        self.cache.compile(self.argv())
+        self.cache.clear()
+        assert_equal(self.cache.stats()['size'], 0)
+        self.cache.compile(self.argv())
+        assert_equal(self.compiled(), 2)
+
+
+class TestSizes(object):
+    def test_parse_size(self):
+        assert_equal(parse_size('512'), 512)
+        assert_equal(parse_size('512K'), 512 * 1024)
+        assert_equal(parse_size('1.5M'), 1024 * 1024 * 3 / 2)
+        assert_equal(parse_size('2GiB'), 2 * 1024 ** 3)
+        assert_equal(parse_size(' 200mb '), 200 * 1024 ** 2)
+        assert_raises(Abort, parse_size, 'lots')
+
+    def test_format_size(self):
+        assert_equal(format_size(100), '100 bytes')
+        assert_equal(format_size(1536), '1.5 KiB')
+        assert_equal(format_size(2 * 1024 ** 3), '2 GiB')
+
+
+class TestCacheCommand(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ['INO_CACHE_DIR'] = self.root
+
+    def teardown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.root)
+
+    def parse_args(self, *argv):
+        parser = argparse.ArgumentParser()
+        Cache(Environment()).setup_arg_parser(parser)
+        return parser.parse_args(argv)
+
+    def run(self, *argv):
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            Cache(Environment()).run(self.parse_args(*argv))
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_stats(self):
+        output = self.run()
+        assert_equal('Hits:            0' in output, True)
+        assert_equal('Size limit:      1 GiB' in output, True)
+
+    def test_max_size(self):
+        output = self.run('stats', '--max-size', '200M')
+        assert_equal('Size limit:      200 MiB' in output, True)
+        assert_equal(ObjectCache(os.path.join(self.root, 'objects')).max_size, 200 * 1024 ** 2)
+
+    def test_compile_args(self):
+        args = self.parse_args('compile', '--', 'avr-gcc', '-c', '-o', 'main.o', 'main.cpp')
+        assert_equal(args.action, 'compile')
+        assert_equal(args.command, ['avr-gcc', '-c', '-o', 'main.o', 'main.cpp'])
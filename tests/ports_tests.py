@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.ports import PortWatcher, sysfs_usb_device, board_usb_ids
+
+
+class TestSysfsUsbDevice(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def add_tty(self, name, location, vid, pid, iface_subdir='', serial=None):
+        device = os.path.join(self.root, 'devices', 'usb1', location)
+        iface = os.path.join(device, location + ':1.0', iface_subdir)
+        os.makedirs(iface)
+        with open(os.path.join(device, 'idVendor'), 'w') as f:
+            f.write(vid + '\n')
+        with open(os.path.join(device, 'idProduct'), 'w') as f:
+            f.write(pid + '\n')
+        if serial:
+            with open(os.path.join(device, 'serial'), 'w') as f:
+                f.write(serial + '\n')
+
+        tty = os.path.join(self.root, 'class', 'tty', name)
+        os.makedirs(tty)
+        os.symlink(iface, os.path.join(tty, 'device'))
+
+    def test_acm(self):
+        self.add_tty('ttyACM0', '1-1.2', '2341', '8036')
+        device = sysfs_usb_device('/dev/ttyACM0', self.root)
+        assert_equal((device.vid, device.pid, device.location), (0x2341, 0x8036, '1-1.2'))
+        assert_equal((device.serial, device.identity), (None, None))
+
+    def test_serial(self):
+        self.add_tty('ttyACM0', '1-1.2', '2341', '0043', serial='75330303035351A0E1C1')
+        device = sysfs_usb_device('/dev/ttyACM0', self.root)
+        assert_equal(device.serial, '75330303035351A0E1C1')
+        assert_equal(device.identity, 'usb:2341:0043:75330303035351A0E1C1')
+
+    def test_usb_serial(self):
+        # usb-serial converters have the tty one level deeper
+        self.add_tty('ttyUSB0', '2-1', '0403', '6001', 'ttyUSB0')
+        device = sysfs_usb_device('/dev/ttyUSB0', self.root)
+        assert_equal((device.vid, device.pid, device.location), (0x0403, 0x6001, '2-1'))
+
+    def test_unknown(self):
+        assert_equal(sysfs_usb_device('/dev/ttyS0', self.root), None)
+
+
+class TestBoardUsbIds(object):
+    def test_build_ids(self):
+        board = {'build': {'mcu': 'atmega32u4', 'vid': '0x2341', 'pid': '0x8036'}}
+        assert_equal(board_usb_ids(board), set([(0x2341, 0x8036)]))
+
+    def test_numbered_ids(self):
+        board = {'build': {'mcu': 'atmega328p'},
+                 'vid': {'0': '0x2341', '1': '0x2A03'},
+                 'pid': {'0': '0x0043', '1': '0x0043'}}
+        assert_equal(board_usb_ids(board), set([(0x2341, 0x0043), (0x2A03, 0x0043)]))
+
+    def test_none(self):
+        assert_equal(board_usb_ids({'build': {'mcu': 'atmega328p'}}), set())
+
+
+class TestPortWatcher(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.watcher = PortWatcher([os.path.join(self.root, 'ttyACM*')])
+
+    def teardown(self):
+        self.watcher.close()
+        shutil.rmtree(self.root)
+
+    def test_created(self):
+        assert_equal(self.watcher.method, 'inotify')
+        open(os.path.join(self.root, 'ttyS0'), 'w').close()
+        open(os.path.join(self.root, 'ttyACM1'), 'w').close()
+        os.chmod(os.path.join(self.root, 'ttyS0'), 0o600)
+        assert_equal(self.watcher.wait(1), set([os.path.join(self.root, 'ttyACM1')]))
+        assert_equal(self.watcher.wait(0), set())
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from nose.tools import assert_equal, assert_true
+
+from ino.commands.preproc import Preprocess
+
+
+class TestPrototypes(object):
+    def setup(self):
+        self.preproc = Preprocess(None)
+
+    def prototypes(self, src):
+        return self.preproc.prototypes(src)
+
+    def test_simple(self):
+        src = 'void setup() {\n  pinMode(13, OUTPUT);\n}\n\nvoid loop()\n{\n}\n'
+        assert_equal(self.prototypes(src), ['void setup();', 'void loop();'])
+
+    def test_parameters(self):
+        src = 'unsigned long f(int a, char* s[], byte &b) { return 0; }'
+        assert_equal(self.prototypes(src), ['unsigned long f(int a, char* s[], byte &b);'])
+
+    def test_skips_comments_strings_and_directives(self):
+        src = '\n'.join([
+            '/* void commented() { } */',
+            '// void line() { }',
+            '#define BODY(x) void x() { }',
+            '#define LONG \\',
+            '    void continued() { }',
+            'const char* s = "void str() {";',
+            "char c = '{';",
+            'void real() { Serial.println("}"); if (c == \'}\') { } }',
+        ])
+        assert_equal(self.prototypes(src), ['void real();'])
+
+    def test_skips_non_functions(self):
+        src = 'struct Point { int x; };\nint table[] = { 1, 2 };\nif (x) { }\nint g() { }'
+        assert_equal(self.prototypes(src), ['int g();'])
+
+    def test_unterminated_input(self):
+        assert_equal(self.prototypes('void f() { /* never closed'), ['void f();'])
+        assert_equal(self.prototypes('void f() { "never closed'), ['void f();'])
+        assert_equal(self.prototypes('void f() {{{{'), ['void f();'])
+
+    def test_linear_time(self):
+        # Pathological input for backtracking regexes: a huge table,
+        # lots of unbalanced quotes and an unterminated comment
+        table = 'const byte font[] PROGMEM = {\n%s};\n' % ('0x00, 0x7e, 0x81, ' * 20000)
+        quotes = '"\\"\' ' * 20000
+        words = 'int ' + 'a ' * 20000 + '{ }\n'
+        src = table + words + 'void f(int a) { %s }\n' % quotes + '/* ' + 'void g() { ' * 20000
+        start = time.time()
+        assert_equal(self.prototypes(src), ['void f(int a);'])
+        assert_true(time.time() - start < 5)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.ring import RingLog, RECORD
+
+
+class TestRingLog(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'ttyACM0.ring')
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def test_append_and_read(self):
+        ring = RingLog.create(self.path, 4096)
+        ring.append('hello ', 1.0)
+        ring.append('world\n', 2.0)
+
+        reader = RingLog.open(self.path)
+        records, pos, lost = reader.read()
+        assert_equal(records, [(1.0, 'hello '), (2.0, 'world\n')])
+        assert_equal(lost, 0)
+
+        ring.append('again\n', 3.0)
+        assert_equal(reader.read(pos)[0], [(3.0, 'again\n')])
+        assert_equal(os.path.getsize(self.path), 64 + 4096)
+
+    def test_wrap(self):
+        ring = RingLog.create(self.path, 4096)
+        reader = RingLog.open(self.path)
+        _, pos, _ = reader.read()
+
+        chunk = 'x' * (1000 - RECORD.size)
+        for i in range(10):
+            ring.append(chunk[:-1] + str(i), float(i))
+
+        records, end, lost = reader.read(pos)
+        # only the latest four records fit
+        assert_equal([timestamp for timestamp, _ in records], [6.0, 7.0, 8.0, 9.0])
+        assert_equal(records[-1][1], chunk[:-1] + '9')
+        assert_equal(lost, 6000)
+        assert_equal(reader.read(end), ([], end, 0))
+
+    def test_reopen(self):
+        ring = RingLog.create(self.path, 4096)
+        ring.append('kept', 1.0)
+        ring.close()
+
+        ring = RingLog.create(self.path, 4096)
+        ring.append(' too', 2.0)
+        assert_equal(ring.read()[0], [(1.0, 'kept'), (2.0, ' too')])
+        ring.close()
+
+        # capacity changed
+        ring = RingLog.create(self.path, 8192)
+        assert_equal(ring.read()[0], [])
+        assert_equal(os.path.getsize(self.path), 64 + 8192)
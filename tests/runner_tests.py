@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import sys
+import time
+import json
+import shutil
+import tempfile
+import subprocess
+
+from nose.tools import assert_equal, assert_true
+
+
+# Runs ino in a separate interpreter and reports modules, as well as their
+# top-level packages, it has tried to import. Attempts are recorded by an import hook, so they are
+# seen whether the modules are installed or not
+SCRIPT = """
+import sys
+import json
+
+class Recorder(object):
+    attempted = set()
+
+    def find_module(self, fullname, path=None):
+        self.attempted.update([fullname, fullname.split('.')[0]])
+
+sys.meta_path.insert(0, Recorder())
+
+import ino.runner
+
+sys.argv = ['ino'] + sys.argv[1:]
+try:
+    ino.runner.main()
+except BaseException:
+    pass
+sys.stderr.write(json.dumps(sorted(Recorder.attempted)))
+"""
+
+
+class InoRun(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.env = dict(os.environ,
+                        HOME=self.root,
+                        INO_CACHE_DIR=os.path.join(self.root, 'cache'),
+                        PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def run_ino(self, *args):
+        proc = subprocess.Popen([sys.executable, '-c', SCRIPT] + list(args), cwd=self.root,
+                                env=self.env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.output, err = proc.communicate()
+        return json.loads(err.splitlines()[-1])
+
+
+class TestStartup(InoRun):
+    heavy = ['jinja2', 'serial', 'configobj', 'ino.server']
+    budget = 1.0
+
+    def check(self, *args):
+        modules = self.run_ino(*args)
+        assert_equal([m for m in self.heavy if m in modules], [])
+
+    def test_hook(self):
+        # the init command needs configobj right away
+        assert_true('configobj' in self.run_ino('init', '--help'))
+
+    def test_help(self):
+        self.check('--help')
+
+    def test_clean(self):
+        self.check('clean')
+
+    def test_cache(self):
+        self.check('cache', 'stats')
+
+    def test_budget(self):
+        start = time.time()
+        self.run_ino('--help')
+        assert_true(time.time() - start < self.budget)
+
+
+class TestRunAnywhere(InoRun):
+    def test_dump(self):
+        # recorded logs are read outside of a project
+        self.run_ino('dump', self.root)
+        assert_equal('No project found' in self.output, False)
+        assert_true('No rings found' in self.output)
+
+    def test_dump_in_project(self):
+        os.makedirs(os.path.join(self.root, 'src'))
+        self.run_ino('dump', self.root)
+        assert_equal(sorted(os.listdir(self.root)), ['src'])
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.scanner import IncludeScanner, parse_includes
+
+
+class TestIncludeScanner(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.write('src/main.cpp', '#include <Ethernet.h>\n#include "local.h"\n#include <avr/io.h>\n')
+        self.write('src/local.h', '  #  include "missing.h"\n')
+        self.write('libs/Ethernet/Ethernet.h', '#include <SPI.h>\n#include "utility/w5100.h"\n')
+        self.write('libs/Ethernet/utility/w5100.h', '')
+        self.write('libs/SPI/SPI.h', '')
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def write(self, name, contents):
+        if not os.path.isdir(os.path.dirname(self.path(name))):
+            os.makedirs(os.path.dirname(self.path(name)))
+        with open(self.path(name), 'w') as f:
+            f.write(contents)
+
+    def scanner(self):
+        inc_dirs = [self.path('libs/Ethernet'), self.path('libs/SPI')]
+        return IncludeScanner(inc_dirs, self.path('includes.cache'))
+
+    def test_dependencies(self):
+        assert_equal(self.scanner().dependencies(self.path('src/main.cpp')), set([
+            self.path('libs/Ethernet/Ethernet.h'),
+            self.path('libs/Ethernet/utility/w5100.h'),
+            self.path('libs/SPI/SPI.h'),
+            self.path('src/local.h'),
+        ]))
+
+    def test_cache(self):
+        os.utime(self.path('src/local.h'), (1000000000, 1000000000))
+        scanner = self.scanner()
+        scanner.dependencies(self.path('src/main.cpp'))
+        scanner.save()
+
+        # same mtime and size: the file is not read again
+        size = os.path.getsize(self.path('src/local.h'))
+        self.write('src/local.h', '#include <SPI.h>'.ljust(size))
+        os.utime(self.path('src/local.h'), (1000000000, 1000000000))
+
+        scanner = self.scanner()
+        scanner.load()
+        assert_equal(scanner.includes(self.path('src/local.h')), [['missing.h', True]])
+        assert_equal(scanner.dirty, False)
+
+
+class TestParseIncludes(object):
+    def test_comments(self):
+        assert_equal(parse_includes('// #include <SD.h>\n'
+                                    '/* #include <Ethernet.h>\n'
+                                    '#include <Ethernet.h> */\n'
+                                    'const char *s = "/*";\n'
+                                    '#include "Servo.h" // it\'s used\n'),
+                     [('Servo.h', True)])
+
+    def test_excluded_groups(self):
+        assert_equal(parse_includes('#if 0\n#include <SD.h>\n'
+                                    '#elif 1\n#include <SPI.h>\n'
+                                    '#else\n#include <Wire.h>\n#endif\n'),
+                     [('SPI.h', False)])
+
+    def test_nested_groups(self):
+        assert_equal(parse_includes('#if 0\n#ifdef X\n#include <SD.h>\n#endif\n'
+                                    '#else\n#include <SPI.h>\n#endif\n'),
+                     [('SPI.h', False)])
+
+    def test_unknown_conditions(self):
+        # both groups could be compiled
+        assert_equal(parse_includes('#ifdef USE_SD\n#include <SD.h>\n'
+                                    '#else\n#include <Ethernet.h>\n#endif\n'),
+                     [('SD.h', False), ('Ethernet.h', False)])
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import socket
+import time
+import tempfile
+import threading
+import subprocess
+
+from nose.tools import assert_equal
+
+from ino.server import Server, send_frame, recv_frame, delegate, query
+
+
+def read_all(fd):
+    chunks = []
+    while True:
+        data = os.read(fd, 1024)
+        if not data:
+            return ''.join(chunks)
+        chunks.append(data)
+
+
+class TestFrames(object):
+    def test_roundtrip(self):
+        a, b = socket.socketpair()
+        send_frame(a, 'o', 'x' * 100000)
+        send_frame(a, 'x', '0')
+        a.close()
+        assert_equal(recv_frame(b), ('o', 'x' * 100000))
+        assert_equal(recv_frame(b), ('x', '0'))
+        assert_equal(recv_frame(b), None)
+        b.close()
+
+
+class TestServer(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'server.sock')
+        self.requests = []
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def run(self, argv):
+        self.requests.append((argv, os.getcwd(), os.environ.get('INO_TEST')))
+        os.write(1, 'out\n')
+        os.write(2, 'err\n')
+        return 3
+
+    def start(self, run=None, **kwargs):
+        server = Server(self.path, run=run or self.run, **kwargs)
+        server.drain_timeout = 0.2
+        assert server.listen()
+        thread = threading.Thread(target=server.serve)
+        thread.start()
+        return thread
+
+    def delegate(self, argv):
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        os.environ['INO_TEST'] = 'yes'
+        try:
+            code = delegate(argv, self.path, out_w, err_w)
+        finally:
+            del os.environ['INO_TEST']
+            os.close(out_w)
+            os.close(err_w)
+        return code, read_all(out_r), read_all(err_r)
+
+    def test_run(self):
+        thread = self.start()
+        try:
+            assert_equal(self.delegate(['build', '-v']), (3, 'out\n', 'err\n'))
+            assert_equal(self.requests, [(['build', '-v'], os.getcwd(), 'yes')])
+            assert_equal(query('i', self.path)['commands'], 1)
+            # not served
+            assert_equal(self.delegate(['upload']), (None, '', ''))
+        finally:
+            query('q', self.path)
+            thread.join()
+        assert_equal(os.path.exists(self.path), False)
+        assert_equal(self.delegate(['build']), (None, '', ''))
+
+    def test_stale(self):
+        thread = self.start(stamp=['other'])
+        assert_equal(self.delegate(['build']), (None, '', ''))
+        thread.join()
+        assert_equal(self.requests, [])
+
+    def test_idle_timeout(self):
+        self.start(idle_timeout=0.1).join()
+        assert_equal(os.path.exists(self.path), False)
+
+    def test_background_child(self):
+        # a child left running keeps the output pipes open
+        def run(argv):
+            self.child = subprocess.Popen(['sleep', '5'], close_fds=True)
+            os.write(1, 'out\n')
+            return 0
+
+        thread = self.start(run=run)
+        try:
+            start = time.time()
+            assert_equal(self.delegate(['build']), (0, 'out\n', ''))
+            assert_equal(time.time() - start < 2, True)
+        finally:
+            self.child.kill()
+            self.child.wait()
+            query('q', self.path)
+            thread.join()
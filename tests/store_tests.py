@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import shutil
+import tempfile
+import threading
+
+from nose.tools import assert_equal, assert_not_equal
+
+from ino.store import ArchiveStore, archive_key, copy_atomically, tree_digest
+
+
+class TestArchiveStore(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.store = ArchiveStore(os.path.join(self.root, 'store'))
+        self.archive = self.write('build/libSPI.a', 'archive')
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, contents):
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_miss(self):
+        dest = os.path.join(self.root, 'other', 'libSPI.a')
+        assert_equal(self.store.fetch('ab' * 20, dest), False)
+        assert_equal(os.path.exists(dest), False)
+
+    def test_hit(self):
+        self.store.publish('ab' * 20, self.archive)
+        dest = os.path.join(self.root, 'other', 'libSPI.a')
+        assert_equal(self.store.fetch('ab' * 20, dest), True)
+        assert_equal(self.read(dest), 'archive')
+
+    def test_published_once(self):
+        self.store.publish('ab' * 20, self.archive)
+        self.store.publish('ab' * 20, self.write('build/libSPI.a', 'another'))
+        assert_equal(self.read(self.store.path('ab' * 20)), 'archive')
+
+    def test_concurrent_publish(self):
+        sources = [self.write('build%d/libSPI.a' % i, str(i) * 100000) for i in range(8)]
+        threads = [threading.Thread(target=self.store.publish, args=('ab' * 20, src))
+                   for src in sources]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # one of them is published whole and no temporary files are left
+        contents = self.read(self.store.path('ab' * 20))
+        assert_equal(len(set(contents)), 1)
+        assert_equal(len(contents), 100000)
+        assert_equal(sorted(os.listdir(os.path.dirname(self.store.path('ab' * 20)))),
+                     ['ab' * 20 + '.a', 'ab' * 20 + '.a.lock'])
+
+    def test_unusable_store(self):
+        # archives are built locally then
+        self.write('store', '')
+        self.store.publish('ab' * 20, self.archive)
+        assert_equal(self.store.failed, True)
+        dest = os.path.join(self.root, 'other', 'libSPI.a')
+        assert_equal(self.store.fetch('ab' * 20, dest), False)
+
+
+class TestArchiveKey(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.lib = os.path.join(self.root, 'SPI')
+        os.makedirs(os.path.join(self.lib, 'examples'))
+        self.write('SPI/SPI.cpp', 'void spi() {}\n')
+        self.tool = self.write('avr-gcc', '')
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, contents):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def key(self, flags=('-Os',)):
+        return archive_key([self.tool], list(flags), [tree_digest(self.lib, exclude=['examples'])])
+
+    def test_same_sources(self):
+        assert_equal(self.key(), self.key())
+
+    def test_changed_source(self):
+        key = self.key()
+        self.write('SPI/SPI.cpp', 'void spi() { return; }\n')
+        assert_not_equal(self.key(), key)
+
+    def test_new_source(self):
+        key = self.key()
+        self.write('SPI/utility.cpp', '')
+        assert_not_equal(self.key(), key)
+
+    def test_examples(self):
+        key = self.key()
+        self.write('SPI/examples/demo.pde', '')
+        assert_equal(self.key(), key)
+
+    def test_flags(self):
+        assert_not_equal(self.key(['-O2']), self.key())
+
+
+class TestCopyAtomically(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def test_copy(self):
+        src = os.path.join(self.root, 'src')
+        with open(src, 'w') as f:
+            f.write('data')
+        dest = os.path.join(self.root, 'a', 'b', 'dest')
+        copy_atomically(src, dest)
+        with open(dest) as f:
+            assert_equal(f.read(), 'data')
+
+    def test_failure(self):
+        # nothing is left behind
+        try:
+            copy_atomically(os.path.join(self.root, 'missing'), os.path.join(self.root, 'dest'))
+        except IOError:
+            pass
+        assert_equal(os.listdir(self.root), [])
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import json
+import shutil
+import tempfile
+import subprocess
+
+from nose.tools import assert_equal
+
+from ino.tracing import Tracer, run_job
+
+
+class TestTracer(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.jobs_path = os.path.join(self.root, 'trace.jobs')
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def test_spans(self):
+        tracer = Tracer(self.jobs_path)
+        with tracer.span('discover'):
+            pass
+        with tracer.span('make Makefile', target='Makefile'):
+            pass
+        assert_equal([(s['name'], s['args']) for s in tracer.spans],
+                     [('discover', {}), ('make Makefile', {'target': 'Makefile'})])
+
+    def test_disabled(self):
+        tracer = Tracer(self.jobs_path, enabled=False)
+        with tracer.span('discover'):
+            pass
+        assert_equal(tracer.spans, [])
+
+    def test_jobs(self):
+        tracer = Tracer(self.jobs_path)
+        assert_equal(run_job([self.jobs_path, 'compile', 'a.o', '--', 'true']), 0)
+        assert_equal(run_job([self.jobs_path, 'link', 'b.elf', '--', 'false']), 1)
+        jobs = tracer.collect_jobs()
+        assert_equal([(j['cat'], j['name'], j['args']['status']) for j in jobs],
+                     [('compile', 'a.o', 0), ('link', 'b.elf', 1)])
+        assert_equal(os.path.exists(self.jobs_path), False)
+
+    def test_script(self):
+        # run by makefile recipes
+        tracer = Tracer(self.jobs_path)
+        code = subprocess.call(tracer.launcher + ['compile', 'a.o', '--', 'true'])
+        assert_equal(code, 0)
+        assert_equal([j['name'] for j in tracer.collect_jobs()], ['a.o'])
+
+    def test_lanes(self):
+        tracer = Tracer(self.jobs_path)
+        tracer.started = 100.0
+        tracer.jobs = [
+            {'name': 'a.o', 'cat': 'compile', 'ts': 100.0, 'dur': 2.0},
+            {'name': 'b.o', 'cat': 'compile', 'ts': 101.0, 'dur': 2.0},
+            {'name': 'c.o', 'cat': 'compile', 'ts': 102.0, 'dur': 2.0},
+        ]
+        events = [e for e in tracer.events() if e['ph'] == 'X']
+        assert_equal([(e['name'], e['tid'], e['ts'], e['dur']) for e in events],
+                     [('a.o', 1000, 0, 2000000), ('b.o', 1001, 1000000, 2000000),
+                      ('c.o', 1000, 2000000, 2000000)])
+
+    def test_save(self):
+        tracer = Tracer(self.jobs_path)
+        with tracer.span('discover'):
+            pass
+        path = os.path.join(self.root, 'trace.json')
+        tracer.save(path)
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        assert_equal([e['name'] for e in events if e['ph'] == 'X'], ['discover'])
+
+    def test_summary(self):
+        tracer = Tracer(self.jobs_path)
+        tracer.spans = [{'name': 'make Makefile', 'dur': 1.0}, {'name': 'discover', 'dur': 0.5},
+                        {'name': 'make Makefile', 'dur': 1.0}]
+        tracer.jobs = [{'name': 'a.o', 'cat': 'compile', 'dur': 0.25},
+                       {'name': 'b.o', 'cat': 'compile', 'dur': 0.75}]
+        assert_equal(tracer.summary(count=1), [
+            'Build phases:',
+            '     2.000 s  make Makefile',
+            '     0.500 s  discover',
+            'Slowest files:',
+            '     0.750 s  compile  b.o',
+        ])
@@ -0,0 +1,145 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import shutil
+import argparse
+import tempfile
+import threading
+
+from nose.tools import assert_equal, assert_raises
+
+import ino.commands.upload
+
+from ino.commands.upload import Upload
+from ino.environment import Environment
+from ino.exc import Abort
+from ino.ports import UsbDevice
+
+
+BOARD = {
+    'build': {'mcu': 'atmega328p'},
+    'upload': {'protocol': 'arduino', 'speed': '115200'},
+    'bootloader': {'path': 'optiboot'},
+}
+
+
+class FakeUpload(Upload):
+    """
+    Upload flashing nothing: avrdude exit codes are taken from `results'
+    by port, every call is recorded.
+    """
+
+    def __init__(self, environment):
+        super(FakeUpload, self).__init__(environment)
+        self.results = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def discover(self):
+        pass
+
+    def reset(self, port, board, label=None):
+        return port
+
+    def avrdude(self, port, board, protocol, mode, label=None):
+        with self.lock:
+            self.calls.append((port, mode))
+            results = self.results.get(port, [0])
+            return results.pop(0) if len(results) > 1 else results[0]
+
+
+class TestUpload(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ['INO_CACHE_DIR'] = self.root
+        self.hex_path = os.path.join(self.root, 'firmware.hex')
+        self.write_hex(':00000001FF\n')
+
+        self.upload = FakeUpload(Environment())
+        self.upload.e['hex_path'] = self.hex_path
+        self.upload.e.board_model = lambda key: BOARD
+
+        # boards are told by the serial number of a device on a port
+        self.devices = {}
+        self.usb_device = ino.commands.upload.usb_device
+        ino.commands.upload.usb_device = self.devices.get
+
+    def teardown(self):
+        ino.commands.upload.usb_device = self.usb_device
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.root)
+
+    def write_hex(self, contents):
+        with open(self.hex_path, 'w') as f:
+            f.write(contents)
+
+    def plug(self, port, serial):
+        self.devices[port] = UsbDevice(0x2341, 0x0043, '1-1', serial)
+
+    def run(self, ports, **kwargs):
+        args = argparse.Namespace(serial_port=ports, all=False, board_model='uno',
+                                  jobs=4, retries=1, force=False, verify=False)
+        for key, value in kwargs.iteritems():
+            setattr(args, key, value)
+        del self.upload.calls[:]
+        self.upload.run(args)
+        return sorted(self.upload.calls)
+
+    def test_skip(self):
+        self.plug('/dev/ttyACM0', 'A')
+        assert_equal(self.run(['/dev/ttyACM0']), [('/dev/ttyACM0', 'w')])
+        assert_equal(self.run(['/dev/ttyACM0']), [])
+        assert_equal(self.run(['/dev/ttyACM0'], force=True), [('/dev/ttyACM0', 'w')])
+
+        self.write_hex(':00000001FF\n:00000001FF\n')
+        assert_equal(self.run(['/dev/ttyACM0']), [('/dev/ttyACM0', 'w')])
+
+    def test_other_board(self):
+        # another board plugged into the same port
+        self.plug('/dev/ttyACM0', 'A')
+        self.run(['/dev/ttyACM0'])
+        self.plug('/dev/ttyACM0', 'B')
+        assert_equal(self.run(['/dev/ttyACM0']), [('/dev/ttyACM0', 'w')])
+
+    def test_no_identity(self):
+        assert_equal(self.run(['/dev/ttyUSB0']), [('/dev/ttyUSB0', 'w')])
+        assert_equal(self.run(['/dev/ttyUSB0']), [('/dev/ttyUSB0', 'w')])
+
+    def test_failed(self):
+        # the board is in unknown state after a failed upload
+        self.plug('/dev/ttyACM0', 'A')
+        self.run(['/dev/ttyACM0'])
+        self.write_hex(':00000001FF\n:00000001FF\n')
+        self.upload.results['/dev/ttyACM0'] = [1]
+        assert_raises(Abort, self.run, ['/dev/ttyACM0'])
+        self.write_hex(':00000001FF\n')
+        self.upload.results['/dev/ttyACM0'] = [0]
+        assert_equal(self.run(['/dev/ttyACM0']), [('/dev/ttyACM0', 'w')])
+
+    def test_verify(self):
+        self.plug('/dev/ttyACM0', 'A')
+        assert_equal(self.run(['/dev/ttyACM0'], verify=True), [('/dev/ttyACM0', 'v')])
+        self.upload.results['/dev/ttyACM0'] = [1, 0]
+        assert_equal(self.run(['/dev/ttyACM0'], verify=True),
+                     [('/dev/ttyACM0', 'v'), ('/dev/ttyACM0', 'w')])
+
+    def test_several_ports(self):
+        ports = ['/dev/ttyACM0', '/dev/ttyACM1', '/dev/ttyACM2']
+        for i, port in enumerate(ports):
+            self.plug(port, str(i))
+        # the first attempt fails on one port, the other one is retried
+        # once and fails again
+        self.upload.results = {'/dev/ttyACM1': [1, 0], '/dev/ttyACM2': [1]}
+        with assert_raises(Abort) as cm:
+            self.run(ports)
+        assert_equal(str(cm.exception), 'Upload failed for /dev/ttyACM2')
+        assert_equal(sorted(self.upload.calls),
+                     [('/dev/ttyACM0', 'w'), ('/dev/ttyACM1', 'w'), ('/dev/ttyACM1', 'w'),
+                      ('/dev/ttyACM2', 'w'), ('/dev/ttyACM2', 'w')])
+
+        # only the failed one is uploaded to again
+        self.upload.results = {}
+        assert_equal(self.run(ports), [('/dev/ttyACM2', 'w')])
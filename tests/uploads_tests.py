@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import os.path
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.uploads import UploadLog
+
+
+class TestUploadLog(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.log = UploadLog(os.path.join(self.root, 'uploads.json'))
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def test_record(self):
+        assert_equal(self.log.get('usb:2341:0043:A', 'uno'), None)
+        self.log.record('usb:2341:0043:A', 'uno', 'abc')
+        self.log.record('usb:2341:0043:B', 'uno', 'def')
+        assert_equal(self.log.get('usb:2341:0043:A', 'uno'), 'abc')
+        assert_equal(self.log.get('usb:2341:0043:A', 'leonardo'), None)
+
+        self.log.record('usb:2341:0043:A', 'uno', None)
+        assert_equal(self.log.get('usb:2341:0043:A', 'uno'), None)
+        assert_equal(self.log.get('usb:2341:0043:B', 'uno'), 'def')
+
+    def test_no_identity(self):
+        self.log.record(None, 'uno', 'abc')
+        assert_equal(self.log.get(None, 'uno'), None)
+        assert_equal(self.log.load(), {})
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import os
+import os.path
+import fcntl
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+
+from nose.tools import assert_equal, assert_raises
+
+from ino.utils import JobServer, map_concurrently, toposort
+
+
+class TestToposort(object):
+    def test_dependants_go_first(self):
+        edges = {
+            'Ethernet': ['SPI', 'arduino'],
+            'SPI': ['arduino'],
+            'Wire': ['arduino'],
+        }
+        assert_equal(toposort(['arduino', 'Ethernet', 'Wire', 'SPI'], edges),
+                     ['Ethernet', 'Wire', 'SPI', 'arduino'])
+
+    def test_ties_keep_original_order(self):
+        assert_equal(toposort(['c', 'a', 'b'], {}), ['c', 'a', 'b'])
+
+    def test_cycles_are_broken(self):
+        edges = {'a': ['b'], 'b': ['a', 'c']}
+        assert_equal(toposort(['a', 'b', 'c'], edges), ['a', 'b', 'c'])
+
+
+class TestMapConcurrently(object):
+    def test_results(self):
+        assert_equal(map_concurrently(lambda x: x * 2, [1, 2, 3], 2), [2, 4, 6])
+
+    def test_failure(self):
+        # calls running when one fails are finished before it is raised
+        started = threading.Event()
+        finished = []
+
+        def call(x):
+            if x == 0:
+                started.wait()
+                raise ValueError(x)
+            started.set()
+            time.sleep(0.1)
+            finished.append(x)
+
+        assert_raises(ValueError, map_concurrently, call, [0, 1], 2)
+        assert_equal(finished, [1])
+
+
+class TestJobServer(object):
+    def tokens(self, jobserver):
+        fcntl.fcntl(jobserver.rfd, fcntl.F_SETFL, os.O_NONBLOCK)
+        try:
+            return len(os.read(jobserver.rfd, 1024))
+        except OSError:
+            return 0
+        finally:
+            jobserver.close()
+
+    def test_tokens(self):
+        # makes run within slots hold a token for their implicit slots
+        assert_equal(self.tokens(JobServer(4)), 4)
+
+    def test_slots(self):
+        jobserver = JobServer(2)
+        tokens = [jobserver.acquire(), jobserver.acquire()]
+        assert_equal(self.tokens(jobserver), 0)
+        # closed by `tokens'
+        jobserver = JobServer(2)
+        with jobserver.slot():
+            pass
+        assert_equal(self.tokens(jobserver), 2)
+        assert_equal(tokens, ['+', '+'])
+
+    def test_join(self):
+        assert_equal(JobServer.join({}), None)
+        jobserver = JobServer(3)
+        outer = JobServer.join(jobserver.environ())
+        assert_equal(outer.environ(), None)
+        # the slot of the recipe running ino is taken first
+        assert_equal(outer.acquire(), None)
+        assert_equal(outer.acquire(), '+')
+        outer.close()
+        assert_equal(self.tokens(jobserver), 2)
+
+    def test_concurrent_makes(self):
+        # several makes with many jobs each run at once never run more
+        # than the number of jobs of the jobserver all together
+        root = tempfile.mkdtemp()
+        try:
+            log = os.path.join(root, 'log')
+            makefile = os.path.join(root, 'Makefile')
+            with open(makefile, 'w') as f:
+                f.write('all: %s\n' % ' '.join('t%d' % i for i in range(6)))
+                f.write('t%%:\n\t@echo + >> %s; sleep 0.1; echo - >> %s\n' % (log, log))
+
+            jobserver = JobServer(3)
+
+            def make():
+                with jobserver.slot():
+                    subprocess.check_call(['make', '-s', '-f', makefile],
+                                          env=jobserver.environ(), cwd=root)
+
+            threads = [threading.Thread(target=make) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            jobserver.close()
+
+            running = most = 0
+            with open(log) as f:
+                for line in f:
+                    running += 1 if line.strip() == '+' else -1
+                    most = max(most, running)
+            assert_equal(running, 0)
+            assert_equal(most, 3)
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8; -*-
+
+import os
+import os.path
+import time
+import shutil
+import argparse
+import tempfile
+
+from nose.tools import assert_equal
+
+from ino.commands.build import Build
+from ino.commands.watch import Watch
+from ino.environment import Environment
+from ino.exc import Abort
+from ino.inotify import Inotify
+
+
+class TestWatch(object):
+    def setup(self):
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp()
+        os.chdir(self.root)
+        self.write('src/sketch.ino', 'void setup() {}\nvoid loop() {}\n')
+        self.write('dist/libraries/Servo/Servo.h', '\n')
+        os.makedirs('lib')
+        self.watch = Watch(Environment())
+        self.watch.inotify = None
+        self.watch.serial = None
+        self.watch.uploader = None
+        self.watch.watched = set()
+        self.args = argparse.Namespace(board_model=['uno'], arduino_dist=None,
+                                       debounce=0.05, serial=False)
+        self.build_run = Build.__dict__['run']
+
+    def teardown(self):
+        Build.run = self.build_run
+        if self.watch.inotify:
+            self.watch.inotify.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    def write(self, path, contents):
+        path = os.path.join(self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def fingerprint(self):
+        build_dir = self.watch.e.board_build_dir('uno')
+        if not os.path.isdir(build_dir):
+            os.makedirs(build_dir)
+        return self.watch.fingerprint(self.args, 'uno', build_dir)
+
+    def test_ignored(self):
+        for name in ['.sketch.ino.swp', 'sketch.ino~', '#sketch.ino#', '4913']:
+            assert_equal(self.watch.ignored(os.path.join('src', name)), True)
+        assert_equal(self.watch.ignored(os.path.join('src', 'sketch.ino')), False)
+
+    def test_debounce(self):
+        # changes keep coming for a while and are built together once
+        # they stop, apart from editor files
+        batches = [set(['src/a.cpp']), set(['src/.a.cpp.swp']), set(['src/b.cpp'])]
+        calls = []
+
+        def wait(timeout):
+            calls.append(timeout)
+            if batches:
+                return batches.pop(0)
+            time.sleep(timeout)
+            return set()
+
+        self.watch.wait = wait
+        started = time.time()
+        assert_equal(self.watch.wait_for_changes(self.args), set(['src/a.cpp', 'src/b.cpp']))
+        assert_equal(time.time() - started >= self.args.debounce, True)
+        assert_equal(calls[0], self.watch.poll_interval)
+        assert_equal(max(calls[1:]) <= self.args.debounce, True)
+
+    def test_polling(self):
+        self.watch.roots = self.watch.watched_dirs(self.args)
+        self.watch.snapshot = self.watch.tree_snapshot()
+        assert_equal(self.watch.wait(0), set())
+
+        self.write('src/sketch.ino', 'void setup() {}\nvoid loop() { delay(1); }\n')
+        assert_equal(self.watch.wait(0), set(['src']))
+        assert_equal(self.watch.wait(0), set())
+
+    def test_watched_dirs(self):
+        libraries = os.path.join(self.root, 'dist', 'libraries')
+        servo = os.path.join(libraries, 'Servo')
+        self.fingerprint().save([], ['src', 'lib', servo], ['lib', libraries])
+        assert_equal(self.watch.watched_dirs(self.args),
+                     [(libraries, False), (servo, True), ('lib', False), ('lib', True),
+                      ('src', True)])
+
+    def test_no_fingerprint(self):
+        assert_equal(self.watch.watched_dirs(self.args), [('lib', True), ('src', True)])
+        # written by something else
+        self.write(self.fingerprint().path, '{"digest": "0"}')
+        assert_equal(self.watch.watched_dirs(self.args), [('lib', True), ('src', True)])
+
+    def test_failed_first_build(self):
+        def run(build, args):
+            raise Abort('make failed')
+
+        Build.run = run
+        self.watch.inotify = Inotify()
+        self.watch.rebuild(self.args)
+        assert_equal(self.watch.watched, set(['src', 'lib']))
+
+        # with a fingerprint written by something else
+        self.write(self.fingerprint().path, '{"digest": "0"}')
+        self.watch.inotify.close()
+        self.watch.inotify = Inotify()
+        self.watch.rebuild(self.args)
+        assert_equal(self.watch.watched, set(['src', 'lib']))